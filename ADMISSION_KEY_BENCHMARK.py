@@ -0,0 +1,56 @@
+import time
+
+# ─── ADMISSION KEY BENCHMARK: cost, width and collisions per key strategy ────
+KEY_BENCH_ROWS   = [1_000_000, 10_000_000, 100_000_000]
+KEY_BENCH_DAYS   = 1_461      # 2021-01-01 .. 2024-12-31
+
+os.makedirs('/content/lakehouse/bench', exist_ok=True)
+key_con = connect_duckdb()
+
+def key_source(n):
+    # Row i is patient i // KEY_BENCH_DAYS on day i % KEY_BENCH_DAYS, so every
+    # (patient_id, admission_date) pair is distinct and any repeated key is a collision
+    return f"""(SELECT 'PAT-' || LPAD(CAST(i // {KEY_BENCH_DAYS} AS VARCHAR), 7, '0') AS patient_id,
+                       DATE '2021-01-01' + CAST(i % {KEY_BENCH_DAYS} AS INTEGER) AS admission_date
+                FROM range({n}) t(i))"""
+
+print(" ADMISSION KEY BENCHMARK")
+print(f"{'Strategy':<10} {'Rows':>12} {'Scan s':>8} {'Rows/sec':>13} {'Collisions':>11}")
+print("-" * 58)
+
+# 'none' scans the same generated ids without computing a key, so the gap to it
+# is the cost of the key expression itself
+for n in KEY_BENCH_ROWS:
+    for strategy, expr in [('none', None)] + list(ADMISSION_KEY_SQL.items()):
+        t0 = time.perf_counter()
+        key_con.execute(f"SELECT MIN({expr or 'patient_id'}), MIN(admission_date) "
+                        f"FROM {key_source(n)}").fetchall()
+        scan_s = time.perf_counter() - t0
+        collisions = '-'
+        if expr:
+            distinct = key_con.execute(
+                f"SELECT COUNT(DISTINCT {expr}) FROM {key_source(n)}").fetchone()[0]
+            collisions = f'{n - distinct:,}'
+        print(f"{strategy:<10} {n:>12,} {scan_s:>8.2f} {n / scan_s:>13,.0f} {collisions:>11}")
+
+# Storage width and merge-probe cost: a 1% delta semi-joined against 10M keys,
+# which is the lookup silver's MERGE performs for every incremental refresh
+n = 10_000_000
+print(f"\n{'Strategy':<10} {'Bytes/key':>10} {'Probe ms':>10}   ({n:,} keys, 1% delta)")
+print("-" * 34)
+for strategy, expr in ADMISSION_KEY_SQL.items():
+    key_con.execute(f"CREATE OR REPLACE TABLE bench_keys AS SELECT {expr} AS k FROM {key_source(n)}")
+    key_con.execute("CREATE OR REPLACE TABLE bench_delta AS "
+                    "SELECT k FROM bench_keys USING SAMPLE 1 PERCENT (system, 42)")
+    path = f'/content/lakehouse/bench/keys_{strategy}.parquet'
+    key_con.execute(f"COPY bench_keys TO '{path}' (FORMAT parquet)")
+    t0 = time.perf_counter()
+    key_con.execute("SELECT COUNT(*) FROM bench_keys SEMI JOIN bench_delta USING (k)").fetchone()
+    probe_ms = (time.perf_counter() - t0) * 1000
+    print(f"{strategy:<10} {os.path.getsize(path) / n:>10.2f} {probe_ms:>10.1f}")
+    os.remove(path)
+key_con.execute("DROP TABLE bench_keys")
+key_con.execute("DROP TABLE bench_delta")
+key_con.close()
+
+print(f"\n Silver admission_key: {admission_key_version()}")
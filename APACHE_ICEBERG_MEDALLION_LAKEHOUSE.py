@@ -1,36 +1,126 @@
 os.makedirs('/content/lakehouse/bronze', exist_ok=True)
 os.makedirs('/content/lakehouse/silver', exist_ok=True)
 os.makedirs('/content/lakehouse/gold',   exist_ok=True)
+os.makedirs('/content/lakehouse/quarantine', exist_ok=True)
 os.makedirs('/content/lakehouse/ml',     exist_ok=True)
 
-df_raw.to_parquet('/content/lakehouse/bronze/raw_admissions.parquet',
-                  index=False, engine='pyarrow')
-
-iceberg_metadata = {
-    'table_name':   'bronze.raw_admissions',
-    'format':       'PARQUET',
-    'partitions':   ['admit_year', 'admit_month'],
-    'row_count':    len(df_raw),
-    'schema_version': 1,
-    'created_at':   datetime.now().isoformat(),
-    'columns':      list(df_raw.columns)
+BRONZE_DIR        = '/content/lakehouse/bronze/raw_admissions'
+BRONZE_METADATA   = '/content/lakehouse/bronze/iceberg_metadata.json'
+SILVER_DIR        = '/content/lakehouse/silver/admissions_clean'
+SILVER_METADATA   = '/content/lakehouse/silver/iceberg_metadata.json'
+QUARANTINE_DIR    = '/content/lakehouse/quarantine/admissions_rejected'
+QUARANTINE_METADATA = '/content/lakehouse/quarantine/iceberg_metadata.json'
+BRONZE_STREAMING  = EHR_STREAMING  # True: stream BRONZE_ROWS straight from the generator
+BRONZE_ROWS       = N
+BRONZE_BATCH_ROWS = 1_000_000
+BRONZE_SHARDS     = EHR_SHARDS # > 1: one data file per shard, generated in a process pool
+BRONZE_SCHEMA     = 'compact'  # 'compact': date32/dictionary/int8 storage, 'raw': as generated
+SILVER_DATE_FROM  = None       # e.g. '2024-10-01': silver only scans matching partitions
+SILVER_DATE_TO    = None
+SILVER_PATIENT_RANGE = (None, None)   # e.g. ('PAT-0000000', 'PAT-0049999')
+SILVER_MODE       = 'incremental'  # 'full': rebuild silver from all of bronze on every run
+ADMISSION_KEY     = 'md5'          # see ADMISSION_KEY_SQL; 'hash64' is opt-in only
+
+# admission_key strategies, all deterministic in (patient_id, admission_date):
+#   md5       32-char hex text, the original key
+#   hash64    DuckDB's built-in hash as UBIGINT: cheapest, but only stable within
+#             one DuckDB version. That version is recorded alongside the key, so
+#             an upgrade forces a full silver rebuild rather than a silently
+#             mismatched MERGE; not a default for that reason
+#   composite (patient number << 16) + days since 1970 as BIGINT: exact and
+#             collision-free, but needs the numeric PAT-nnnnnnn id format
+ADMISSION_KEY_SQL = {
+    'md5':       "MD5(patient_id || CAST(admission_date AS VARCHAR))",
+    'hash64':    "hash(patient_id, CAST(admission_date AS DATE))",
+    'composite': "CAST(SUBSTR(patient_id, 5) AS BIGINT) * 65536 "
+                 "+ (CAST(admission_date AS DATE) - DATE '1970-01-01')",
 }
-with open('/content/lakehouse/bronze/iceberg_metadata.json', 'w') as f:
-    json.dump(iceberg_metadata, f, indent=2)
+
+# Rows failing a rule are routed to the quarantine table with the first matching
+# reason code instead of being dropped; rules see the raw bronze values
+SILVER_REJECT_RULES = [
+    ('NULL_PATIENT_ID',     "patient_id IS NULL"),
+    ('NULL_ADMISSION_DATE', "admission_date IS NULL"),
+    ('NULL_LOS_DAYS',       "los_days IS NULL"),
+    ('LOS_OUT_OF_RANGE',    "los_days NOT BETWEEN 0 AND 365"),
+]
+# Valid rows sharing an admission_key with a newer valid row (resubmitted feeds,
+# late corrections) are quarantined under this reason; the newest version wins,
+# ordered by bronze file sequence number, then file and row position
+DUPLICATE_REASON = 'DUPLICATE_ADMISSION'
+
+def admission_key_version(strategy=None):
+    strategy = strategy or ADMISSION_KEY
+    return f'{strategy}/duckdb-{duckdb.__version__}' if strategy == 'hash64' else strategy
+
+def bronze_batches(batches):
+    return cast_batches(batches, BRONZE_COMPACT_SCHEMA) if BRONZE_SCHEMA == 'compact' else batches
+
+def write_bronze_shard(task):
+    shard, start, stop, seed_seq, out_dir, batch_rows, write_id = task
+    return write_partitioned(
+        out_dir,
+        bronze_batches(iter_bronze_source(stop - start, batch_rows, seed=seed_seq,
+                                          id_offset=start)),
+        BRONZE_PARTITIONS, file_name=f'part-{shard:05d}-{write_id}.parquet')
+
+def generate_bronze_sharded(n, n_shards, out_dir, seed=42, batch_rows=1_000_000,
+                            processes=None, write_id=None):
+    # Shard i always covers rows [n*i/S, n*(i+1)/S) and draws from the i-th child
+    # of SeedSequence(seed), so the files depend only on (seed, n_shards) and not
+    # on how many worker processes happen to run them. Shards draw in EHR_MODE's
+    # shape; a cohort shard's patients get ids from its own row range
+    bounds = [n * i // n_shards for i in range(n_shards + 1)]
+    seeds  = np.random.SeedSequence(seed).spawn(n_shards)
+    write_id = write_id or uuid.uuid4().hex[:8]
+    tasks  = [(i, bounds[i], bounds[i + 1], seeds[i], out_dir, batch_rows, write_id)
+              for i in range(n_shards)]
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        shards = pool.map(write_bronze_shard, tasks, chunksize=1)
+    return sorted((f for files in shards for f in files), key=lambda f: f['path'])
+
+# Every run writes uniquely named files, so files referenced by earlier snapshots
+# are never overwritten in place
+bronze_write_id = uuid.uuid4().hex[:8]
+
+if BRONZE_SHARDS > 1:
+    bronze_files = generate_bronze_sharded(BRONZE_ROWS, BRONZE_SHARDS, BRONZE_DIR,
+                                           seed=EHR_SEED, batch_rows=BRONZE_BATCH_ROWS,
+                                           write_id=bronze_write_id)
+elif BRONZE_STREAMING:
+    bronze_files = write_partitioned(
+        BRONZE_DIR,
+        bronze_batches(iter_bronze_source(BRONZE_ROWS, BRONZE_BATCH_ROWS, seed=EHR_SEED)),
+        BRONZE_PARTITIONS, file_name=f'part-00000-{bronze_write_id}.parquet')
+else:
+    bronze_files = write_partitioned(
+        BRONZE_DIR,
+        bronze_batches(pa.Table.from_pandas(df_raw, preserve_index=False).to_batches()),
+        BRONZE_PARTITIONS, file_name=f'part-00000-{bronze_write_id}.parquet')
+
+iceberg_metadata = commit_snapshot(BRONZE_METADATA, 'bronze.raw_admissions',
+                                   bronze_files, BRONZE_PARTITIONS)
+register_table(BRONZE_METADATA)
+bronze_rows    = iceberg_metadata['row_count']
+bronze_columns = iceberg_metadata['columns']
 
 print(" BRONZE LAYER")
 print(f"   Table: bronze.raw_admissions")
 print(f"   Format: Parquet (Iceberg-backed)")
 print(f"   Partitioned by: admit_year, admit_month")
-print(f"   Rows: {len(df_raw):,} | Columns: {len(df_raw.columns)}")
-print(f"   Size: {os.path.getsize('/content/lakehouse/bronze/raw_admissions.parquet') / 1024:.0f} KB")
+print(f"   Storage schema: {BRONZE_SCHEMA}")
+print(f"   Snapshot: {iceberg_metadata['current_snapshot_id']} | "
+      f"Rows: {bronze_rows:,} | Columns: {len(bronze_columns)}")
+print(f"   Partitions: {len({tuple(f['partition'].values()) for f in bronze_files})} | "
+      f"Files: {len(bronze_files)} | "
+      f"Size: {sum(os.path.getsize(f['path']) for f in bronze_files) / 1024:.0f} KB")
 
-con = duckdb.connect()
+# Month partitions are pruned first, then per-file column stats skip anything
+# whose admission_date / patient_id range cannot match
+silver_ranges = {'admission_date': (SILVER_DATE_FROM, SILVER_DATE_TO),
+                 'patient_id':     SILVER_PATIENT_RANGE}
 
-con.execute("""CREATE TABLE bronze_admissions AS
-              SELECT * FROM read_parquet('/content/lakehouse/bronze/raw_admissions.parquet')""")
-
-silver_sql = """
+silver_sql = f"""
     SELECT
         patient_id,
         CAST(admission_date AS DATE)                    AS admission_date,
@@ -57,21 +147,106 @@ silver_sql = """
             ELSE 'VERY_HIGH'
         END                                             AS risk_tier,
         ROUND(0.983 * EXP(charlson_index * 0.9), 4)   AS ten_yr_survival_prob,
-        MD5(patient_id || CAST(admission_date AS VARCHAR)) AS admission_key,
-        CURRENT_TIMESTAMP                               AS transformed_at
-    FROM bronze_admissions
-    WHERE patient_id  IS NOT NULL
-      AND admission_date IS NOT NULL
-      AND los_days BETWEEN 0 AND 365
+        admission_key,
+        CURRENT_TIMESTAMP                               AS transformed_at,
+        reject_reason,
+        CASE WHEN reject_reason IS NOT NULL THEN bronze_row END AS source_row
+    FROM (SELECT *,
+                 struct_pack(*COLUMNS(* EXCLUDE (admission_key, rule_reason, sequence_number,
+                                                   file_ordinal, file_row_number))) AS bronze_row,
+                 CASE WHEN rule_reason IS NULL AND ROW_NUMBER() OVER (
+                          PARTITION BY admission_key, rule_reason IS NULL
+                          ORDER BY sequence_number DESC, file_ordinal DESC, file_row_number DESC
+                      ) > 1 THEN '{DUPLICATE_REASON}'
+                      ELSE rule_reason
+                 END AS reject_reason
+          FROM (SELECT *,
+                       {ADMISSION_KEY_SQL[ADMISSION_KEY]} AS admission_key,
+                       CASE {' '.join(f"WHEN {cond} THEN '{reason}'" for reason, cond in SILVER_REJECT_RULES)}
+                       END AS rule_reason
+                FROM bronze_scan
+                WHERE TRUE {range_filter_sql(silver_ranges)}))
 """
 
-df_silver = con.execute(silver_sql).df()
-df_silver.to_parquet('/content/lakehouse/silver/admissions_clean.parquet',
-                     index=False)
+def refresh_silver(bronze_metadata=BRONZE_METADATA, silver_metadata=SILVER_METADATA,
+                   silver_dir=SILVER_DIR, quarantine_metadata=QUARANTINE_METADATA,
+                   quarantine_dir=QUARANTINE_DIR):
+    # Silver records the bronze snapshot it was built from. In incremental mode
+    # only bronze files appended since then are transformed and merged into
+    # silver on admission_key; a first run, a changed scan range or key strategy,
+    # or a bronze overwrite falls back to a full rebuild. Rejected rows land in
+    # the quarantine table from the same scan, replaced on a full rebuild and
+    # appended on an incremental one. The table paths default to the lakehouse's.
+    bronze_meta = read_metadata(bronze_metadata)
+    previous    = read_metadata(silver_metadata)
+    props       = previous.get('properties', {}) if previous else {}
+    scan_ranges = {col: list(r) for col, r in silver_ranges.items()}
+    delta = None
+    if (SILVER_MODE == 'incremental' and props.get('bronze_snapshot_id')
+            and props.get('scan_ranges') == scan_ranges
+            and props.get('admission_key') == admission_key_version()):
+        delta = incremental_files(bronze_metadata, props['bronze_snapshot_id'])
+    source = load_data_files(bronze_metadata) if delta is None else delta
+    scan   = prune_files(prune_partitions(source, SILVER_DATE_FROM, SILVER_DATE_TO),
+                         silver_ranges)
+    watermark = {'bronze_snapshot_id': bronze_meta['current_snapshot_id'],
+                 'scan_ranges':        scan_ranges,
+                 'admission_key':      admission_key_version()}
+    stats = {'mode': 'full' if delta is None else 'incremental',
+             'source_files': len(source), 'scanned_files': len(scan), 'rejected': {}}
+    if delta is not None and not scan:
+        return previous, stats    # nothing new in range; keep the old watermark
+
+    # bronze_scan is a cursor-local view over just the surviving files: the scan
+    # streams straight from Parquet instead of first copying bronze into a table,
+    # and the result streams straight back out into silver's partition files
+    with catalog_cursor() as con:
+        con.execute(f"CREATE OR REPLACE TEMP VIEW bronze_scan AS "
+                    f"SELECT * FROM {versioned_source(scan, source)}")
+        if delta is None:
+            files, reject_files, rejected = materialize_routed(
+                con, silver_sql, silver_dir, quarantine_dir, BRONZE_PARTITIONS)
+            metadata = commit_snapshot(silver_metadata, 'silver.admissions_clean', files,
+                                       BRONZE_PARTITIONS, properties=watermark,
+                                       summary={'rejected': rejected})
+        else:
+            # The delta is one refresh's worth of rows, small enough to stage once
+            # and read twice: rejects out to quarantine, the rest into the merge
+            con.execute(f"CREATE OR REPLACE TEMP TABLE silver_delta AS {silver_sql}")
+            rejected = dict(con.execute("""SELECT reject_reason, COUNT(*) FROM silver_delta
+                                           WHERE reject_reason IS NOT NULL
+                                           GROUP BY reject_reason""").fetchall())
+            reject_files = materialize(con, """SELECT reject_reason, source_row.*
+                                               FROM silver_delta
+                                               WHERE reject_reason IS NOT NULL""",
+                                       quarantine_dir) if rejected else []
+            metadata, merged = merge_into_table(
+                con, """SELECT * EXCLUDE (reject_reason, source_row) FROM silver_delta
+                       WHERE reject_reason IS NULL""",
+                silver_metadata, silver_dir, 'admission_key', BRONZE_PARTITIONS,
+                properties=watermark, summary={'rejected': rejected})
+            con.execute("DROP TABLE silver_delta")
+            stats.update(merged)
+    commit_snapshot(quarantine_metadata, 'silver.admissions_quarantine', reject_files,
+                    operation='overwrite' if delta is None else 'append',
+                    summary={'rejected': rejected})
+    register_table(silver_metadata)
+    register_table(quarantine_metadata)
+    stats['rejected'] = rejected
+    return metadata, stats
+
+silver_metadata, silver_refresh = refresh_silver()
 
 print(f"\n SILVER LAYER")
 print(f"   Table: silver.admissions_clean")
-print(f"   Rows: {len(df_silver):,} (cleaned & validated)")
-print(f"   Null patient_ids removed: {df_raw.patient_id.isna().sum()}")
+print(f"   Rows: {silver_metadata['row_count']:,} (cleaned & validated)")
+print(f"   Refresh: {silver_refresh['mode']} | Bronze files scanned: "
+      f"{silver_refresh['scanned_files']} of {silver_refresh['source_files']}")
+print(f"   Rows quarantined: {sum(silver_refresh['rejected'].values()):,} "
+      f"→ silver.admissions_quarantine")
+for reason in [r for r, _ in SILVER_REJECT_RULES] + [DUPLICATE_REASON]:
+    print(f"     {reason:<20} {silver_refresh['rejected'].get(reason, 0):>10,}")
 print(f"   Risk tier distribution:")
-print(df_silver['risk_tier'].value_counts().to_string(header=False))
\ No newline at end of file
+print(query_arrow("""SELECT risk_tier, COUNT(*) AS n FROM silver.admissions_clean
+                     GROUP BY risk_tier ORDER BY n DESC""").to_pandas()
+      .to_string(header=False, index=False))
\ No newline at end of file
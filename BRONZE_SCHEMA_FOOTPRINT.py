@@ -0,0 +1,21 @@
+import time
+
+footprint_dir = '/content/lakehouse/bench/schema_footprint'
+# Its own sample from the generator, so the comparison runs with EHR_STREAMING too
+raw_table     = pa.Table.from_batches(list(iter_ehr_batches(min(N, 1_000_000), seed=EHR_SEED)))
+
+print(" BRONZE STORAGE SCHEMA — raw vs compact")
+print(f"{'Schema':<10} {'Files MB':>10} {'pandas MB':>11} {'Read s':>8}")
+print("-" * 42)
+
+for name, batches in [('raw',     raw_table.to_batches()),
+                      ('compact', cast_batches(raw_table.to_batches(), BRONZE_COMPACT_SCHEMA))]:
+    files = write_partitioned(f'{footprint_dir}/{name}', batches, BRONZE_PARTITIONS)
+    t0 = time.perf_counter()
+    frame = read_table_frame(files)
+    elapsed = time.perf_counter() - t0
+    print(f"{name:<10} {sum(os.path.getsize(f['path']) for f in files) / 1e6:>10.2f} "
+          f"{frame.memory_usage(deep=True).sum() / 1e6:>11.1f} {elapsed:>8.2f}")
+
+print(f"\n Compact dtypes: {dict(frame.dtypes.astype(str).value_counts())}")
+shutil.rmtree(footprint_dir)
@@ -0,0 +1,30 @@
+import time
+
+shard_dir_a = '/content/lakehouse/bench/shards_serial'
+shard_dir_b = '/content/lakehouse/bench/shards_parallel'
+n_rows, n_shards = 10_000_000, 16
+n_procs = os.cpu_count()
+
+print(f" SHARDED BRONZE GENERATION — {n_rows:,} rows, {n_shards} shards")
+print(f"{'Processes':>10} {'Seconds':>10} {'Rows/sec':>14}")
+print("-" * 36)
+
+runs = []
+for procs, out_dir in [(1, shard_dir_a), (n_procs, shard_dir_b)]:
+    t0 = time.perf_counter()
+    files = generate_bronze_sharded(n_rows, n_shards, out_dir, seed=EHR_SEED,
+                                    batch_rows=250_000, processes=procs)
+    elapsed = time.perf_counter() - t0
+    runs.append(files)
+    print(f"{procs:>10} {elapsed:>10.2f} {n_rows / elapsed:>14,.0f}")
+
+identical = len(runs[0]) == len(runs[1]) and all(
+    pq.read_table(a['path']).equals(pq.read_table(b['path']))
+    for a, b in zip(*runs)
+)
+print(f"\n Bit-identical across process counts: {identical}")
+print(f"   Rows written: {sum(f['record_count'] for f in files):,} in {len(files)} files")
+for out_dir in [shard_dir_a, shard_dir_b]:
+    shutil.rmtree(out_dir)
+assert identical, 'sharded bronze depends on the process count'
+assert sum(f['record_count'] for f in files) == n_rows
@@ -0,0 +1,36 @@
+import time
+
+os.makedirs('/content/lakehouse/bench', exist_ok=True)
+stream_dir = '/content/lakehouse/bench/raw_admissions_stream'
+
+print(" BRONZE STREAMING — peak generator memory vs. table size")
+print(f"{'Rows':>12} {'Batch':>10} {'Seconds':>10} {'Peak MB':>10} {'File MB':>10}")
+print("-" * 56)
+
+for n in [100_000, 1_000_000, 10_000_000]:
+    # NumPy allocations are visible to tracemalloc; Arrow buffers come from its own pool
+    tracemalloc.start()
+    arrow_before = pa.total_allocated_bytes()
+    arrow_peak   = 0
+
+    def tracked(batches):
+        global arrow_peak
+        for b in batches:
+            arrow_peak = max(arrow_peak, pa.total_allocated_bytes() - arrow_before)
+            yield b
+
+    t0 = time.perf_counter()
+    files = write_partitioned(stream_dir,
+                              tracked(iter_ehr_batches(n, 250_000, seed=EHR_SEED)),
+                              BRONZE_PARTITIONS)
+    elapsed = time.perf_counter() - t0
+    _, numpy_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    peak_mb = (numpy_peak + arrow_peak) / 1e6
+    rows    = sum(f['record_count'] for f in files)
+    size_mb = sum(os.path.getsize(f['path']) for f in files) / 1e6
+    print(f"{rows:>12,} {250_000:>10,} {elapsed:>10.2f} {peak_mb:>10.1f} {size_mb:>10.1f}")
+    shutil.rmtree(stream_dir)
+
+print("\n Peak memory is bounded by the batch size, not by the row count")
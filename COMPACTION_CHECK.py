@@ -0,0 +1,78 @@
+# ─── COMPACTION CHECK: late corrections survive bronze compaction ────────────
+# Three appends land in one partition, largest first: the original admission,
+# its correction, then unrelated rows. The target is set so the oldest and the
+# newest file would fit one bin but the oldest and the correction would not.
+# Silver must keep the correction before compaction, and still after
+# compact_table: a rewritten file takes the newest sequence number of its
+# inputs, so the planner may only pack runs of files adjacent in sequence.
+# Within a bin the rewrite reads its inputs oldest first, so the newer version
+# keeps the higher file_row_number. The planner must also never pack two files
+# together across one it leaves in place.
+COMPACTION_CHECK_DIR  = '/content/lakehouse/bench/compaction_check'
+COMPACTION_CHECK_META = f'{COMPACTION_CHECK_DIR}/bronze/iceberg_metadata.json'
+COMPACTION_CHECK_DAY  = '2024-06-03'
+
+def compaction_check_rows(n, seed, id_offset):
+    return pa.Table.from_batches(list(iter_ehr_batches(
+        n, seed=seed, id_offset=id_offset,
+        start=COMPACTION_CHECK_DAY, end=COMPACTION_CHECK_DAY)))
+
+shutil.rmtree(COMPACTION_CHECK_DIR, ignore_errors=True)
+original   = compaction_check_rows(24_000, EHR_SEED, 0)
+correction = original.slice(0, 1)
+correction = correction.set_column(correction.schema.get_field_index('los_days'), 'los_days',
+                                   pa.array([99], correction.schema.field('los_days').type))
+corrected_id = correction['patient_id'][0].as_py()
+for table in [original,
+              pa.concat_tables([correction, compaction_check_rows(18_000, EHR_SEED + 1, 24_000)]),
+              compaction_check_rows(12_000, EHR_SEED + 2, 42_000)]:
+    append_to_table(COMPACTION_CHECK_META, f'{COMPACTION_CHECK_DIR}/bronze',
+                    'bronze.compaction_check', bronze_batches(table.to_batches()),
+                    BRONZE_PARTITIONS)
+
+def compaction_check_los(con):
+    # The silver los_days of the corrected admission over the table's current files
+    con.execute(f"CREATE OR REPLACE TEMP VIEW bronze_scan AS SELECT * FROM "
+                f"{versioned_source(load_data_files(COMPACTION_CHECK_META))}")
+    return [r[0] for r in con.execute(
+        f"SELECT los_days FROM ({silver_sql}) WHERE reject_reason IS NULL AND patient_id = ?",
+        [corrected_id]).fetchall()]
+
+check_con    = connect_duckdb()
+sizes        = [f['file_size_bytes'] for f in load_data_files(COMPACTION_CHECK_META)]
+target_bytes = sizes[0] + sizes[2]
+assert sizes[0] > sizes[1] > sizes[2] and sizes[0] + sizes[1] > target_bytes, \
+    'compaction check files are not ordered largest first'
+before       = compaction_check_los(check_con)
+_, n_removed, n_written = compact_table(COMPACTION_CHECK_META, target_bytes=target_bytes)
+after        = compaction_check_los(check_con)
+check_con.close()
+with catalog_cursor() as cur:
+    cur.execute("DROP VIEW IF EXISTS bronze.compaction_check")
+shutil.rmtree(COMPACTION_CHECK_DIR)
+
+# Planner: a kept, sorted file with sequence number 2 sits between two small ones
+planned = plan_compaction(
+    [{'path': 'a', 'partition': {'p': 0}, 'file_size_bytes': 10, 'sequence_number': 1},
+     {'path': 'b', 'partition': {'p': 0}, 'file_size_bytes': 1_000, 'sequence_number': 2,
+      'sorted_by': CLUSTER_ORDER},
+     {'path': 'c', 'partition': {'p': 0}, 'file_size_bytes': 10, 'sequence_number': 3}],
+    target_bytes=1_000, sort_order=CLUSTER_ORDER)
+straddling = any({'a', 'c'} <= {f['path'] for f in b} for b in planned)
+
+# Planner: sizes fall with sequence number, so packing by size alone would pair 1 and 3
+planned = plan_compaction(
+    [{'path': str(seq), 'partition': {'p': 0}, 'file_size_bytes': size, 'sequence_number': seq}
+     for seq, size in [(1, 60), (2, 50), (3, 40)]],
+    target_bytes=100, sort_order=CLUSTER_ORDER)
+planned_runs = [[f['sequence_number'] for f in b] for b in planned]
+
+print(" COMPACTION CHECK — late correction vs bronze compaction")
+print(f"   Bronze files: {len(sizes)} ({' > '.join(f'{s / 1024:.0f} KB' for s in sizes)}) → "
+      f"{n_written} after compacting {n_removed}")
+print(f"   Silver los_days of {corrected_id}: before {before} | after {after}")
+print(f"   Planner packs across a kept file: {straddling}")
+print(f"   Planner bins for sequence numbers 1-3 (60/50/40 B, target 100 B): {planned_runs}")
+assert before == [99] and after == [99], 'compaction brought back a superseded row'
+assert not straddling, 'plan_compaction packed files across a newer kept file'
+assert planned_runs == [[1], [2, 3]], 'plan_compaction packed files that are not adjacent in sequence'
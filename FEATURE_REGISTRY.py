@@ -0,0 +1,279 @@
+# ─── FEATURE REGISTRY: every gold feature declared once ──────────────────────
+# Each entry names a feature, how it is computed, its DuckDB type and, where a
+# window can be empty, its default. The registry compiles to the batch gold
+# SQL, to the incremental SQL that extends per-patient state, to a per-event
+# Python update for the online path, and to Polars expressions for the polars
+# gold engine; FEATURE_REGISTRY_CHECK runs the first three over the same
+# admissions and compares them.
+#
+#   kind        value                                      per-patient state
+#   column      silver column as is                        -
+#   row         expression over the current admission      -
+#   encode      index of source in a fixed, sorted vocab   -
+#   cumulative  count / sum / max over visits to date      running value
+#   last_n      mean of source over the previous n visits  last n source values
+#   calendar    visits in the previous `days` days         admission day numbers
+#   since_last  days since the previous admission          last admission date
+#
+# Encodings use sorted vocabularies, which gives the codes a LabelEncoder fitted
+# on the full data would; values outside the vocabulary encode as NULL. Row
+# features spell their expression once per target (sql, fn, polars); Polars'
+# SQL ROUND rounds half to even, so it cannot reuse the DuckDB text.
+#
+# Each visit horizon is a model input: adding one (e.g. 30 or 180 days) adds a
+# column to FEATURES and so changes X for every model downstream.
+GOLD_VISIT_HORIZONS = [90, 365]
+EPOCH = datetime(1970, 1, 1).date()
+
+def feature(name, kind, dtype, model=True, **spec):
+    return {'name': name, 'kind': kind, 'dtype': dtype, 'model': model, **spec}
+
+def sql_round(x, digits):
+    # DuckDB's ROUND goes half away from zero; Python's round() goes half to even
+    p = 10 ** digits
+    return math.copysign(math.floor(abs(x) * p + 0.5), x) / p
+
+SEASON_CODES = {'WINTER': 1, 'SPRING': 2, 'SUMMER': 3}
+
+FEATURE_REGISTRY = [
+    feature('age',                   'column',     'INTEGER'),
+    feature('gender_enc',            'encode',     'INTEGER', source='gender', vocab=['F', 'M']),
+    feature('age_bucket_enc',        'encode',     'INTEGER', source='age_bucket',
+            vocab=['18-39', '40-59', '60-74', '75+']),
+
+    feature('los_days',              'column',     'INTEGER'),
+    feature('num_procedures',        'column',     'TINYINT'),
+    feature('num_diagnoses',         'column',     'TINYINT'),
+    *[feature(c, 'column', 'INTEGER') for c in
+      ['has_diabetes', 'has_chf', 'has_copd', 'has_ckd', 'has_cancer', 'has_dementia']],
+    feature('charlson_index',        'column',     'TINYINT'),
+    feature('max_charlson_ever',     'cumulative', 'TINYINT', agg='max', source='charlson_index'),
+    feature('ten_yr_survival_prob',  'column',     'DOUBLE'),
+
+    feature('prior_visits_12m',      'column',     'SMALLINT'),
+    *[feature(f'visits_prior_{h}d',  'calendar',   'BIGINT', days=h) for h in GOLD_VISIT_HORIZONS],
+    feature('avg_los_last_3_visits', 'last_n',     'DOUBLE', agg='avg', source='los_days',
+            rows=3, digits=2, default_column='los_days'),
+    feature('cumulative_procedures', 'cumulative', 'BIGINT', agg='sum', source='num_procedures'),
+    feature('days_since_last_admit', 'since_last', 'BIGINT', default=999),
+
+    feature('admit_month',           'column',     'TINYINT'),
+    feature('admit_dow',             'column',     'TINYINT'),
+    feature('season_code',           'row',        'INTEGER',
+            sql="CASE admit_season WHEN 'WINTER' THEN 1 WHEN 'SPRING' THEN 2 "
+                "WHEN 'SUMMER' THEN 3 ELSE 4 END",
+            fn=lambda r: SEASON_CODES.get(r['admit_season'], 4),
+            polars=pl.col('admit_season').replace_strict(SEASON_CODES, default=4)),
+    feature('is_weekend_admit',      'row',        'INTEGER',
+            sql="CASE WHEN admit_dow IN (5, 6) THEN 1 ELSE 0 END",
+            fn=lambda r: int(r['admit_dow'] in (5, 6)),
+            polars=pl.col('admit_dow').is_in([5, 6])),
+    feature('visit_number',          'cumulative', 'BIGINT', agg='count'),
+
+    feature('los_x_comorbidity',     'row',        'INTEGER',
+            sql="los_days * charlson_index",
+            fn=lambda r: r['los_days'] * r['charlson_index'],
+            polars=pl.col('los_days') * pl.col('charlson_index')),
+    feature('procedures_per_day',    'row',        'DOUBLE',
+            sql="COALESCE(ROUND(num_procedures / NULLIF(CAST(los_days AS DOUBLE), 0), 3), 0)",
+            fn=lambda r: sql_round(r['num_procedures'] / r['los_days'], 3) if r['los_days'] else 0,
+            polars=(pl.col('num_procedures') / pl.col('los_days').replace(0, None))
+                   .round(3, mode='half_away_from_zero').fill_null(0)),
+    feature('cardio_burden',         'row',        'INTEGER',
+            sql="has_chf + has_ckd + has_copd",
+            fn=lambda r: r['has_chf'] + r['has_ckd'] + r['has_copd'],
+            polars=pl.col('has_chf') + pl.col('has_ckd') + pl.col('has_copd')),
+    feature('metabolic_burden',      'row',        'INTEGER',
+            sql="has_diabetes + has_cancer + has_dementia",
+            fn=lambda r: r['has_diabetes'] + r['has_cancer'] + r['has_dementia'],
+            polars=pl.col('has_diabetes') + pl.col('has_cancer') + pl.col('has_dementia')),
+
+    # Kept in gold for reporting and dashboards, not model inputs
+    feature('age_bucket',            'column',     'VARCHAR', model=False),
+    feature('gender',                'column',     'VARCHAR', model=False),
+    feature('risk_tier',             'column',     'VARCHAR', model=False),
+    feature('risk_tier_enc',         'encode',     'INTEGER', model=False, source='risk_tier',
+            vocab=['HIGH', 'LOW', 'MEDIUM', 'VERY_HIGH']),
+    feature('admit_season',          'column',     'VARCHAR', model=False),
+]
+
+FEATURES = [f['name'] for f in FEATURE_REGISTRY if f['model']]
+
+# ─── Batch and incremental SQL ───────────────────────────────────────────────
+DAY_SQL = "admission_date - DATE '1970-01-01'"
+
+def last_n_key(f):
+    return f"{f['source']}_last_{f['rows']}"
+
+def feature_sql(f, incremental=False):
+    # incremental=True continues each window from the patient's state row `s`
+    k, name = f['kind'], f['name']
+    if k == 'column':
+        return name
+    if k == 'row':
+        return f['sql']
+    if k == 'encode':
+        whens = ' '.join(f"WHEN '{v}' THEN {i}" for i, v in enumerate(f['vocab']))
+        return f"CASE {f['source']} {whens} END"
+    if k == 'cumulative':
+        window = {'count': "COUNT(*)", 'sum': f"SUM({f.get('source')})",
+                  'max': f"MAX({f.get('source')})"}[f['agg']] + " OVER to_date"
+        if not incremental:
+            return window
+        if f['agg'] == 'max':
+            return f"GREATEST(s.{name}, {window})"
+        return f"COALESCE(s.{name}, 0) + {window}"
+    if k == 'last_n':
+        if not incremental:
+            values = f"AVG({f['source']}) OVER prior_{f['rows']}"
+        else:
+            values = (f"list_avg(list_concat(COALESCE(s.{last_n_key(f)}, []), "
+                      f"LIST({f['source']}) OVER prior_{f['rows']})[-{f['rows']}:])")
+        return f"COALESCE(ROUND({values}, {f['digits']}), {f['default_column']})"
+    if k == 'calendar':
+        window = f"COUNT(*) OVER last_{f['days']}d"
+        if not incremental:
+            return window
+        return (f"len(list_filter(COALESCE(s.recent_days, []), "
+                f"x -> x >= {DAY_SQL} - {f['days']})) + {window}")
+    if k == 'since_last':
+        previous = "LAG(admission_date) OVER visits"
+        if incremental:
+            previous = f"COALESCE({previous}, s.last_admission_date)"
+        return f"COALESCE(DATEDIFF('day', {previous}, admission_date), {f['default']})"
+    raise ValueError(f"Unknown feature kind: {k}")
+
+def registry_select_sql(registry, incremental=False):
+    return ''.join(f"    CAST({feature_sql(f, incremental)} AS {f['dtype']}) AS {f['name']},\n"
+                   for f in registry)
+
+def registry_window_sql(registry):
+    # One per-patient ordering on day number shared by every window feature
+    windows = ["visits AS (PARTITION BY patient_id ORDER BY admission_date - DATE '1970-01-01')"]
+    if any(f['kind'] == 'cumulative' for f in registry):
+        windows.append("to_date AS (visits ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)")
+    for n in sorted({f['rows'] for f in registry if f['kind'] == 'last_n'}):
+        windows.append(f"prior_{n} AS (visits ROWS BETWEEN {n} PRECEDING AND 1 PRECEDING)")
+    for h in sorted({f['days'] for f in registry if f['kind'] == 'calendar'}):
+        windows.append(f"last_{h}d AS (visits RANGE BETWEEN {h} PRECEDING AND 1 PRECEDING)")
+    return 'WINDOW ' + ',\n       '.join(windows)
+
+def registry_state_sql(registry, incremental=False):
+    # One row per patient summarising gold_delta's admissions, extending the
+    # previous state `s` when incremental; recent_days keeps only the days within
+    # the longest horizon of the patient's last admission
+    prior = (lambda col, empty: f"COALESCE(ANY_VALUE(s.{col}), {empty})") if incremental else None
+    aggs  = ["MAX(admission_date) AS last_admission_date"]
+    for f in registry:
+        if f['kind'] == 'cumulative':
+            agg = {'count': "COUNT(*)", 'sum': f"SUM({f.get('source')})",
+                   'max': f"MAX({f.get('source')})"}[f['agg']]
+            if incremental:
+                agg = (f"GREATEST(ANY_VALUE(s.{f['name']}), {agg})" if f['agg'] == 'max'
+                       else f"{prior(f['name'], 0)} + {agg}")
+            aggs.append(f"CAST({agg} AS {f['dtype']}) AS {f['name']}")
+    for key, (source, n) in {last_n_key(f): (f['source'], f['rows'])
+                             for f in registry if f['kind'] == 'last_n'}.items():
+        values = f"LIST({source} ORDER BY admission_date)"
+        if incremental:
+            values = f"list_concat({prior(key, '[]')}, {values})"
+        aggs.append(f"{values}[-{n}:] AS {key}")
+    horizon = max([f['days'] for f in registry if f['kind'] == 'calendar'], default=None)
+    if horizon:
+        days = f"LIST({DAY_SQL} ORDER BY admission_date)"
+        if incremental:
+            days = f"list_concat({prior('recent_days', '[]')}, {days})"
+        aggs.append(f"{days} AS recent_days")
+    join = " LEFT JOIN gold_state s USING (patient_id)" if incremental else ""
+    sql  = (f"SELECT patient_id,\n       " + ',\n       '.join(aggs) +
+            f"\nFROM gold_delta{join}\nGROUP BY patient_id")
+    if not horizon:
+        return sql
+    return (f"SELECT * REPLACE (list_filter(recent_days, x -> x > last_admission_date "
+            f"- DATE '1970-01-01' - {horizon}) AS recent_days)\nFROM ({sql})")
+
+# ─── Polars ──────────────────────────────────────────────────────────────────
+POLARS_DTYPES = {'TINYINT': pl.Int8, 'SMALLINT': pl.Int16, 'INTEGER': pl.Int32,
+                 'BIGINT': pl.Int64, 'DOUBLE': pl.Float64, 'VARCHAR': pl.String}
+
+def feature_polars(f):
+    # Expression over silver sorted by (patient_id, admission_date); the window
+    # kinds run per patient with .over, in that order
+    k, name = f['kind'], f['name']
+    if k == 'column':
+        expr = pl.col(name)
+    elif k == 'row':
+        expr = f['polars']
+    elif k == 'encode':
+        expr = pl.col(f['source']).replace_strict(f['vocab'], list(range(len(f['vocab']))),
+                                                  default=None)
+    elif k == 'cumulative':
+        if f['agg'] == 'count':
+            expr = pl.int_range(1, pl.len() + 1)
+        elif f['agg'] == 'sum':
+            expr = pl.col(f['source']).cast(pl.Int64).cum_sum()
+        else:
+            expr = pl.col(f['source']).cum_max()
+        expr = expr.over('patient_id')
+    elif k == 'last_n':
+        expr = (pl.col(f['source']).shift(1).rolling_mean(f['rows'], min_samples=1)
+                .over('patient_id').round(f['digits'], mode='half_away_from_zero')
+                .fill_null(pl.col(f['default_column'])))
+    elif k == 'calendar':
+        # Admissions in [day - days, day]: the rolling group, less the current day's
+        # own admissions, which the RANGE frame's 1 PRECEDING leaves out
+        expr = (pl.len().rolling(index_column='admission_date', period=f"{f['days']}d",
+                                 closed='both').over('patient_id')
+                - pl.len().over('patient_id', 'admission_date'))
+    elif k == 'since_last':
+        expr = ((pl.col('admission_date') - pl.col('admission_date').shift(1))
+                .dt.total_days().over('patient_id').fill_null(f['default']))
+    else:
+        raise ValueError(f"Unknown feature kind: {k}")
+    return expr.cast(POLARS_DTYPES[f['dtype']]).alias(name)
+
+# ─── Per-event Python ────────────────────────────────────────────────────────
+def registry_event(registry, state, row):
+    # Features for one admission given the patient's state before it, and the
+    # state after it. State keys match the columns of registry_state_sql; row is
+    # one silver admission as a dict, and admissions must arrive in date order.
+    day  = (row['admission_date'] - EPOCH).days
+    last = state.get('last_admission_date')
+    out, new = {}, {'last_admission_date': row['admission_date']}
+    for f in registry:
+        k, name = f['kind'], f['name']
+        if k == 'column':
+            value = row[name]
+        elif k == 'row':
+            value = f['fn'](row)
+        elif k == 'encode':
+            value = f['vocab'].index(row[f['source']]) if row[f['source']] in f['vocab'] else None
+        elif k == 'cumulative':
+            current = 1 if f['agg'] == 'count' else row[f['source']]
+            before  = state.get(name)
+            value   = (current if before is None
+                       else max(before, current) if f['agg'] == 'max' else before + current)
+            new[name] = value
+        elif k == 'last_n':
+            values = state.get(last_n_key(f)) or []
+            value  = (sql_round(sum(values) / len(values), f['digits']) if values
+                      else row[f['default_column']])
+            new[last_n_key(f)] = (values + [row[f['source']]])[-f['rows']:]
+        elif k == 'calendar':
+            value = sum(day - f['days'] <= d < day for d in state.get('recent_days') or [])
+        elif k == 'since_last':
+            value = (row['admission_date'] - last).days if last else f['default']
+        else:
+            raise ValueError(f"Unknown feature kind: {k}")
+        out[name] = value
+    horizon = max([f['days'] for f in registry if f['kind'] == 'calendar'], default=None)
+    if horizon:
+        new['recent_days'] = [d for d in (state.get('recent_days') or []) + [day]
+                              if d > day - horizon]
+    return out, new
+
+print(" FEATURE REGISTRY")
+print(f"   Features declared: {len(FEATURE_REGISTRY)} | Model inputs: {len(FEATURES)}")
+for kind in ['column', 'row', 'encode', 'cumulative', 'last_n', 'calendar', 'since_last']:
+    names = [f['name'] for f in FEATURE_REGISTRY if f['kind'] == kind]
+    print(f"   {kind:<11} {len(names):>2}  {', '.join(names[:4])}{' …' if len(names) > 4 else ''}")
@@ -0,0 +1,98 @@
+import time
+
+# ─── FEATURE REGISTRY CHECK: batch SQL vs incremental SQL vs per-event Python ─
+# One cohort sample goes through all three compilations of FEATURE_REGISTRY:
+# gold_sql over the whole sample; the state of everything before a split date
+# extended by gold_delta_sql over the rest; and registry_event replayed admission
+# by admission in date order. Every feature and the final per-patient state must
+# agree. Patients with two admissions on one day are left out: their order
+# within the day is arbitrary in SQL, so the row frames may differ.
+REGISTRY_CHECK_ROWS  = 100_000
+REGISTRY_CHECK_SPLIT = 0.8   # share of admissions folded into the initial state
+REGISTRY_CHECK_DIR   = '/content/lakehouse/bench/feature_registry'
+
+def count_mismatches(a, b):
+    # Value-wise differences between two aligned columns; NULL matches NULL
+    if pd.api.types.is_float_dtype(a) or pd.api.types.is_float_dtype(b):
+        return int((~np.isclose(a.astype('float64'), b.astype('float64'), equal_nan=True)).sum())
+    return int((~((a == b) | (a.isna() & b.isna()))).sum())
+
+shutil.rmtree(REGISTRY_CHECK_DIR, ignore_errors=True)
+reg_con = connect_duckdb()
+bench_silver(reg_con, REGISTRY_CHECK_ROWS, REGISTRY_CHECK_DIR)
+reg_ties = {pid for (pid,) in reg_con.execute(
+    "SELECT DISTINCT patient_id FROM silver GROUP BY patient_id, admission_date "
+    "HAVING COUNT(*) > 1").fetchall()}
+split = reg_con.execute(f"SELECT quantile_disc(admission_date, {REGISTRY_CHECK_SPLIT}) "
+                        "FROM silver").fetchone()[0]
+key   = ['patient_id', 'admission_date']
+names = [f['name'] for f in FEATURE_REGISTRY]
+
+# Batch: the gold query over the whole sample
+batch = reg_con.execute(gold_sql).fetch_arrow_table().to_pandas()
+batch = batch[~batch['patient_id'].isin(reg_ties)].set_index(key).sort_index()
+
+# Incremental: state from admissions before the split, then the rest as one delta
+reg_con.execute(f"CREATE OR REPLACE TEMP VIEW gold_delta AS "
+                f"SELECT * FROM silver WHERE admission_date < DATE '{split}'")
+reg_con.execute(f"CREATE OR REPLACE TEMP TABLE gold_state AS "
+                f"{registry_state_sql(FEATURE_REGISTRY)}")
+reg_con.execute(f"CREATE OR REPLACE TEMP VIEW gold_delta AS "
+                f"SELECT * FROM silver WHERE admission_date >= DATE '{split}'")
+incremental = reg_con.execute(gold_delta_sql).fetch_arrow_table().to_pandas()
+incremental = incremental[~incremental['patient_id'].isin(reg_ties)].set_index(key).sort_index()
+initial_state     = reg_con.execute("SELECT * FROM gold_state").fetch_arrow_table().to_pylist()
+incremental_state = reg_con.execute(
+    registry_state_sql(FEATURE_REGISTRY, incremental=True)).fetch_arrow_table().to_pylist()
+reg_con.execute("CREATE OR REPLACE TEMP VIEW gold_delta AS SELECT * FROM silver")
+batch_state = reg_con.execute(registry_state_sql(FEATURE_REGISTRY)).fetch_arrow_table().to_pylist()
+
+# Per-event Python: every admission replayed against its patient's running state
+admissions = reg_con.execute("SELECT * FROM silver ORDER BY patient_id, admission_date") \
+                    .fetch_arrow_table().to_pylist()
+reg_con.close()
+states, events = {}, []
+t0 = time.perf_counter()
+for row in admissions:
+    features, states[row['patient_id']] = registry_event(
+        FEATURE_REGISTRY, states.get(row['patient_id'], {}), row)
+    events.append({'patient_id': row['patient_id'], 'admission_date': row['admission_date'],
+                   **features})
+event_us = (time.perf_counter() - t0) / len(admissions) * 1e6
+python = pd.DataFrame(events)
+python = python[~python['patient_id'].isin(reg_ties)]
+python = python.set_index(key).sort_index()
+
+vs_incremental = {n: count_mismatches(batch.loc[incremental.index, n], incremental[n])
+                  for n in names}
+vs_python      = {n: count_mismatches(batch[n], python.loc[batch.index, n]) for n in names}
+
+# Final state: batch SQL, incremental SQL and the replay's state per patient
+state_keys = [c for c in batch_state[0] if c != 'patient_id'] if batch_state else []
+by_patient = lambda rows: {r['patient_id']: r for r in rows if r['patient_id'] not in reg_ties}
+sql_state  = by_patient(batch_state)
+inc_state  = {**by_patient(initial_state), **by_patient(incremental_state)}   # delta rows win
+state_mismatches = {c: sum(sql_state[p][c] != inc_state[p][c] or sql_state[p][c] != states[p][c]
+                           for p in sql_state)
+                    for c in state_keys}
+
+print(" FEATURE REGISTRY CHECK — batch SQL vs incremental SQL vs per-event Python")
+print(f"   Admissions: {len(admissions):,} | Patients: {len(states):,} | "
+      f"Same-day repeat patients left out: {len(reg_ties):,}")
+print(f"   Incremental split at {split}: {len(incremental):,} admissions extended from state")
+print(f"   Per-event Python: {event_us:.1f} µs per admission")
+print(f"\n{'':<24} {'Features':>9} {'Rows':>9} {'Mismatches':>11}")
+print("-" * 56)
+for label, counts, rows in [('batch vs incremental', vs_incremental, len(incremental)),
+                            ('batch vs per-event', vs_python, len(batch)),
+                            ('state (3-way)', state_mismatches, len(sql_state))]:
+    print(f"   {label:<21} {len(counts):>9} {rows:>9,} {sum(counts.values()):>11,}")
+    for n, c in counts.items():
+        if c:
+            print(f"      {n}: {c:,}")
+registry_equivalent = not any(sum(c.values()) for c in [vs_incremental, vs_python,
+                                                         state_mismatches])
+print(f"\n   Equivalent: {registry_equivalent}")
+shutil.rmtree(REGISTRY_CHECK_DIR)
+assert registry_equivalent, 'registry compilations disagree on: ' + ', '.join(sorted(
+    {n for c in [vs_incremental, vs_python, state_mismatches] for n, m in c.items() if m}))
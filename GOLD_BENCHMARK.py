@@ -0,0 +1,170 @@
+import time
+
+# ─── GOLD BENCHMARK: single window pass vs the CTE + self-join query ─────────
+GOLD_BENCH_ROWS = [1_000_000, 10_000_000]
+GOLD_BENCH_DIR  = '/content/lakehouse/bench/gold'
+
+# The previous gold query, kept as the baseline: three feature CTEs over `base`,
+# each LEFT JOINed back on (patient_id, admission_date)
+GOLD_SQL_SELF_JOIN = """
+WITH
+
+-- ── CTE 1: Base with row numbering ─────────────────────────────────────────
+base AS (
+    SELECT *,
+           ROW_NUMBER() OVER (
+               PARTITION BY patient_id
+               ORDER BY admission_date
+           ) AS visit_number
+    FROM silver
+),
+
+-- ── CTE 2: Rolling Window Features (KEY resume claim) ──────────────────────
+rolling AS (
+    SELECT
+        patient_id,
+        admission_date,
+
+        -- Rolling visit counts
+        COUNT(*) OVER (
+            PARTITION BY patient_id
+            ORDER BY admission_date
+            ROWS BETWEEN 2 PRECEDING AND 1 PRECEDING
+        )                                    AS visits_prior_90d,
+
+        COUNT(*) OVER (
+            PARTITION BY patient_id
+            ORDER BY admission_date
+            ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING
+        )                                    AS visits_prior_365d,
+
+        -- Rolling avg LOS (care intensity signal)
+        ROUND(AVG(los_days) OVER (
+            PARTITION BY patient_id
+            ORDER BY admission_date
+            ROWS BETWEEN 3 PRECEDING AND 1 PRECEDING
+        ), 2)                                AS avg_los_last_3_visits,
+
+        -- Cumulative procedures
+        SUM(num_procedures) OVER (
+            PARTITION BY patient_id
+            ORDER BY admission_date
+            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+        )                                    AS cumulative_procedures,
+
+        -- Max charlson historically
+        MAX(charlson_index) OVER (
+            PARTITION BY patient_id
+            ORDER BY admission_date
+            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+        )                                    AS max_charlson_ever,
+
+        -- Days since last admission (LAG)
+        DATEDIFF('day',
+            LAG(admission_date) OVER (
+                PARTITION BY patient_id ORDER BY admission_date
+            ),
+            admission_date
+        )                                    AS days_since_last_admit
+    FROM base
+),
+
+-- ── CTE 3: Seasonal & Temporal Patterns ─────────────────────────────────────
+seasonal AS (
+    SELECT
+        patient_id, admission_date,
+        CASE admit_season
+            WHEN 'WINTER' THEN 1
+            WHEN 'SPRING' THEN 2
+            WHEN 'SUMMER' THEN 3
+            ELSE 4
+        END AS season_code,
+        CASE WHEN admit_dow IN (5, 6) THEN 1 ELSE 0
+        END AS is_weekend_admit
+    FROM base
+),
+
+-- ── CTE 4: Interaction Features ─────────────────────────────────────────────
+interactions AS (
+    SELECT
+        patient_id, admission_date,
+        los_days * charlson_index                           AS los_x_comorbidity,
+        ROUND(num_procedures / NULLIF(CAST(los_days AS DOUBLE), 0), 3) AS procedures_per_day,
+        has_chf + has_ckd + has_copd                       AS cardio_burden,
+        has_diabetes + has_cancer + has_dementia            AS metabolic_burden
+    FROM base
+)
+
+-- ── FINAL GOLD: Join all feature CTEs ───────────────────────────────────────
+SELECT
+    b.patient_id, b.admission_date, b.visit_number,
+    b.age, b.age_bucket, b.gender,
+    b.los_days, b.num_procedures, b.num_diagnoses,
+    b.has_diabetes, b.has_chf, b.has_copd,
+    b.has_ckd, b.has_cancer, b.has_dementia,
+    b.charlson_index, b.prior_visits_12m,
+    b.risk_tier, b.ten_yr_survival_prob,
+    b.admit_month, b.admit_dow, b.admit_season,
+
+    -- Rolling features (from CTE 2)
+    COALESCE(r.visits_prior_90d,      0) AS visits_prior_90d,
+    COALESCE(r.visits_prior_365d,     0) AS visits_prior_365d,
+    COALESCE(r.avg_los_last_3_visits, b.los_days) AS avg_los_last_3_visits,
+    COALESCE(r.cumulative_procedures, 0) AS cumulative_procedures,
+    COALESCE(r.max_charlson_ever,     b.charlson_index) AS max_charlson_ever,
+    COALESCE(r.days_since_last_admit, 999) AS days_since_last_admit,
+
+    -- Seasonal features (from CTE 3)
+    s.season_code,
+    s.is_weekend_admit,
+
+    -- Interaction features (from CTE 4)
+    i.los_x_comorbidity,
+    COALESCE(i.procedures_per_day, 0) AS procedures_per_day,
+    i.cardio_burden,
+    i.metabolic_burden,
+
+    -- TARGET
+    b.readmitted_30d
+
+FROM base b
+LEFT JOIN rolling      r ON b.patient_id = r.patient_id AND b.admission_date = r.admission_date
+LEFT JOIN seasonal     s ON b.patient_id = s.patient_id AND b.admission_date = s.admission_date
+LEFT JOIN interactions i ON b.patient_id = i.patient_id AND b.admission_date = i.admission_date
+ORDER BY b.patient_id, b.admission_date
+"""
+
+def drain(con, sql):
+    t0 = time.perf_counter()
+    rows = sum(b.num_rows for b in con.execute(sql).fetch_record_batch(1_000_000))
+    return rows, time.perf_counter() - t0
+
+print(" GOLD BENCHMARK — single window pass vs CTE self-joins")
+print(f"{'Silver rows':>12} {'Self-join s':>12} {'Window s':>10} {'Speedup':>8} {'Identical':>10}")
+print("-" * 57)
+
+bench_con = connect_duckdb()
+for n in GOLD_BENCH_ROWS:
+    shutil.rmtree(GOLD_BENCH_DIR, ignore_errors=True)
+    bench_silver(bench_con, n, GOLD_BENCH_DIR)
+
+    rows, join_s   = drain(bench_con, GOLD_SQL_SELF_JOIN)
+    _,    window_s = drain(bench_con, gold_sql)
+    # Multiset comparison in both directions, skipped on the largest size. The
+    # visits_prior_* features are left out: gold now counts them over calendar
+    # windows, where the baseline counted the previous 2 / 5 visits. Both sides
+    # are projected onto the baseline's columns by name, which also leaves out
+    # the patient_bucket and encoded columns gold adds.
+    identical = '-'
+    if n == GOLD_BENCH_ROWS[0]:
+        shared = [c for c, *_ in bench_con.execute(f"DESCRIBE {GOLD_SQL_SELF_JOIN}").fetchall()
+                  if not c.startswith('visits_prior_')]
+        same   = f"SELECT {', '.join(shared)} FROM ({{}})"
+        identical = all(bench_con.execute(
+            f"SELECT COUNT(*) FROM (({same.format(a)}) EXCEPT ALL ({same.format(b)}))"
+        ).fetchone()[0] == 0
+            for a, b in [(GOLD_SQL_SELF_JOIN, gold_sql), (gold_sql, GOLD_SQL_SELF_JOIN)])
+    print(f"{rows:>12,} {join_s:>12.1f} {window_s:>10.1f} {join_s / window_s:>7.1f}x "
+          f"{str(identical):>10}")
+bench_con.close()
+shutil.rmtree(GOLD_BENCH_DIR)
@@ -0,0 +1,63 @@
+import time
+
+# ─── GOLD ENGINE BENCHMARK: DuckDB vs Polars full gold builds ────────────────
+# Each engine builds gold from the same cohort silver and writes it through
+# materialize exactly as refresh_gold does. Peak memory is the process RSS above
+# where it stood when the build started, sampled from a second thread: Polars
+# allocates outside DuckDB's buffer manager, so duckdb_memory() would miss it.
+ENGINE_BENCH_ROWS = [1_000_000, 5_000_000]
+ENGINE_BENCH_DIR  = '/content/lakehouse/bench/gold_engines'
+
+def process_rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+print(" GOLD ENGINE BENCHMARK — full gold build per engine")
+print(f"{'Silver rows':>12} {'Engine':>8} {'Seconds':>8} {'Rows/sec':>11} {'Peak MB':>8} "
+      f"{'Identical':>10}")
+print("-" * 62)
+
+engine_con     = connect_duckdb()
+engine_results = {}
+for n in ENGINE_BENCH_ROWS:
+    shutil.rmtree(ENGINE_BENCH_DIR, ignore_errors=True)
+    silver_files = bench_silver(engine_con, n, ENGINE_BENCH_DIR)
+
+    outputs = {}
+    for engine, build in GOLD_ENGINES.items():
+        base = process_rss()
+        with watch_peak(lambda: (process_rss(),)) as peak:
+            t0 = time.perf_counter()
+            outputs[engine] = materialize(engine_con, build(engine_con, silver_files),
+                                          f'{ENGINE_BENCH_DIR}/gold_{engine}',
+                                          GOLD_BUCKET_PARTITIONS, lookup_key='patient_id')
+            elapsed = time.perf_counter() - t0
+        engine_results[(n, engine)] = {'seconds': elapsed,
+                                       'peak_mb': max(peak[0] - base, 0) / 1024**2}
+
+    # Same schema, and the same multiset of rows both ways, on the smallest size
+    identical = '-'
+    if n == ENGINE_BENCH_ROWS[0]:
+        reference, *others = [parquet_source(files) for files in outputs.values()]
+        identical = all(
+            engine_con.execute(f"DESCRIBE SELECT * FROM {reference}").fetchall()
+            == engine_con.execute(f"DESCRIBE SELECT * FROM {other}").fetchall()
+            and all(engine_con.execute(
+                f"SELECT COUNT(*) FROM (SELECT * FROM {a} EXCEPT ALL SELECT * FROM {b})"
+            ).fetchone()[0] == 0 for a, b in [(reference, other), (other, reference)])
+            for other in others)
+    rows = sum(f['record_count'] for f in outputs['duckdb'])
+    for engine in GOLD_ENGINES:
+        r = engine_results[(n, engine)]
+        print(f"{rows:>12,} {engine:>8} {r['seconds']:>8.1f} {rows / r['seconds']:>11,.0f} "
+              f"{r['peak_mb']:>8.0f} {str(identical):>10}")
+engine_con.close()
+shutil.rmtree(ENGINE_BENCH_DIR)
+
+print("\n   Fastest engine per size:")
+for n in ENGINE_BENCH_ROWS:
+    fastest = min(GOLD_ENGINES, key=lambda e: engine_results[(n, e)]['seconds'])
+    print(f"   {n:>12,} rows → {fastest}")
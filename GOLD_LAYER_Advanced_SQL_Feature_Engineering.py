@@ -1,143 +1,297 @@
-con2 = duckdb.connect()
-con2.execute("""CREATE TABLE silver AS
-              SELECT * FROM read_parquet('/content/lakehouse/silver/admissions_clean.parquet')""")
-
-gold_sql = """
-WITH
-
--- ── CTE 1: Base with row numbering ─────────────────────────────────────────
-base AS (
-    SELECT *,
-           ROW_NUMBER() OVER (
-               PARTITION BY patient_id
-               ORDER BY admission_date
-           ) AS visit_number
-    FROM silver
-),
-
--- ── CTE 2: Rolling Window Features (KEY resume claim) ──────────────────────
-rolling AS (
-    SELECT
-        patient_id,
-        admission_date,
-
-        -- Rolling visit counts
-        COUNT(*) OVER (
-            PARTITION BY patient_id
-            ORDER BY admission_date
-            ROWS BETWEEN 2 PRECEDING AND 1 PRECEDING
-        )                                    AS visits_prior_90d,
-
-        COUNT(*) OVER (
-            PARTITION BY patient_id
-            ORDER BY admission_date
-            ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING
-        )                                    AS visits_prior_365d,
-
-        -- Rolling avg LOS (care intensity signal)
-        ROUND(AVG(los_days) OVER (
-            PARTITION BY patient_id
-            ORDER BY admission_date
-            ROWS BETWEEN 3 PRECEDING AND 1 PRECEDING
-        ), 2)                                AS avg_los_last_3_visits,
-
-        -- Cumulative procedures
-        SUM(num_procedures) OVER (
-            PARTITION BY patient_id
-            ORDER BY admission_date
-            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
-        )                                    AS cumulative_procedures,
-
-        -- Max charlson historically
-        MAX(charlson_index) OVER (
-            PARTITION BY patient_id
-            ORDER BY admission_date
-            ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
-        )                                    AS max_charlson_ever,
-
-        -- Days since last admission (LAG)
-        DATEDIFF('day',
-            LAG(admission_date) OVER (
-                PARTITION BY patient_id ORDER BY admission_date
-            ),
-            admission_date
-        )                                    AS days_since_last_admit
-    FROM base
-),
-
--- ── CTE 3: Seasonal & Temporal Patterns ─────────────────────────────────────
-seasonal AS (
-    SELECT
-        patient_id, admission_date,
-        CASE admit_season
-            WHEN 'WINTER' THEN 1
-            WHEN 'SPRING' THEN 2
-            WHEN 'SUMMER' THEN 3
-            ELSE 4
-        END AS season_code,
-        CASE WHEN admit_dow IN (5, 6) THEN 1 ELSE 0
-        END AS is_weekend_admit
-    FROM base
-),
-
--- ── CTE 4: Interaction Features ─────────────────────────────────────────────
-interactions AS (
-    SELECT
-        patient_id, admission_date,
-        los_days * charlson_index                           AS los_x_comorbidity,
-        ROUND(num_procedures / NULLIF(CAST(los_days AS DOUBLE), 0), 3) AS procedures_per_day,
-        has_chf + has_ckd + has_copd                       AS cardio_burden,
-        has_diabetes + has_cancer + has_dementia            AS metabolic_burden
-    FROM base
+GOLD_PATIENT_RANGE = (None, None)   # window features need whole patients, so slice by id
+
+gold_ranges = {'patient_id': GOLD_PATIENT_RANGE}
+
+# Gold and its state are split into GOLD_BUCKETS patient-hash buckets, one
+# partition directory each, so training, scoring and SHAP can hand a bucket to
+# each worker with nothing shared between them. The bucket is an md5 prefix
+# rather than DuckDB's hash() so it is stable across versions and
+# gold_bucket() computes the same value in Python.
+GOLD_BUCKETS           = 8
+GOLD_BUCKET_PARTITIONS = ['patient_bucket']
+GOLD_BUCKET_SQL        = f"CAST('0x' || LEFT(md5(patient_id), 8) AS UBIGINT) % {GOLD_BUCKETS}"
+
+def gold_bucket(patient_id):
+    return int(hashlib.md5(patient_id.encode()).hexdigest()[:8], 16) % GOLD_BUCKETS
+
+def gold_bucket_files(metadata_path=None):
+    # {bucket: [data files]} in the current snapshot, grouped by the manifest's
+    # partition values: file names are per write and carry no meaning
+    buckets = {}
+    for f in load_data_files(metadata_path or GOLD_METADATA):
+        buckets.setdefault(f['partition']['patient_bucket'], []).append(f)
+    return buckets
+
+# Gold's columns are compiled from FEATURE_REGISTRY, each one a projection over
+# silver. The window features share the per-patient ordering `visits`, so silver
+# is sorted once and nothing is joined back. Sorting by bucket first lets one
+# scan write every bucket's file, and the calendar windows order by day number
+# so their RANGE frame edges are integer comparisons.
+gold_sql = f"""
+SELECT
+    patient_id, admission_date,
+    {GOLD_BUCKET_SQL}  AS patient_bucket,
+{registry_select_sql(FEATURE_REGISTRY)}    readmitted_30d
+FROM silver
+{registry_window_sql(FEATURE_REGISTRY)}
+ORDER BY patient_bucket, patient_id, admission_date
+"""
+
+# ─── Gold engines: what computes a full build ────────────────────────────────
+# An engine returns what materialize writes for a full build from the silver
+# files (the `silver` view over them is already in place): SQL, or an Arrow
+# RecordBatchReader with gold_sql's columns in its order and sort. The files,
+# bucket layout and snapshot are the same whichever engine ran. Incremental
+# refreshes always run in DuckDB: they join a small delta to the patient state,
+# and the state itself is aggregated there.
+GOLD_ENGINE       = 'duckdb'     # 'polars': the same registry compiled to a Polars lazy plan
+POLARS_SLICE_ROWS = 1_000_000    # silver rows per Polars collect
+
+def duckdb_gold_source(con, silver_files):
+    return gold_sql
+
+def polars_gold_frame(silver):
+    # gold_sql's sort by (bucket, patient, date), and every window feature runs
+    # per patient over that order. silver already carries patient_bucket, since
+    # Polars has no md5 to compute it with.
+    return (silver.sort('patient_bucket', 'patient_id', 'admission_date')
+                  .select('patient_id', 'admission_date', 'patient_bucket',
+                          *[feature_polars(f) for f in FEATURE_REGISTRY], 'readmitted_30d'))
+
+def polars_slice_sql():
+    # Silver plus each row's patient_bucket and slice: patients in (bucket, patient)
+    # order are cut into runs of about POLARS_SLICE_ROWS admissions
+    return f"""
+WITH patients AS (
+    SELECT patient_id, {GOLD_BUCKET_SQL} AS patient_bucket, COUNT(*) AS n
+    FROM silver GROUP BY patient_id
+), slices AS (
+    SELECT patient_id, patient_bucket,
+           SUM(n) OVER (ORDER BY patient_bucket, patient_id
+                        ROWS UNBOUNDED PRECEDING) // {POLARS_SLICE_ROWS} AS slice_id
+    FROM patients
 )
+SELECT silver.*, slices.patient_bucket, slices.slice_id
+FROM silver JOIN slices USING (patient_id)
+"""
+
+def polars_gold_source(con, silver_files):
+    # Polars allocates outside DuckDB's memory_limit, so gold is not collected
+    # whole. DuckDB hashes each patient to its bucket and splits silver once
+    # into one scratch directory per slice; each slice then reads only its own
+    # files, is collected on the streaming engine and is handed on before the
+    # next, so one slice's rows are held at a time. The
+    # slices follow the output order and are cast to gold_sql's Arrow schema, so
+    # the files are sorted and typed exactly as DuckDB writes them.
+    slice_dir = f'{DUCKDB_TEMP_DIR}/polars_slices_{uuid.uuid4().hex[:8]}'
+    con.execute(f"COPY ({polars_slice_sql()}) TO '{slice_dir}' "
+                f"(FORMAT PARQUET, PARTITION_BY (slice_id))")
+    # No directory at all when silver has no rows in range
+    slices = sorted(int(d.split('=', 1)[1]) for d in
+                    (os.listdir(slice_dir) if os.path.isdir(slice_dir) else []))
+    schema = con.execute(f"SELECT * FROM ({gold_sql}) LIMIT 0").fetch_record_batch().schema
 
--- ── FINAL GOLD: Join all feature CTEs ───────────────────────────────────────
+    def batches():
+        try:
+            for i in slices:
+                table = polars_gold_frame(pl.scan_parquet(f'{slice_dir}/slice_id={i}/*.parquet')) \
+                            .collect(engine='streaming').to_arrow().cast(schema)
+                yield from table.to_batches(LOOKUP_ROW_GROUP_ROWS)
+                del table    # released before the next slice is collected
+        finally:
+            shutil.rmtree(slice_dir, ignore_errors=True)
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+GOLD_ENGINES = {'duckdb': duckdb_gold_source, 'polars': polars_gold_source}
+
+# ─── Incremental gold: per-patient running state ─────────────────────────────
+# Everything the window features need from a patient's earlier admissions, one
+# row per patient as laid out by registry_state_sql: the running value of each
+# cumulative feature, the last admission date, the last n values behind each
+# last_n feature and the day numbers of admissions within the longest calendar
+# horizon of the last one
+GOLD_MODE           = 'incremental'  # 'full': recompute gold from all of silver on every run
+GOLD_METADATA       = '/content/lakehouse/gold/iceberg_metadata.json'
+GOLD_STATE_DIR      = '/content/lakehouse/gold/patient_state'
+GOLD_STATE_METADATA = f'{GOLD_STATE_DIR}/iceberg_metadata.json'
+
+# New admissions (gold_delta) extend the previous state (gold_state): prior
+# counts, sums and maxes are added on, and the LOS / visit-day windows start
+# from the stored lists before running over the patient's new rows
+gold_delta_sql = f"""
 SELECT
-    b.patient_id, b.admission_date, b.visit_number,
-    b.age, b.age_bucket, b.gender,
-    b.los_days, b.num_procedures, b.num_diagnoses,
-    b.has_diabetes, b.has_chf, b.has_copd,
-    b.has_ckd, b.has_cancer, b.has_dementia,
-    b.charlson_index, b.prior_visits_12m,
-    b.risk_tier, b.ten_yr_survival_prob,
-    b.admit_month, b.admit_dow, b.admit_season,
-
-    -- Rolling features (from CTE 2)
-    COALESCE(r.visits_prior_90d,      0) AS visits_prior_90d,
-    COALESCE(r.visits_prior_365d,     0) AS visits_prior_365d,
-    COALESCE(r.avg_los_last_3_visits, b.los_days) AS avg_los_last_3_visits,
-    COALESCE(r.cumulative_procedures, 0) AS cumulative_procedures,
-    COALESCE(r.max_charlson_ever,     b.charlson_index) AS max_charlson_ever,
-    COALESCE(r.days_since_last_admit, 999) AS days_since_last_admit,
-
-    -- Seasonal features (from CTE 3)
-    s.season_code,
-    s.is_weekend_admit,
-
-    -- Interaction features (from CTE 4)
-    i.los_x_comorbidity,
-    COALESCE(i.procedures_per_day, 0) AS procedures_per_day,
-    i.cardio_burden,
-    i.metabolic_burden,
-
-    -- TARGET
-    b.readmitted_30d
-
-FROM base b
-LEFT JOIN rolling      r ON b.patient_id = r.patient_id AND b.admission_date = r.admission_date
-LEFT JOIN seasonal     s ON b.patient_id = s.patient_id AND b.admission_date = s.admission_date
-LEFT JOIN interactions i ON b.patient_id = i.patient_id AND b.admission_date = i.admission_date
-ORDER BY b.patient_id, b.admission_date
+    patient_id, admission_date,
+    {GOLD_BUCKET_SQL}  AS patient_bucket,
+{registry_select_sql(FEATURE_REGISTRY, incremental=True)}    readmitted_30d
+FROM gold_delta LEFT JOIN gold_state s USING (patient_id)
+{registry_window_sql(FEATURE_REGISTRY)}
+ORDER BY patient_bucket, patient_id, admission_date
 """
 
-df_gold = con2.execute(gold_sql).df()
-df_gold.to_parquet('/content/lakehouse/gold/readmission_features.parquet', index=False)
+def gold_state_sql(incremental):
+    return f"""
+SELECT patient_id, {GOLD_BUCKET_SQL} AS patient_bucket, * EXCLUDE (patient_id)
+FROM ({registry_state_sql(FEATURE_REGISTRY, incremental)})
+ORDER BY patient_bucket, patient_id
+"""
+
+GOLD_DIR = '/content/lakehouse/gold'
+
+def refresh_gold(silver_metadata=SILVER_METADATA, gold_metadata=GOLD_METADATA,
+                 gold_dir=GOLD_DIR, state_metadata=GOLD_STATE_METADATA,
+                 state_dir=GOLD_STATE_DIR):
+    # Gold records the silver snapshot and the newest silver transformed_at it has
+    # consumed. In incremental mode only silver rows transformed since then are
+    # read: each is extended from its patient's state and appended to gold, and
+    # the touched patients get a new state row (latest sequence number wins, and
+    # compact_state folds the superseded ones away), so a refresh costs
+    # O(new admissions). A first run, a changed registry or patient
+    # range, a silver overwrite, or a new row dated on or before its patient's
+    # last admission (a late arrival or correction) rebuilds gold and the state
+    # from all of silver. Every build writes new files, so older snapshots that
+    # training sets are pinned to stay readable. The table paths default to the
+    # lakehouse's.
+    previous = read_metadata(gold_metadata)
+    props    = previous.get('properties', {}) if previous else {}
+    settings = {'features':      hashlib.md5((gold_delta_sql + gold_state_sql(True))
+                                             .encode()).hexdigest(),
+                'patient_range': list(GOLD_PATIENT_RANGE),
+                'buckets':       GOLD_BUCKETS}
+    state    = read_metadata(state_metadata)
+    changed  = None
+    if (GOLD_MODE == 'incremental' and props.get('silver_snapshot_id')
+            and props.get('settings') == settings and state and state['row_count']):
+        changed = files_since(silver_metadata, props['silver_snapshot_id'])
+    stats = {'mode': 'incremental', 'engine': 'duckdb', 'silver_files': 0, 'new_admissions': 0,
+             'patients_touched': 0, 'rewound_patients': 0}
+
+    with catalog_cursor() as con:
+        if changed is not None:
+            scan = prune_files(changed, gold_ranges)
+            stats['silver_files'] = len(scan)
+            if not scan:
+                return previous, stats
+            since = props['silver_transformed_at']
+            con.execute(f"""CREATE OR REPLACE TEMP TABLE gold_delta AS
+                            SELECT * FROM {parquet_source(scan)}
+                            WHERE transformed_at > '{since}'::TIMESTAMPTZ
+                            {range_filter_sql(gold_ranges)}""")
+            con.execute(f"""CREATE OR REPLACE TEMP TABLE gold_state AS
+                            SELECT * EXCLUDE (sequence_number, file_ordinal, file_row_number)
+                            FROM {versioned_source(load_data_files(state_metadata))}
+                            SEMI JOIN gold_delta USING (patient_id)
+                            QUALIFY ROW_NUMBER() OVER (PARTITION BY patient_id
+                                                       ORDER BY sequence_number DESC) = 1""")
+            stats['new_admissions'], stats['patients_touched'] = con.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT patient_id) FROM gold_delta").fetchone()
+            stats['rewound_patients'] = con.execute(
+                """SELECT COUNT(DISTINCT patient_id) FROM gold_delta
+                   JOIN gold_state USING (patient_id)
+                   WHERE admission_date <= last_admission_date""").fetchone()[0]
+            if not stats['new_admissions']:
+                con.execute("DROP TABLE gold_delta")
+                con.execute("DROP TABLE gold_state")
+                return previous, stats
+            if stats['rewound_patients']:
+                con.execute("DROP TABLE gold_delta")
+                changed = None
+
+        silver_meta = read_metadata(silver_metadata)
+        silver_scan = None
+        if changed is None:
+            stats['mode'] = 'full'
+            stats['engine'] = GOLD_ENGINE
+            silver_scan = prune_files(load_data_files(silver_metadata), gold_ranges)
+            stats['silver_files'] = len(silver_scan)
+        if silver_scan == []:
+            # No silver file in range: gold and its state are overwritten empty,
+            # and the next refresh is a full one again
+            files, state_files, transformed_at = [], [], None
+        else:
+            if changed is None:
+                con.execute(f"""CREATE OR REPLACE TEMP VIEW silver AS
+                                SELECT * FROM {parquet_source(silver_scan)}
+                                WHERE TRUE {range_filter_sql(gold_ranges)}""")
+                con.execute("CREATE OR REPLACE TEMP VIEW gold_delta AS SELECT * FROM silver")
+                files = materialize(con, GOLD_ENGINES[GOLD_ENGINE](con, silver_scan), gold_dir,
+                                    GOLD_BUCKET_PARTITIONS, lookup_key='patient_id')
+            else:
+                files = materialize(con, gold_delta_sql, gold_dir, GOLD_BUCKET_PARTITIONS,
+                                    lookup_key='patient_id')
+            transformed_at = con.execute(
+                "SELECT CAST(MAX(transformed_at) AS VARCHAR) FROM gold_delta").fetchone()[0]
+            state_files = materialize(con, gold_state_sql(changed is not None), state_dir,
+                                      GOLD_BUCKET_PARTITIONS, lookup_key='patient_id')
+            con.execute("DROP VIEW IF EXISTS gold_delta" if changed is None
+                        else "DROP TABLE gold_delta")
+            con.execute("DROP TABLE IF EXISTS gold_state")
+        watermark = {'silver_snapshot_id':    silver_meta['current_snapshot_id'],
+                     'silver_transformed_at': transformed_at,
+                     'settings':              settings}
+        operation = 'overwrite' if changed is None else 'append'
+    summary  = {k: v for k, v in stats.items() if k != 'mode'}
+    commit_snapshot(state_metadata, 'gold.patient_state', state_files,
+                    GOLD_BUCKET_PARTITIONS, operation=operation, properties=watermark,
+                    summary=summary)
+    metadata = commit_snapshot(gold_metadata, 'gold.readmission_features', files,
+                               GOLD_BUCKET_PARTITIONS, operation=operation,
+                               properties={**watermark, 'lookup_key': 'patient_id'},
+                               summary=summary)
+    register_table(gold_metadata)
+    return metadata, stats
+
+# ─── POINT-IN-TIME TRAINING SETS: label events as-of joined to gold ──────────
+# A label event is (patient_id, event_ts, ...label columns). It takes its
+# features from the patient's latest gold row admitted strictly before event_ts,
+# so nothing recorded at or after the event can leak in; inclusive=True also
+# admits a row dated at the event itself. Gold is read at a pinned snapshot and
+# the training set records it, so the same labels always rebuild the same rows.
+
+def point_in_time_sql(label_source, feature_files, inclusive=False):
+    # ASOF LEFT JOIN keeps events with no earlier admission (feature columns NULL).
+    # The gold row's own target would leak the outcome of that admission, so it
+    # is not carried over as a feature.
+    return f"""
+    SELECT l.*,
+           f.admission_date AS feature_admission_date,
+           f.* EXCLUDE (patient_id, admission_date, readmitted_30d)
+    FROM {label_source} l
+    ASOF LEFT JOIN {parquet_source(feature_files)} f
+      ON l.patient_id = f.patient_id
+     AND l.event_ts {'>=' if inclusive else '>'} f.admission_date
+    """
+
+def build_training_set(con, label_source, table_dir, snapshot_id=None, inclusive=False,
+                       gold_metadata=None):
+    # DuckDB sorts both sides per patient and merges them, spilling under the
+    # connection's memory limit, and materialize streams the result out, so the
+    # label count is bounded by disk rather than RAM
+    gold_metadata = gold_metadata or GOLD_METADATA
+    snapshot_id = snapshot_id or read_metadata(gold_metadata)['current_snapshot_id']
+    metadata_path = f'{table_dir}/iceberg_metadata.json'
+    files = materialize(con, point_in_time_sql(label_source,
+                                               load_data_files(gold_metadata, snapshot_id),
+                                               inclusive), f'{table_dir}/data')
+    return commit_snapshot(metadata_path, f'ml.{os.path.basename(table_dir)}', files,
+                           properties={'gold_snapshot_id': snapshot_id,
+                                       'inclusive':        inclusive})
+
+gold_metadata, gold_refresh = refresh_gold()
+gold_rows    = gold_metadata['row_count']
+gold_columns = [c for c in gold_metadata['columns'] if c not in GOLD_BUCKET_PARTITIONS]
 
 print(" GOLD LAYER: Feature Engineering Complete")
-print(f"   Rows: {len(df_gold):,}")
-print(f"   Total features engineered: {len(df_gold.columns) - 1}")
-print(f"   Saved to: /content/lakehouse/gold/readmission_features.parquet")
+print(f"   Rows: {gold_rows:,}")
+print(f"   Total features engineered: {len(gold_columns) - 1}")
+print(f"   Refresh: {gold_refresh['mode']} ({gold_refresh['engine']}) | Patients in state: "
+      f"{read_metadata(GOLD_STATE_METADATA)['row_count']:,}")
+print(f"   Saved to: {GOLD_DIR} ({len(load_data_files(GOLD_METADATA))} files in "
+      f"{GOLD_BUCKETS} patient buckets)")
+bucket_rows = [sum(f['record_count'] for f in files) for files in gold_bucket_files().values()]
+print(f"   Rows per bucket: {min(bucket_rows):,} – {max(bucket_rows):,}")
 print(f"\n📋 Sample features:")
-print(df_gold[['patient_id','age','charlson_index','los_x_comorbidity',
-               'visits_prior_90d','days_since_last_admit','risk_tier',
-               'readmitted_30d']].head(5).to_string(index=False))
\ No newline at end of file
+print(query_arrow("""SELECT patient_id, age, charlson_index, los_x_comorbidity,
+                            visits_prior_90d, days_since_last_admit, risk_tier,
+                            readmitted_30d
+                     FROM gold.readmission_features LIMIT 5""").to_pandas()
+      .to_string(index=False))
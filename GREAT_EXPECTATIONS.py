@@ -2,7 +2,16 @@ context = gx.get_context()
 
 datasource = context.sources.add_or_update_pandas(name="ehr_lakehouse")
 data_asset = datasource.add_dataframe_asset(name="bronze_admissions")
-batch_request = data_asset.build_batch_request(dataframe=df_raw)
+# Column expectations run on a reservoir sample of the bronze table as written,
+# so the check costs the same whether bronze was built from df_raw or streamed;
+# dates and dictionary columns come back as the text the feed delivers. The row
+# count is a table-level fact, taken from bronze's metadata instead
+GE_SAMPLE_ROWS = 100_000
+ge_sample = query_arrow(f"""
+    SELECT * REPLACE (CAST(admission_date AS VARCHAR) AS admission_date)
+    FROM bronze.raw_admissions
+    USING SAMPLE reservoir({GE_SAMPLE_ROWS} ROWS) REPEATABLE ({EHR_SEED})""").to_pandas()
+batch_request = data_asset.build_batch_request(dataframe=ge_sample)
 
 suite_name = "bronze_ehr_quality_suite"
 try:
@@ -54,11 +63,15 @@ validator.expect_column_mean_to_be_between("charlson_index",  0,     5)
 validator.expect_column_mean_to_be_between("num_procedures",  0,     8)
 rules_run += 6
 
-validator.expect_column_values_to_be_unique("patient_id", mostly=0.98)
-validator.expect_table_row_count_to_be_between(50_000, 200_000)
-validator.expect_table_column_count_to_equal(len(df_raw.columns))
+# Cohort mode draws repeat admissions, so patient_id only identifies an
+# admission in the other modes
+uniqueness_rules = 2
+if EHR_MODE != 'cohort':
+    validator.expect_column_values_to_be_unique("patient_id", mostly=0.98)
+    uniqueness_rules += 1
+validator.expect_table_column_count_to_equal(len(bronze_columns))
 validator.expect_column_value_lengths_to_be_between("patient_id", 10, 15)
-rules_run += 4
+rules_run += uniqueness_rules
 
 validator.expect_column_values_to_match_regex("patient_id",       r'^PAT-\d{7}$')
 validator.expect_column_values_to_match_regex("admission_date",   r'^\d{4}-\d{2}-\d{2}$')
@@ -81,19 +94,24 @@ validator.save_expectation_suite()
 
 result = validator.validate()
 
-passed  = result['statistics']['successful_expectations']
-total   = result['statistics']['evaluated_expectations']
-pct     = result['statistics']['success_percent']
+bronze_row_count = read_metadata(BRONZE_METADATA)['row_count']
+row_count_ok     = 50_000 <= bronze_row_count <= 200_000
+
+passed  = result['statistics']['successful_expectations'] + row_count_ok
+total   = result['statistics']['evaluated_expectations'] + 1
+pct     = passed / total * 100
 
 print(f"\n GREAT EXPECTATIONS — Data Quality Report")
 print(f"   Rules Evaluated : {total}")
 print(f"   Rules Passed    : {passed}")
 print(f"   Rules Failed    : {total - passed}")
 print(f"   Success Rate    : {pct:.1f}%")
+print(f"   Bronze rows     : {bronze_row_count:,} ({'within' if row_count_ok else 'outside'} "
+      f"50,000–200,000)")
 print(f"\n   ✓ Completeness checks (10 rules)")
 print(f"   ✓ Domain validity  (14 rules)")
 print(f"   ✓ Categorical      ( 4 rules)")
 print(f"   ✓ Statistical      ( 6 rules)")
-print(f"   ✓ Uniqueness       ( 4 rules)")
+print(f"   ✓ Uniqueness       ({uniqueness_rules:>2} rules)")
 print(f"   ✓ Format           ( 4 rules)")
 print(f"   ✓ Advanced         ( 8 rules)")
\ No newline at end of file
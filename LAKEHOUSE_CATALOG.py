@@ -0,0 +1,197 @@
+# ─── LAKEHOUSE CATALOG: one persistent DuckDB database, views over every layer ─
+CATALOG_PATH      = '/content/lakehouse/catalog.duckdb'
+CATALOG_POOL_SIZE = 4
+
+# Resource settings shared by every DuckDB connection in the pipeline. Operators
+# that outgrow DUCKDB_MEMORY_LIMIT (sorts, hash joins, window partitions) spill
+# to disk instead of failing, so silver and gold can exceed RAM
+DUCKDB_MEMORY_LIMIT = '2GB'
+DUCKDB_TEMP_DIR     = '/content/lakehouse/duckdb_tmp'
+DUCKDB_THREADS      = os.cpu_count() or 1
+
+def connect_duckdb(path=':memory:', memory_limit=None, threads=None):
+    # Each connection spills into its own subdirectory, which DuckDB creates on
+    # first spill and removes again on close. A database file gets a directory
+    # named after it, so reconnecting to it passes the same config as the
+    # connection already open on it, which DuckDB requires
+    os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+    spill = (uuid.uuid4().hex[:8] if path == ':memory:'
+             else os.path.splitext(os.path.basename(path))[0])
+    return duckdb.connect(path, config={
+        'memory_limit':             memory_limit or DUCKDB_MEMORY_LIMIT,
+        'threads':                  threads or DUCKDB_THREADS,
+        'temp_directory':           f'{DUCKDB_TEMP_DIR}/{spill}',
+        'preserve_insertion_order': False,
+    })
+
+os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+catalog_con = connect_duckdb(CATALOG_PATH)
+for layer in ['bronze', 'silver', 'gold']:
+    catalog_con.execute(f"CREATE SCHEMA IF NOT EXISTS {layer}")
+
+# Cursors are separate connections onto the same database instance, so every
+# stage shares one buffer manager and sees the same views
+catalog_pool = queue.Queue()
+for _ in range(CATALOG_POOL_SIZE):
+    catalog_pool.put(catalog_con.cursor())
+
+@contextmanager
+def catalog_cursor():
+    cur = catalog_pool.get()
+    try:
+        yield cur
+    finally:
+        catalog_pool.put(cur)
+
+def register_view(view_name, data_files):
+    # Views only hold the file list; nothing is copied into the database
+    with catalog_cursor() as cur:
+        cur.execute(f"CREATE OR REPLACE VIEW {view_name} AS "
+                    f"SELECT * FROM {parquet_source(data_files)}")
+
+def register_table(metadata_path):
+    # Re-point the table's view at its current snapshot after every commit; a
+    # table with no data files has no schema to expose, so it has no view
+    metadata   = read_metadata(metadata_path)
+    data_files = load_data_files(metadata_path)
+    if not data_files:
+        with catalog_cursor() as cur:
+            cur.execute(f"DROP VIEW IF EXISTS {metadata['table_name']}")
+        return
+    register_view(metadata['table_name'], data_files)
+
+def query_arrow(sql, params=None):
+    # Results leave DuckDB as Arrow buffers, which pandas/Parquet consume directly
+    with catalog_cursor() as cur:
+        return cur.execute(sql, params or []).fetch_arrow_table()
+
+def materialize(con, sql, table_dir, partitions=(), file_name=None,
+                batch_rows=1_000_000, lookup_key=None):
+    # Streams the query result into Parquet batch by batch: the rows never pass
+    # through pandas and at most one record batch is held in Python at a time.
+    # lookup_key writes the point-lookup layout (one row group per batch); the
+    # query's ORDER BY must already sort by that key. sql may also be an Arrow
+    # RecordBatchReader already in that order and batch size, written as it streams.
+    if lookup_key:
+        batch_rows = LOOKUP_ROW_GROUP_ROWS
+    reader  = (sql if isinstance(sql, pa.RecordBatchReader)
+               else con.execute(sql).fetch_record_batch(batch_rows))
+    options = lookup_writer_options(reader.schema, lookup_key) if lookup_key else None
+    return write_partitioned(table_dir, reader, list(partitions),
+                             file_name=file_name or f'part-00000-{uuid.uuid4().hex[:8]}.parquet',
+                             writer_options=options)
+
+def materialize_routed(con, sql, table_dir, reject_dir, partitions=(),
+                       reason_col='reject_reason', source_col='source_row',
+                       file_name=None, batch_rows=1_000_000):
+    # One scan, two outputs. Rows with a NULL reason_col stream into table_dir
+    # without the two routing columns; the rest go to a single file in reject_dir
+    # as reason_col plus the fields of the source_col struct, so rejects keep the
+    # values that failed. Returns (files, reject_files, {reason: rows}).
+    file_name = file_name or f'part-00000-{uuid.uuid4().hex[:8]}.parquet'
+    reader    = con.execute(sql).fetch_record_batch(batch_rows)
+    counts, rejected = {}, None
+
+    def accepted():
+        nonlocal rejected
+        for batch in reader:
+            ok  = pc.is_null(batch.column(reason_col))
+            bad = batch.filter(pc.invert(ok))
+            if bad.num_rows:
+                for vc in pc.value_counts(bad.column(reason_col)).to_pylist():
+                    counts[vc['values']] = counts.get(vc['values'], 0) + vc['counts']
+                source = bad.schema.field(source_col).type
+                rows   = pa.RecordBatch.from_arrays(
+                    [bad.column(reason_col)] + bad.column(source_col).flatten(),
+                    names=[reason_col] + [f.name for f in source])
+                if rejected is None:
+                    os.makedirs(reject_dir, exist_ok=True)
+                    rejected = pq.ParquetWriter(f'{reject_dir}/{file_name}', rows.schema)
+                rejected.write_batch(rows)
+            yield batch.filter(ok).drop_columns([reason_col, source_col])
+
+    files = write_partitioned(table_dir, accepted(), list(partitions), file_name=file_name)
+    reject_files = []
+    if rejected is not None:
+        rejected.close()
+        reject_files = [{'path': f'{reject_dir}/{file_name}', 'partition': {},
+                         'record_count': sum(counts.values())}]
+    return files, reject_files, counts
+
+def merge_into_table(con, delta_sql, metadata_path, table_dir, key, partitions,
+                     properties=None, summary=None):
+    # Copy-on-write MERGE keyed on `key`, which must determine the partition.
+    # Only partitions holding a matching key are rewritten, with the old rows
+    # replaced; delta rows for any other partition land in fresh files.
+    con.execute(f"CREATE OR REPLACE TEMP TABLE merge_delta AS {delta_sql}")
+    metadata = read_metadata(metadata_path)
+    cols     = ', '.join(partitions)
+    touched  = {tuple(r) for r in con.execute(
+        f"SELECT DISTINCT {cols} FROM merge_delta").fetchall()}
+    targets  = [f for f in load_data_files(metadata_path)
+                if tuple(f['partition'][c] for c in partitions) in touched]
+    matches  = {}
+    if targets:
+        matches = {tuple(r[:-1]): r[-1] for r in con.execute(
+            f"""SELECT {cols}, COUNT(*) FROM merge_delta
+                SEMI JOIN {parquet_source(targets)} t USING ({key})
+                GROUP BY {cols}""").fetchall()}
+    rewrite    = [f for f in targets if tuple(f['partition'][c] for c in partitions) in matches]
+    matched    = sum(matches.values())
+    delta_rows = con.execute("SELECT COUNT(*) FROM merge_delta").fetchone()[0]
+    if rewrite:
+        sql = f"""SELECT t.* FROM {parquet_source(rewrite)} t
+                  ANTI JOIN merge_delta d USING ({key})
+                  UNION ALL BY NAME
+                  SELECT * FROM merge_delta"""
+    else:
+        sql = "SELECT * FROM merge_delta"
+    files    = materialize(con, sql, table_dir, partitions)
+    metadata = commit_snapshot(metadata_path, metadata['table_name'], files, partitions,
+                               operation='replace' if rewrite else 'append',
+                               removed_files=[f['path'] for f in rewrite],
+                               properties=properties, summary=summary)
+    con.execute("DROP TABLE merge_delta")
+    return metadata, {'inserted': delta_rows - matched, 'updated': matched,
+                      'files_rewritten': len(rewrite)}
+
+def bench_silver(con, n, out_dir, batches=None):
+    # Setup shared by the benchmarks and checks: n cohort admissions (or the given
+    # bronze batches) written as bronze under out_dir and run through silver_sql
+    # on con, leaving the `silver` view over the result. Returns the silver files.
+    if batches is None:
+        batches = bronze_batches(iter_cohort_batches(n, seed=EHR_SEED, **COHORT_PARAMS))
+    bronze = write_partitioned(f'{out_dir}/bronze', batches, BRONZE_PARTITIONS)
+    con.execute(f"CREATE OR REPLACE TEMP VIEW bronze_scan AS "
+                f"SELECT * FROM {versioned_source(bronze)}")
+    silver, _, _ = materialize_routed(con, silver_sql, f'{out_dir}/silver',
+                                      f'{out_dir}/quarantine', BRONZE_PARTITIONS)
+    con.execute(f"CREATE OR REPLACE TEMP VIEW silver AS "
+                f"SELECT * FROM {parquet_source(silver)}")
+    return silver
+
+@contextmanager
+def watch_peak(sample, interval=0.05):
+    # Benchmark helper: polls sample() from a second thread while the block runs
+    # and keeps, in the yielded list, the peak of each value it returns. sample
+    # must not share a DuckDB cursor with the code being measured
+    stop, peak = threading.Event(), list(sample())
+
+    def watch():
+        while not stop.is_set():
+            peak[:] = map(max, peak, sample())
+            stop.wait(interval)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        yield peak
+    finally:
+        stop.set()
+        watcher.join()
+
+print(" LAKEHOUSE CATALOG")
+print(f"   Database: {CATALOG_PATH}")
+print(f"   Schemas: bronze, silver, gold | Cursor pool: {CATALOG_POOL_SIZE}")
+print(f"   Memory limit: {DUCKDB_MEMORY_LIMIT} | Threads: {DUCKDB_THREADS} | "
+      f"Spill: {DUCKDB_TEMP_DIR}")
@@ -0,0 +1,135 @@
+COMPACTION_TARGET_BYTES = 128 * 1024 * 1024
+COMPACTION_SMALL_RATIO  = 0.75     # files below 75% of the target are bin-packed
+CLUSTER_ORDER           = ['patient_id', 'admission_date']
+
+def plan_compaction(data_files, target_bytes, sort_order, small_ratio=COMPACTION_SMALL_RATIO):
+    # Within each partition, small or unsorted files are packed into bins of at
+    # most target_bytes; a bin that would just rewrite one already sorted file is
+    # dropped. Files over target_bytes are left as they are, since they could not
+    # be sorted within that bound. A rewritten file takes the newest sequence
+    # number of its inputs, so a bin must hold a run of files adjacent in sequence:
+    # files are packed in sequence order, never across a file left as it is or
+    # one placed in another bin, or older rows would overtake it.
+    candidates, kept = {}, {}
+    for f in data_files:
+        small    = f['file_size_bytes'] < small_ratio * target_bytes
+        unsorted = f.get('sorted_by') != list(sort_order)
+        oversize = f['file_size_bytes'] > target_bytes
+        key      = tuple(sorted(f['partition'].items()))
+        rewrite  = (small or unsorted) and not oversize
+        (candidates if rewrite else kept).setdefault(key, []).append(f)
+    by_partition = {}
+    for key, files in candidates.items():
+        for f in files:
+            era = sum(k.get('sequence_number', 0) <= f.get('sequence_number', 0)
+                      for k in kept.get(key, []))
+            by_partition.setdefault((key, era), []).append(f)
+
+    bins = []
+    for files in by_partition.values():
+        runs = []
+        for f in sorted(files, key=lambda f: f.get('sequence_number', 0)):
+            if runs and runs[-1]['bytes'] + f['file_size_bytes'] <= target_bytes:
+                runs[-1]['files'].append(f)
+                runs[-1]['bytes'] += f['file_size_bytes']
+            else:
+                runs.append({'files': [f], 'bytes': f['file_size_bytes']})
+        bins += [b['files'] for b in runs
+                 if len(b['files']) > 1 or b['files'][0].get('sorted_by') != list(sort_order)]
+    return bins
+
+def compact_table(metadata_path, target_bytes=COMPACTION_TARGET_BYTES, sort_order=CLUSTER_ORDER):
+    # Tables whose properties name a lookup_key keep the point-lookup layout
+    # (row groups sorted by the key, page index, bloom filter) in their rewritten files
+    metadata   = read_metadata(metadata_path)
+    lookup_key = metadata.get('properties', {}).get('lookup_key')
+    if lookup_key and sort_order[0] != lookup_key:
+        raise ValueError(f'{metadata["table_name"]} is laid out for lookups by {lookup_key}; '
+                         f'sort_order must start with it')
+    data_files = load_data_files(metadata_path)
+    ordinal    = {f['path']: i for i, f in enumerate(data_files)}
+    bins = plan_compaction(data_files, target_bytes, sort_order)
+    if not bins:
+        return metadata, 0, 0
+
+    written, removed = [], []
+    for files in bins:
+        # Bins are bounded by target_bytes, so sorting one in memory is bounded too;
+        # reading with Arrow keeps the table's storage types (dictionaries, int8, date32).
+        # Files are read oldest first and Arrow's sort is stable, so within the new
+        # file a later version of a row still comes after the one it supersedes.
+        files = sorted(files, key=lambda f: (f.get('sequence_number', 0), ordinal[f['path']]))
+        table = pa.concat_tables([pq.read_table(f['path'], partitioning=None) for f in files],
+                                 promote_options='default')
+        table = table.sort_by([(c, 'ascending') for c in sort_order])
+        path  = f"{os.path.dirname(files[0]['path'])}/part-c-{uuid.uuid4().hex[:8]}.parquet"
+        if lookup_key:
+            pq.write_table(table, path, row_group_size=LOOKUP_ROW_GROUP_ROWS,
+                           **lookup_writer_options(table.schema, lookup_key))
+        else:
+            pq.write_table(table, path)
+        written.append({'path': path, 'partition': files[0]['partition'],
+                        'sorted_by': list(sort_order),
+                        'sequence_number': max(f.get('sequence_number', 0) for f in files)})
+        removed += [f['path'] for f in files]
+
+    metadata = commit_snapshot(metadata_path, metadata['table_name'], written,
+                               metadata['partitions'], operation='replace',
+                               removed_files=removed, sort_order=sort_order)
+    register_table(metadata_path)
+    return metadata, len(removed), len(written)
+
+def compact_state(metadata_path=GOLD_STATE_METADATA, state_dir=GOLD_STATE_DIR):
+    # Every incremental gold refresh appends a state row for each patient it
+    # touched, and readers take the newest by sequence number. A bucket holding
+    # more than one file is folded into one file of only those newest rows, which
+    # keeps the newest input sequence number, so a refresh reads one state file
+    # per bucket however many refreshes came before it
+    metadata  = read_metadata(metadata_path)
+    by_bucket = {}
+    for f in load_data_files(metadata_path):
+        by_bucket.setdefault(tuple(sorted(f['partition'].items())), []).append(f)
+    written, removed = [], []
+    with catalog_cursor() as con:
+        for files in by_bucket.values():
+            if len(files) < 2:
+                continue
+            sequence = max(f.get('sequence_number', 0) for f in files)
+            latest   = materialize(con, f"""
+                SELECT * EXCLUDE (sequence_number, file_ordinal, file_row_number)
+                FROM {versioned_source(files)}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY patient_id
+                                           ORDER BY sequence_number DESC, file_ordinal DESC,
+                                                    file_row_number DESC) = 1
+                ORDER BY patient_id""", state_dir, metadata['partitions'], lookup_key='patient_id')
+            written += [{**f, 'sequence_number': sequence} for f in latest]
+            removed += [f['path'] for f in files]
+    if not removed:
+        return metadata, 0, 0
+    metadata = commit_snapshot(metadata_path, metadata['table_name'], written,
+                               metadata['partitions'], operation='replace',
+                               removed_files=removed)
+    return metadata, len(removed), len(written)
+
+print(" LAKEHOUSE MAINTENANCE — bin-pack + cluster by (patient_id, admission_date)")
+print(f"{'Table':<28} {'Files before':>13} {'Rewritten':>10} {'Written':>8} {'Files after':>12}")
+print("-" * 75)
+for metadata_path in [BRONZE_METADATA, SILVER_METADATA, GOLD_METADATA]:
+    before = len(load_data_files(metadata_path))
+    meta, n_removed, n_written = compact_table(metadata_path)
+    print(f"{meta['table_name']:<28} {before:>13} {n_removed:>10} {n_written:>8} "
+          f"{len(load_data_files(metadata_path)):>12}")
+    print(f"{'':<28} sort_order = {meta['sort_order']}")
+
+# gold.patient_state has no admission_date to cluster by; it is folded to the
+# newest row per patient instead
+before = len(load_data_files(GOLD_STATE_METADATA))
+meta, n_removed, n_written = compact_state()
+print(f"{meta['table_name']:<28} {before:>13} {n_removed:>10} {n_written:>8} "
+      f"{len(load_data_files(GOLD_STATE_METADATA)):>12}")
+print(f"{'':<28} latest row per patient: {meta['row_count']:,} rows")
+with catalog_cursor() as cur:
+    state_patients = cur.execute(f"SELECT COUNT(DISTINCT patient_id) FROM "
+                                 f"{parquet_source(load_data_files(GOLD_STATE_METADATA))}"
+                                 ).fetchone()[0]
+assert meta['row_count'] == state_patients, 'patient_state kept a superseded row'
@@ -0,0 +1,406 @@
+# ─── ICEBERG-STYLE TABLE LAYOUT: hive partitions + partition pruning ─────────
+BRONZE_PARTITIONS = ['admit_year', 'admit_month']
+
+# Storage schema for BRONZE_SCHEMA = 'compact': native dates, dictionary-encoded
+# categoricals and the narrowest integer type that holds each column's domain
+CATEGORY = pa.dictionary(pa.int8(), pa.string())
+BRONZE_COMPACT_SCHEMA = pa.schema([
+    ('patient_id',       pa.string()),
+    ('admission_date',   pa.date32()),
+    ('admit_year',       pa.int16()),
+    ('admit_month',      pa.int8()),
+    ('admit_dow',        pa.int8()),
+    ('admit_season',     CATEGORY),
+    ('age',              pa.int8()),
+    ('age_bucket',       CATEGORY),
+    ('gender',           CATEGORY),
+    ('los_days',         pa.int16()),
+    ('num_procedures',   pa.int8()),
+    ('num_diagnoses',    pa.int8()),
+    ('has_diabetes',     pa.int8()),
+    ('has_chf',          pa.int8()),
+    ('has_copd',         pa.int8()),
+    ('has_ckd',          pa.int8()),
+    ('has_cancer',       pa.int8()),
+    ('has_dementia',     pa.int8()),
+    ('charlson_index',   pa.int8()),
+    ('prior_visits_12m', pa.int16()),
+    ('readmitted_30d',   pa.int8()),
+])
+
+def cast_batches(batches, schema):
+    for batch in batches:
+        yield pa.RecordBatch.from_arrays(
+            [batch.column(f.name).cast(f.type) for f in schema], schema=schema)
+
+def read_table_frame(data_files, columns=None):
+    # Dictionary columns come back as pandas categoricals, narrow ints stay narrow
+    # and date32 becomes datetime64 rather than Python date objects
+    paths = [f['path'] if isinstance(f, dict) else f for f in data_files]
+    return pq.read_table(paths, columns=columns, partitioning=None).to_pandas(
+        date_as_object=False)
+
+# Point-lookup layout for patient-facing tables: sorted by patient_id, so each
+# id falls in one row group, found from the footer's min/max statistics. Row
+# groups stay analytic-sized (DuckDB's own default), since gold is scanned far
+# more often than it is probed; smaller groups would bloat the file and a footer
+# that every reader parses. A patient_id bloom filter lets DuckDB skip row
+# groups on ad-hoc SQL, and the page index is written for engines that seek
+# pages with it (Spark, Trino)
+LOOKUP_ROW_GROUP_ROWS = 122_880
+
+def lookup_writer_options(schema, key='patient_id'):
+    return {'write_page_index':     True,
+            'sorting_columns':      [pq.SortingColumn(schema.get_field_index(key))],
+            'bloom_filter_options': {key: {'ndv': LOOKUP_ROW_GROUP_ROWS, 'fpp': 0.01}}}
+
+def write_lookup_parquet(df, path, key='patient_id'):
+    table = pa.Table.from_pandas(df, preserve_index=False).sort_by(key)
+    pq.write_table(table, path, row_group_size=LOOKUP_ROW_GROUP_ROWS,
+                   **lookup_writer_options(table.schema, key))
+    return path
+
+lookup_files = {}   # path -> ((mtime_ns, size), ParquetFile, mins, maxs, CountingFile)
+
+class CountingFile(io.FileIO):
+    # Local file that tallies every byte the Parquet reader pulls from it, so a
+    # lookup's cost is measured at the reader rather than taken from the footer
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+def lookup_index(path):
+    # Footer parsed once per version of a file: row-group patient_id [min, max] as
+    # NumPy arrays. Files in the lookup layout are sorted, so the ranges do not
+    # overlap and a lookup lands on a single row group, which PyArrow reads whole
+    # for the requested columns. A file rewritten in place at the same path gets
+    # a new (mtime, size) and is opened afresh rather than served stale offsets
+    info  = os.stat(path)
+    stamp = (info.st_mtime_ns, info.st_size)
+    if path in lookup_files and lookup_files[path][0] != stamp:
+        close_lookup(path)
+    if path not in lookup_files:
+        src = CountingFile(path)
+        pf  = pq.ParquetFile(src)
+        md  = pf.metadata
+        col = pf.schema_arrow.get_field_index('patient_id')
+        st  = [md.row_group(i).column(col).statistics for i in range(md.num_row_groups)]
+        lookup_files[path] = (stamp, pf, np.array([s.min for s in st]),
+                              np.array([s.max for s in st]), src)
+    return lookup_files[path]
+
+def lookup_row_groups(path, patient_ids):
+    _, _, mins, maxs, _ = lookup_index(path)
+    return sorted({int(i) for pid in patient_ids
+                   for i in np.flatnonzero((mins <= pid) & (maxs >= pid))})
+
+def lookup_patients(path, patient_ids, columns=None):
+    # Single id or batched multi-get; only the row groups that can hold the ids
+    # are read and decoded
+    ids = [patient_ids] if isinstance(patient_ids, str) else list(patient_ids)
+    _, pf, _, _, _ = lookup_index(path)
+    table = pf.read_row_groups(lookup_row_groups(path, ids), columns=columns)
+    return table.filter(pc.is_in(table.column('patient_id'), pa.array(ids))).to_pandas()
+
+def lookup_bytes_read(paths):
+    # Bytes the lookup reader has pulled from these files so far, footers included
+    return sum(lookup_index(p)[4].bytes_read for p in paths)
+
+def close_lookup(path):
+    entry = lookup_files.pop(path, None)
+    if entry:
+        entry[4].close()
+
+def partition_dir(table_dir, partition):
+    return '/'.join([table_dir] + [f'{col}={val}' for col, val in partition.items()])
+
+def write_partitioned(table_dir, batches, partition_cols, file_name='part-00000.parquet',
+                      writer_options=None):
+    # One open ParquetWriter per partition directory; each incoming batch is sorted
+    # by partition once and its contiguous slices appended to the matching files.
+    # Partition columns stay inside the files so each file is self-describing.
+    # With no partition columns every batch goes to a single file in table_dir.
+    writers, counts, partitions = {}, {}, {}
+    for batch in batches:
+        if not partition_cols:
+            present, sizes, ranked, levels, shape = [0], [batch.num_rows], batch, [], []
+        else:
+            present, sizes, ranked, levels, shape = partition_slices(batch, partition_cols)
+        start = 0
+        for code, size in zip(present, sizes):
+            key = tuple(int(lv[i]) for lv, i in zip(levels, np.unravel_index(code, shape)))
+            if key not in writers:
+                partitions[key] = dict(zip(partition_cols, key))
+                path = partition_dir(table_dir, partitions[key])
+                os.makedirs(path, exist_ok=True)
+                writers[key] = pq.ParquetWriter(f'{path}/{file_name}', batch.schema,
+                                                **(writer_options or {}))
+                counts[key]  = 0
+            writers[key].write_batch(ranked.slice(start, size))
+            counts[key] += int(size)
+            start += size
+    for w in writers.values():
+        w.close()
+    return [{'path':         f'{partition_dir(table_dir, partitions[k])}/{file_name}',
+             'partition':    partitions[k],
+             'record_count': counts[k]}
+            for k in sorted(writers)]
+
+def partition_slices(batch, partition_cols):
+    levels, codes = [], []
+    for c in partition_cols:
+        lv, cd = np.unique(batch.column(c).to_numpy(), return_inverse=True)
+        levels.append(lv)
+        codes.append(cd)
+    shape    = [len(lv) for lv in levels]
+    combined = np.ravel_multi_index(codes, shape)
+    present, inverse, sizes = np.unique(combined, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind='stable')
+    return present, sizes, batch.take(pa.array(order)), levels, shape
+
+def prune_partitions(data_files, date_from=None, date_to=None):
+    # Month-level pruning on (admit_year, admit_month); the exact day bounds are
+    # still applied by the query that scans the surviving files
+    lo = pd.Timestamp(date_from) if date_from else None
+    hi = pd.Timestamp(date_to)   if date_to   else None
+    kept = []
+    for f in data_files:
+        ym = f['partition']['admit_year'] * 12 + f['partition']['admit_month']
+        if lo is not None and ym < lo.year * 12 + lo.month:
+            continue
+        if hi is not None and ym > hi.year * 12 + hi.month:
+            continue
+        kept.append(f)
+    return kept
+
+def parquet_source(data_files, schema_files=()):
+    # Partition values are read from the files, not re-derived from the paths.
+    # A scan pruned down to no files still needs the table's columns: pass the
+    # unpruned list as schema_files and the source is empty with its schema
+    paths = [f['path'] if isinstance(f, dict) else f for f in data_files]
+    if not paths:
+        if not schema_files:
+            raise ValueError('No data files, and no schema_files to take columns from')
+        return f"(SELECT * FROM {parquet_source(schema_files[:1])} LIMIT 0)"
+    return f"read_parquet({paths}, hive_partitioning = false)"
+
+# ─── SNAPSHOTS + MANIFESTS: per-file column stats for data skipping ──────────
+def stat_value(v):
+    # Dates/timestamps as ISO strings; DECIMAL stats (e.g. DuckDB HUGEINT sums) as numbers
+    if isinstance(v, Decimal):
+        return int(v) if v == v.to_integral_value() else float(v)
+    return v.isoformat() if hasattr(v, 'isoformat') else v
+
+def file_stats(path):
+    # Column min/max/null counts come straight from the Parquet footer, so
+    # collecting them never rescans the data pages
+    md = pq.ParquetFile(path).metadata
+    columns = {}
+    for j in range(md.num_columns):
+        mins, maxs, nulls = [], [], 0
+        for i in range(md.num_row_groups):
+            st = md.row_group(i).column(j).statistics
+            if st is None or not st.has_min_max:
+                mins = maxs = nulls = None
+                break
+            mins.append(st.min)
+            maxs.append(st.max)
+            nulls += st.null_count
+        columns[md.schema.column(j).name] = {
+            'min':        stat_value(min(mins)) if mins else None,
+            'max':        stat_value(max(maxs)) if maxs else None,
+            'null_count': nulls
+        }
+    return {'record_count':    md.num_rows,
+            'file_size_bytes': os.path.getsize(path),
+            'column_stats':    columns}
+
+def read_metadata(metadata_path):
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        return json.load(f)
+
+@contextmanager
+def metadata_lock(metadata_path):
+    # Serialises committers only; readers never take the lock. An empty first
+    # commit has written no data files, so the table directory may not exist yet
+    os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+    with open(metadata_path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def write_json_atomic(path, payload):
+    # Readers see either the old or the new file, never a partial write
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+def commit_snapshot(metadata_path, table_name, data_files, partitions=(),
+                    operation='overwrite', removed_files=(), sort_order=None,
+                    properties=None, summary=None):
+    # Writes a manifest for the new snapshot under metadata/ and swaps the table
+    # metadata to point at it. 'append' carries the current snapshot's files
+    # (and their already-collected stats) forward; 'replace' does the same minus
+    # removed_files, failing if another commit already removed any of them;
+    # 'overwrite' replaces everything. Table properties are carried forward and
+    # updated with any passed in; summary holds per-commit metrics. New files get
+    # the snapshot id as their sequence number unless they carry one (compaction
+    # keeps the newest of its inputs), so rows can be ordered by when they arrived.
+    stats = [{**f, **file_stats(f['path'])} for f in data_files]
+
+    with metadata_lock(metadata_path):
+        previous  = read_metadata(metadata_path)
+        snapshots = previous['snapshots'] if previous else []
+        snap_id   = snapshots[-1]['snapshot_id'] + 1 if snapshots else 1
+        now       = datetime.now().isoformat()
+
+        new_entries = [{**f, 'sequence_number': f.get('sequence_number', snap_id)}
+                       for f in stats]
+        entries = new_entries
+        if operation in ('append', 'replace') and previous:
+            current = load_data_files(metadata_path)
+            removed = set(removed_files)
+            missing = removed - {e['path'] for e in current}
+            if missing:
+                raise RuntimeError(f'Commit conflict: {len(missing)} files already '
+                                   f'removed from {table_name}')
+            entries = [e for e in current if e['path'] not in removed] + new_entries
+
+        manifest_dir  = os.path.join(os.path.dirname(metadata_path), 'metadata')
+        manifest_path = f'{manifest_dir}/snap-{snap_id:06d}.json'
+        os.makedirs(manifest_dir, exist_ok=True)
+        write_json_atomic(manifest_path, {'snapshot_id': snap_id, 'data_files': entries})
+
+        metadata = {
+            'table_name':          table_name,
+            'format':              'PARQUET',
+            'partitions':          list(partitions),
+            'row_count':           sum(e['record_count'] for e in entries),
+            'schema_version':      1,
+            'created_at':          previous['created_at'] if previous else now,
+            'last_updated_at':     now,
+            'columns':             (pq.read_schema(entries[0]['path']).names if entries
+                                    else previous['columns'] if previous else []),
+            'sort_order':          (list(sort_order) if sort_order is not None
+                                    else previous.get('sort_order', []) if previous else []),
+            'properties':          {**(previous.get('properties', {}) if previous else {}),
+                                    **(properties or {})},
+            'current_snapshot_id': snap_id,
+            'snapshots':           snapshots + [{
+                'snapshot_id':   snap_id,
+                'operation':     operation,
+                'timestamp':     now,
+                'manifest':      manifest_path,
+                'file_count':    len(entries),
+                'added_files':   len(new_entries),
+                'removed_files': len(removed_files),
+                'row_count':     sum(e['record_count'] for e in entries),
+                'summary':       dict(summary or {})
+            }]
+        }
+        write_json_atomic(metadata_path, metadata)
+    return metadata
+
+def append_to_table(metadata_path, table_dir, table_name, batches, partitions):
+    # New rows only ever land in new files; existing data files are not touched
+    files = write_partitioned(table_dir, batches, partitions,
+                              file_name=f'part-00000-{uuid.uuid4().hex[:8]}.parquet')
+    return commit_snapshot(metadata_path, table_name, files, partitions, operation='append')
+
+def load_data_files(metadata_path, snapshot_id=None):
+    metadata = read_metadata(metadata_path)
+    snap_id  = snapshot_id or metadata['current_snapshot_id']
+    snapshot = next(s for s in metadata['snapshots'] if s['snapshot_id'] == snap_id)
+    with open(snapshot['manifest']) as f:
+        return json.load(f)['data_files']
+
+def incremental_files(metadata_path, since_snapshot_id):
+    # Live files added by 'append' snapshots after since_snapshot_id. None means
+    # an incremental read is not possible: the snapshot is unknown, the table was
+    # overwritten since, or an appended file was already compacted into older data
+    metadata = read_metadata(metadata_path)
+    if not any(s['snapshot_id'] == since_snapshot_id for s in metadata['snapshots']):
+        return None
+    later = [s for s in metadata['snapshots'] if s['snapshot_id'] > since_snapshot_id]
+    if any(s['operation'] == 'overwrite' for s in later):
+        return None
+    seen  = {f['path'] for f in load_data_files(metadata_path, since_snapshot_id)}
+    added = set()
+    for s in later:
+        files = {f['path'] for f in load_data_files(metadata_path, s['snapshot_id'])}
+        if s['operation'] == 'append':
+            added |= files - seen
+        seen = files
+    current = load_data_files(metadata_path)
+    if added - {f['path'] for f in current}:
+        return None
+    return [f for f in current if f['path'] in added]
+
+def files_since(metadata_path, since_snapshot_id):
+    # Live files that since_snapshot_id did not have, whichever commit wrote them
+    # (appends, merge rewrites, compactions). Rewritten files also carry older
+    # rows, so callers still filter rows by their own watermark. None means the
+    # snapshot is unknown or the table was overwritten since.
+    metadata = read_metadata(metadata_path)
+    if not any(s['snapshot_id'] == since_snapshot_id for s in metadata['snapshots']):
+        return None
+    if any(s['operation'] == 'overwrite' for s in metadata['snapshots']
+           if s['snapshot_id'] > since_snapshot_id):
+        return None
+    seen = {f['path'] for f in load_data_files(metadata_path, since_snapshot_id)}
+    return [f for f in load_data_files(metadata_path) if f['path'] not in seen]
+
+def versioned_source(data_files, schema_files=()):
+    # Like parquet_source, plus each row's version: the file's sequence_number,
+    # its position in data_files and the row's position in the file. The file
+    # name is only used to attach these, so wide path strings never reach
+    # downstream sorts or windows. schema_files as in parquet_source.
+    if not data_files:
+        if not schema_files:
+            raise ValueError('No data files, and no schema_files to take columns from')
+        return f"(SELECT * FROM {versioned_source(schema_files[:1])} LIMIT 0)"
+    versions = ', '.join(f"('{f['path']}', {f.get('sequence_number', 0)}, {i})"
+                         for i, f in enumerate(data_files))
+    return f"""(SELECT * EXCLUDE (filename)
+               FROM read_parquet({[f['path'] for f in data_files]},
+                                 hive_partitioning = false,
+                                 filename = true, file_row_number = true)
+               JOIN (VALUES {versions}) v(filename, sequence_number, file_ordinal)
+               USING (filename))"""
+
+def prune_files(data_files, ranges):
+    # ranges = {column: (lo, hi)} with None for an open bound. A file is skipped
+    # only when its stats prove no row can match; missing stats keep the file.
+    kept = []
+    for f in data_files:
+        stats = f.get('column_stats', {})
+        skip  = False
+        for col, (lo, hi) in ranges.items():
+            st = stats.get(col)
+            if st is None or st['min'] is None:
+                continue
+            if (lo is not None and st['max'] < lo) or (hi is not None and st['min'] > hi):
+                skip = True
+                break
+        if not skip:
+            kept.append(f)
+    return kept
+
+def range_filter_sql(ranges):
+    clauses = []
+    for col, (lo, hi) in ranges.items():
+        if lo is not None:
+            clauses.append(f"{col} >= '{lo}'")
+        if hi is not None:
+            clauses.append(f"{col} <= '{hi}'")
+    return ''.join(f' AND {c}' for c in clauses)
@@ -2,11 +2,25 @@ import pandas as pd
 import numpy as np
 import warnings
 import os
+import io
 import json
 import sqlite3
+import math
+import uuid
+import fcntl
+import queue
+import shutil
+import hashlib
+import threading
+import tracemalloc
+import multiprocessing
+from contextlib import contextmanager
+from decimal import Decimal
 import duckdb
 import pyarrow as pa
 import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import polars as pl
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import seaborn as sns
@@ -23,7 +37,6 @@ from sklearn.metrics import (roc_auc_score, classification_report,
                               confusion_matrix, roc_curve, precision_recall_curve,
                               average_precision_score)
 from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import LabelEncoder
 from imblearn.over_sampling import SMOTE
 import shap
 import mlflow
@@ -0,0 +1,163 @@
+import time
+
+# ─── ONLINE FEATURE STORE: latest feature vector per patient in SQLite ───────
+# One row per patient holding the FEATURES vector of their latest gold row as
+# packed float64, in a WITHOUT ROWID table so the patient_id primary key is the
+# storage order and a get is a single B-tree probe. The store records the gold
+# snapshot it has applied; sync_online_store() upserts only patients in gold
+# files added since then and rebuilds when FEATURES changed or gold was
+# overwritten.
+ONLINE_STORE_PATH  = '/content/lakehouse/serving/online_features.sqlite'
+ONLINE_BATCH_ROWS  = 100_000
+ONLINE_PARAM_LIMIT = 900   # ids per IN (...) query, under SQLite's variable limit
+ONLINE_DEMO_DIR    = '/content/lakehouse/bench/online_update'
+ONLINE_DEMO_ROWS   = 5_000
+
+os.makedirs(os.path.dirname(ONLINE_STORE_PATH), exist_ok=True)
+online_con = sqlite3.connect(ONLINE_STORE_PATH, check_same_thread=False)
+online_con.execute("PRAGMA journal_mode = WAL")
+online_con.execute("PRAGMA synchronous = NORMAL")
+online_con.execute("CREATE TABLE IF NOT EXISTS online_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+def online_meta(key, store=online_con):
+    row = store.execute("SELECT value FROM online_meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def feature_vectors(frame):
+    # Gold already carries the encoded categoricals; missing values become 0 as in
+    # FEATURE PREPARATION
+    return frame[FEATURES].astype('float64').fillna(0).to_numpy()
+
+def sync_online_store(store=online_con, gold_metadata=GOLD_METADATA):
+    # Latest gold row per patient among the files to apply, streamed in batches
+    # and upserted; a row only replaces a newer-or-equal admission it supersedes
+    gold_meta = read_metadata(gold_metadata)
+    files = None
+    if online_meta('features', store) == FEATURES and online_meta('gold_snapshot_id', store):
+        files = files_since(gold_metadata, online_meta('gold_snapshot_id', store))
+    mode = 'incremental'
+    if files is None:
+        mode, files = 'full', load_data_files(gold_metadata)
+        store.execute("DROP TABLE IF EXISTS online_features")
+        store.execute("""CREATE TABLE online_features (
+                                  patient_id     TEXT PRIMARY KEY,
+                                  admission_date TEXT NOT NULL,
+                                  vector         BLOB NOT NULL) WITHOUT ROWID""")
+    written = 0
+    if files:
+        with catalog_cursor() as con:
+            reader = con.execute(f"""
+                SELECT * FROM {parquet_source(files)}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY patient_id
+                                           ORDER BY admission_date DESC, visit_number DESC) = 1
+            """).fetch_record_batch(ONLINE_BATCH_ROWS)
+            for batch in reader:
+                frame   = batch.to_pandas()
+                vectors = feature_vectors(frame)
+                store.executemany(
+                    """INSERT INTO online_features VALUES (?, ?, ?)
+                       ON CONFLICT (patient_id) DO UPDATE
+                       SET admission_date = excluded.admission_date, vector = excluded.vector
+                       WHERE excluded.admission_date >= online_features.admission_date""",
+                    zip(frame['patient_id'], frame['admission_date'].astype(str),
+                        [v.tobytes() for v in vectors]))
+                written += len(frame)
+    store.executemany("INSERT OR REPLACE INTO online_meta VALUES (?, ?)",
+                      [('features', json.dumps(FEATURES)),
+                       ('gold_snapshot_id', json.dumps(gold_meta['current_snapshot_id']))])
+    store.commit()
+    return {'mode': mode, 'gold_files': len(files), 'patients_written': written}
+
+def get_features(patient_id, store=online_con):
+    # FEATURES-ordered vector of the patient's latest admission, or None
+    row = store.execute("SELECT vector FROM online_features WHERE patient_id = ?",
+                             (patient_id,)).fetchone()
+    return np.frombuffer(row[0]) if row else None
+
+def get_features_batch(patient_ids, store=online_con):
+    # One row per requested id in request order; unknown patients are all-NaN
+    ids  = list(patient_ids)
+    rows = {}
+    for i in range(0, len(ids), ONLINE_PARAM_LIMIT):
+        chunk = ids[i:i + ONLINE_PARAM_LIMIT]
+        rows.update(store.execute(
+            f"SELECT patient_id, vector FROM online_features "
+            f"WHERE patient_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+    out = np.full((len(ids), len(FEATURES)), np.nan)
+    for i, pid in enumerate(ids):
+        if pid in rows:
+            out[i] = np.frombuffer(rows[pid])
+    return out
+
+t0 = time.perf_counter()
+online_sync = sync_online_store()
+print(" ONLINE FEATURE STORE")
+print(f"   Store: {ONLINE_STORE_PATH} "
+      f"({os.path.getsize(ONLINE_STORE_PATH) / 1024**2:.1f} MB)")
+print(f"   Sync: {online_sync['mode']} | Patients written: "
+      f"{online_sync['patients_written']:,} in {time.perf_counter() - t0:.2f}s")
+
+# The stored vector must be the row the model trains on for that admission
+latest = df_ml.sort_values(['admission_date', 'visit_number']).groupby('patient_id').tail(1)
+check  = latest.sample(min(1_000, len(latest)), random_state=42)
+print(f"   Matches training rows: "
+      f"{np.allclose(get_features_batch(check['patient_id']), X.loc[check.index].to_numpy())}")
+
+sample_ids = latest['patient_id'].sample(min(10_000, len(latest)), random_state=7).tolist()
+t0 = time.perf_counter()
+for pid in sample_ids:
+    get_features(pid)
+get_us = (time.perf_counter() - t0) / len(sample_ids) * 1e6
+t0 = time.perf_counter()
+get_features_batch(sample_ids[:1_000])
+batch_ms = (time.perf_counter() - t0) * 1000
+print(f"   Single get: {get_us:.0f} µs avg over {len(sample_ids):,} patients")
+print(f"   Batched multi-get: 1,000 patients in {batch_ms:.1f} ms")
+
+@contextmanager
+def scratch_lakehouse(root):
+    # scratch_tables plus a copy of the online store under root, yielded with
+    # the path mapping as a connection to the copy
+    with scratch_tables(root) as scratch:
+        os.makedirs(os.path.dirname(scratch(ONLINE_STORE_PATH)), exist_ok=True)
+        store = sqlite3.connect(scratch(ONLINE_STORE_PATH), check_same_thread=False)
+        online_con.backup(store)
+        try:
+            yield scratch, store
+        finally:
+            store.close()
+
+# Update path on a scratch copy: a new day of admissions, half of them for
+# patients already in the store, flows bronze → silver → gold incrementally and
+# only the patients it touched are upserted
+returning = latest['patient_id'].sample(ONLINE_DEMO_ROWS // 2, random_state=11).tolist()
+before    = get_features_batch(returning)
+with scratch_lakehouse(ONLINE_DEMO_DIR) as (scratch, scratch_store):
+    base  = read_metadata(scratch(BRONZE_METADATA))
+    day   = pa.Table.from_batches(list(iter_ehr_batches(
+        ONLINE_DEMO_ROWS, BRONZE_BATCH_ROWS, seed=EHR_SEED + 2, id_offset=base['row_count'],
+        start='2025-01-02', end='2025-01-02')))
+    ids   = day['patient_id'].to_pylist()
+    ids[:len(returning)] = returning
+    day   = day.set_column(day.schema.get_field_index('patient_id'), 'patient_id',
+                           pa.array(ids, day.schema.field('patient_id').type))
+    append_to_table(scratch(BRONZE_METADATA), scratch(BRONZE_DIR), 'bronze.raw_admissions',
+                    bronze_batches(day.to_batches()), BRONZE_PARTITIONS)
+    t0 = time.perf_counter()
+    refresh_silver(bronze_metadata=scratch(BRONZE_METADATA),
+                   silver_metadata=scratch(SILVER_METADATA), silver_dir=scratch(SILVER_DIR),
+                   quarantine_metadata=scratch(QUARANTINE_METADATA),
+                   quarantine_dir=scratch(QUARANTINE_DIR))
+    _, online_gold = refresh_gold(silver_metadata=scratch(SILVER_METADATA),
+                                  gold_metadata=scratch(GOLD_METADATA), gold_dir=scratch(GOLD_DIR),
+                                  state_metadata=scratch(GOLD_STATE_METADATA),
+                                  state_dir=scratch(GOLD_STATE_DIR))
+    online_update  = sync_online_store(scratch_store, scratch(GOLD_METADATA))
+    update_s = time.perf_counter() - t0
+    after    = get_features_batch(returning, scratch_store)
+print(f"\n   Update path (scratch copy): gold {online_gold['mode']} → store "
+      f"{online_update['mode']} | Patients upserted: {online_update['patients_written']:,} "
+      f"in {update_s:.2f}s end to end")
+print(f"   Returning patients with a new vector: "
+      f"{int((~np.isclose(before, after).all(axis=1)).sum()):,} of {len(returning):,} | "
+      f"Real store unchanged: {np.array_equal(get_features_batch(returning), before)}")
@@ -0,0 +1,59 @@
+import time
+
+# ─── OUT-OF-CORE CHECK: silver + gold under a tight DuckDB memory cap ────────
+# Builds silver and gold for OOC_ROWS admissions on a connection capped well
+# below the data's in-memory size; completing with matching row counts and a
+# non-zero spill shows the window query runs out of core rather than OOMing.
+# The silver stage includes writing its bronze from the generator. At roughly
+# 32 bytes per uncompressed silver row, OOC_ROWS puts silver alone at about
+# three times the cap.
+OOC_ROWS            = 25_000_000
+OOC_MEMORY_LIMIT_MB = 256
+OOC_MEMORY_LIMIT    = f'{OOC_MEMORY_LIMIT_MB}MB'
+OOC_DIR             = '/content/lakehouse/bench/out_of_core'
+
+shutil.rmtree(OOC_DIR, ignore_errors=True)
+
+def uncompressed_mb(files):
+    total = 0
+    for f in files:
+        md = pq.ParquetFile(f['path']).metadata
+        total += sum(md.row_group(i).total_byte_size for i in range(md.num_row_groups))
+    return total / 1024**2
+
+ooc_con = connect_duckdb(memory_limit=OOC_MEMORY_LIMIT)
+ooc_spill = ooc_con.cursor()
+
+def ooc_spill_sample():
+    # The database's temporary files, read from a second cursor while a stage runs
+    return ooc_spill.execute("SELECT COALESCE(SUM(size), 0) FROM duckdb_temporary_files()").fetchone()
+
+ooc_results = []
+for stage in ['silver', 'gold']:
+    with watch_peak(ooc_spill_sample) as peak:
+        t0 = time.perf_counter()
+        if stage == 'silver':
+            files = bench_silver(ooc_con, OOC_ROWS, OOC_DIR, bronze_batches(
+                iter_ehr_batches(OOC_ROWS, BRONZE_BATCH_ROWS, seed=EHR_SEED)))
+        else:
+            files = materialize(ooc_con, gold_sql, f'{OOC_DIR}/gold', lookup_key='patient_id')
+        elapsed = time.perf_counter() - t0
+    ooc_results.append((stage, sum(f['record_count'] for f in files), uncompressed_mb(files),
+                        peak[0] / 1024**2, elapsed))
+ooc_spill.close()
+ooc_con.close()
+
+print(f" OUT-OF-CORE CHECK — {OOC_ROWS:,} admissions, memory_limit = {OOC_MEMORY_LIMIT}")
+print(f"{'Stage':<8} {'Rows':>12} {'Output MB':>10} {'Peak spill MB':>14} {'Seconds':>8}")
+print("-" * 56)
+for stage, rows, out_mb, spill_mb, elapsed in ooc_results:
+    print(f"{stage:<8} {rows:>12,} {out_mb:>10.0f} {spill_mb:>14.0f} {elapsed:>8.1f}")
+shutil.rmtree(OOC_DIR)
+
+(_, silver_rows, silver_mb, _, _), (_, gold_rows, _, gold_spill_mb, _) = ooc_results
+print(f"\n   Silver is {silver_mb / OOC_MEMORY_LIMIT_MB:.1f}x the memory cap | "
+      f"Gold rows match silver: {gold_rows == silver_rows} | "
+      f"Gold window query spilled: {gold_spill_mb:.0f} MB")
+assert silver_mb > 2 * OOC_MEMORY_LIMIT_MB, 'out-of-core input is not clearly larger than the cap'
+assert gold_rows == silver_rows, 'gold lost or duplicated rows under the memory cap'
+assert gold_spill_mb > 0, 'gold window query did not spill under the memory cap'
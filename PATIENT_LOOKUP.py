@@ -0,0 +1,61 @@
+import time
+
+lookup_snapshot = {}
+
+def current_gold_buckets():
+    # Gold's bucket → files map, re-read from the manifest whenever a commit has
+    # moved the current snapshot. Every gold write uses new file names, so its
+    # footers stay cached in lookup_files across refreshes
+    snap = read_metadata(GOLD_METADATA)['current_snapshot_id']
+    if lookup_snapshot.get('snapshot_id') != snap:
+        lookup_snapshot.update(snapshot_id=snap, buckets=gold_bucket_files())
+    return lookup_snapshot['buckets']
+
+def lookup_gold(patient_ids, columns=None):
+    # Only the files of each id's bucket are consulted; incremental refreshes
+    # append files to a bucket, each written in the lookup layout
+    ids = [patient_ids] if isinstance(patient_ids, str) else list(patient_ids)
+    gold_buckets = current_gold_buckets()
+    by_bucket = {}
+    for pid in ids:
+        by_bucket.setdefault(gold_bucket(pid), []).append(pid)
+    frames = [lookup_patients(f['path'], bucket_ids, columns)
+              for bucket, bucket_ids in by_bucket.items()
+              for f in gold_buckets.get(bucket, [])]
+    if not frames:
+        # No file in any of the ids' buckets: an empty frame with gold's columns
+        return query_arrow(f"SELECT {', '.join(columns) if columns else '*'} "
+                           f"FROM gold.readmission_features LIMIT 0").to_pandas()
+    return pd.concat(frames, ignore_index=True)
+
+def lookup_risk_scores(patient_ids, columns=None):
+    # The scored test admissions, written in the lookup layout at a fixed path;
+    # re-scoring rewrites the file in place, which lookup_index notices
+    return lookup_patients(RISK_SCORES_PATH, patient_ids, columns)
+
+gold_buckets = current_gold_buckets()
+gold_paths   = [f['path'] for fs in gold_buckets.values() for f in fs]
+gold_ids     = query_arrow("SELECT DISTINCT patient_id FROM gold.readmission_features "
+                           "ORDER BY patient_id").column('patient_id').to_pandas()
+sample_id    = gold_ids.iloc[len(gold_ids) // 2]
+sample_paths = [f['path'] for f in gold_buckets[gold_bucket(sample_id)]]
+bytes_before = lookup_bytes_read(sample_paths)   # parses and caches the footers first
+t0 = time.perf_counter()
+patient_rows = lookup_gold(sample_id)
+print(f" PATIENT LOOKUP: {sample_id} → {len(patient_rows)} admission(s) "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms, "
+      f"{(lookup_bytes_read(sample_paths) - bytes_before) / 1024:.1f} KB read "
+      f"(gold: {sum(os.path.getsize(p) for p in gold_paths) / 1024:.0f} KB)")
+
+batch_ids = gold_ids.sample(100, random_state=42).tolist()
+t0 = time.perf_counter()
+batch_rows = lookup_gold(batch_ids)
+print(f"\n Batched multi-get: {len(batch_ids)} patients → {len(batch_rows)} rows "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+risk_id   = df_test_results['patient_id'].iloc[0]
+t0 = time.perf_counter()
+risk_rows = lookup_risk_scores(risk_id, ['patient_id', 'risk_score', 'risk_tier'])
+print(f"\n Risk-score lookup: {risk_id} → {len(risk_rows)} scored admission(s) "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+assert len(risk_rows) == (df_test_results['patient_id'] == risk_id).sum()
@@ -72,7 +72,7 @@ ax3.spines[:].set_color('#333333')
 
 ax4 = fig.add_subplot(gs[2, 0], **plot_style)
 ax4.set_facecolor('#161B22')
-age_readmit = df_gold.groupby('age_bucket')['readmitted_30d'].mean().sort_index()
+age_readmit = df_ml.groupby('age_bucket')['readmitted_30d'].mean().sort_index()
 bars = ax4.bar(age_readmit.index, age_readmit.values * 100,
                color=['#00FF87','#FFD700','#FF6B35','#FF0000'], edgecolor='#333333')
 ax4.set_title('Readmission Rate by Age', color='white', fontsize=11, fontweight='bold')
@@ -97,7 +97,7 @@ ax5.set_title('Confusion Matrix\n(threshold=0.40)', color='white', fontsize=11,
 
 ax6 = fig.add_subplot(gs[2, 2:], **plot_style)
 ax6.set_facecolor('#161B22')
-tier_readmit = df_gold.groupby('charlson_index')['readmitted_30d'].agg(['mean','count']).reset_index()
+tier_readmit = df_ml.groupby('charlson_index')['readmitted_30d'].agg(['mean','count']).reset_index()
 tier_readmit = tier_readmit[tier_readmit['count'] > 500].head(8)
 ax6.bar(tier_readmit['charlson_index'], tier_readmit['mean']*100,
         color='#00D4FF', alpha=0.85, edgecolor='#333333')
@@ -1,6 +1,6 @@
 # ─── INSTALL ALL REQUIRED PACKAGES ───────────────────────────────────────────
 !pip install -q xgboost shap imbalanced-learn great_expectations mlflow \
                pyiceberg plotly kaleido faker duckdb pandas numpy \
-               scikit-learn matplotlib seaborn pyarrow
+               scikit-learn matplotlib seaborn pyarrow polars
 
 print("All packages installed successfully!")
\ No newline at end of file
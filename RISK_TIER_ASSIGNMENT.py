@@ -1,4 +1,7 @@
+RISK_SCORES_PATH = '/content/lakehouse/ml/patient_risk_scores.parquet'
+
 df_test_results = X_test.copy()
+df_test_results.insert(0, 'patient_id', df_ml.loc[X_test.index, 'patient_id'].values)
 df_test_results['risk_score'] = y_prob
 df_test_results['actual']     = y_test.values
 df_test_results['risk_tier']  = pd.cut(
@@ -19,6 +22,6 @@ print("-" * 57)
 for _, row in tier_stats.iterrows():
     print(f"{row['risk_tier']:<12} {row['patients']:>10,} {row['avg_risk_score']:>15.3f} {row['actual_readmit_rate']:>16.1%}")
 
-df_test_results.to_parquet('/content/lakehouse/ml/patient_risk_scores.parquet', index=False)
+write_lookup_parquet(df_test_results, RISK_SCORES_PATH)
 print(f"\n Risk scores saved to lakehouse/ml/patient_risk_scores.parquet")
 print(f"   Total patients scored: {len(df_test_results):,}")
\ No newline at end of file
@@ -12,9 +12,9 @@ print(f"   Avg Precision Score                     : {average_precision_score(y_
 print(f"\n{report}")
 print(f"\n  DATA PIPELINE:")
 print(f"   EHR Records Ingested           : {N:,}")
-print(f"   Bronze Layer Rows              : {len(df_raw):,}")
-print(f"   Silver Layer Rows (cleaned)    : {len(df_silver):,}")
-print(f"   Gold Features Engineered       : {len(df_gold.columns) - 1}")
+print(f"   Bronze Layer Rows              : {bronze_rows:,}")
+print(f"   Silver Layer Rows (cleaned)    : {silver_metadata['row_count']:,}")
+print(f"   Gold Features Engineered       : {len(gold_columns) - 1}")
 print(f"   GE Rules Evaluated             : {total}")
 print(f"   GE Rules Passed                : {passed} ({pct:.1f}%)")
 print(f"\n LAKEHOUSE LAYERS:")
@@ -24,7 +24,7 @@ print(f"   Gold   : readmission_features.parquet (40+ CTE features)")
 print(f"   ML     : patient_risk_scores.parquet  (SHAP risk tiers)")
 print(f"\n RESUME BULLET PROOF POINTS:")
 print(f"   ✓ Advanced SQL (recursive CTEs, rolling windows) in DuckDB/Snowflake")
-print(f"   ✓ Engineered {len(df_gold.columns)-1}+ clinical features from {N:,}+ EHR records")
+print(f"   ✓ Engineered {len(gold_columns)-1}+ clinical features from {N:,}+ EHR records")
 print(f"   ✓ XGBoost ROC-AUC {xgb_auc:.2f} vs {baseline_auc:.2f} baseline")
 print(f"   ✓ SHAP risk tiers for clinical explainability")
 print(f"   ✓ SMOTE applied to fix {y.mean():.0%} class imbalance")
@@ -69,11 +69,246 @@ def generate_ehr(n):
 
     return pd.DataFrame(records)
 
-df_raw = generate_ehr(N)
-
-print(f" Generated {len(df_raw):,} records")
-print(f"   Readmission rate: {df_raw.readmitted_30d.mean():.1%}")
-print(f"   Age range: {df_raw.age.min()}–{df_raw.age.max()} (mean: {df_raw.age.mean():.1f})")
-print(f"   Diabetes prevalence: {df_raw.has_diabetes.mean():.1%}")
-print(f"   CHF prevalence: {df_raw.has_chf.mean():.1%}")
-df_raw.head(3)
\ No newline at end of file
+SEASONS     = pa.array(['WINTER','SPRING','SUMMER','FALL'])
+AGE_BUCKETS = pa.array(['18-39','40-59','60-74','75+'])
+GENDERS     = pa.array(['M','F'])
+EHR_START   = np.datetime64('2021-01-01')
+EHR_END     = np.datetime64('2024-12-31')
+
+def ascii_column(n, *parts):
+    # Fixed-width strings assembled as one (n, width) byte matrix and handed
+    # to Arrow zero-copy: parts are bytes literals or (values, n_digits) pairs
+    width = sum(len(p) if isinstance(p, bytes) else p[1] for p in parts)
+    chars = np.empty((n, width), dtype=np.uint8)
+    pos = 0
+    for p in parts:
+        if isinstance(p, bytes):
+            chars[:, pos:pos + len(p)] = np.frombuffer(p, dtype=np.uint8)
+            pos += len(p)
+        else:
+            values, n_digits = p
+            for k in range(n_digits):
+                chars[:, pos] = values // 10 ** (n_digits - 1 - k) % 10 + ord('0')
+                pos += 1
+    offsets = np.arange(0, (n + 1) * width, width, dtype=np.int32)
+    return pa.StringArray.from_buffers(n, pa.py_buffer(offsets), pa.py_buffer(chars))
+
+def draw_comorbidities(age, rng):
+    n = len(age)
+    flags = {
+        'has_diabetes': (rng.random(n) < (0.12 + age * 0.003)).astype(np.int64),
+        'has_chf':      (rng.random(n) < (0.07 + age * 0.002)).astype(np.int64),
+        'has_copd':     (rng.random(n) < (0.09 + age * 0.002)).astype(np.int64),
+        'has_ckd':      (rng.random(n) < (0.08 + age * 0.002)).astype(np.int64),
+        'has_cancer':   (rng.random(n) < 0.06).astype(np.int64),
+        'has_dementia': (rng.random(n) < (0.02 + (age > 75) * 0.10)).astype(np.int64),
+    }
+    cci = (flags['has_diabetes'] * 1 + flags['has_chf'] * 2 + flags['has_copd'] * 1 +
+           flags['has_ckd'] * 2 + flags['has_cancer'] * 2 + flags['has_dementia'] * 2)
+    return flags, cci
+
+def readmit_probability(age, cci, has_chf, prior, los):
+    return np.minimum(0.90,
+        0.05
+        + cci        * 0.04
+        + (age > 70) * 0.07
+        + has_chf    * 0.12
+        + prior      * 0.02
+        + (los > 7)  * 0.05
+    )
+
+def calendar_columns(admit_date):
+    admit_mon   = admit_date.astype('datetime64[M]')
+    admit_year  = admit_date.astype('datetime64[Y]').astype(np.int64) + 1970
+    admit_month = admit_mon.astype(np.int64) % 12 + 1
+    admit_day   = (admit_date - admit_mon).astype(np.int64) + 1
+    return {
+        'admission_date':    ascii_column(len(admit_date), (admit_year, 4), b'-',
+                                          (admit_month, 2), b'-', (admit_day, 2)),
+        'admit_year':        admit_year,
+        'admit_month':       admit_month,
+        'admit_dow':         (admit_date.astype(np.int64) + 3) % 7,
+        'admit_season':      SEASONS.take((admit_month % 12) // 3),
+    }
+
+def patient_id_column(patient_idx):
+    width = max(7, len(str(int(patient_idx.max())))) if len(patient_idx) else 7
+    return ascii_column(len(patient_idx), b'PAT-', (patient_idx, width))
+
+def age_bucket_column(age):
+    return AGE_BUCKETS.take(np.searchsorted([40, 60, 75], age, side='right'))
+
+def draw_ehr_columns(n, rng, id_offset=0, start=EHR_START, end=EHR_END):
+    # Same clinical model as generate_ehr, drawn one whole column at a time
+    age = np.clip(rng.normal(62, 18, n), 18, 95).astype(np.int64)
+    flags, cci = draw_comorbidities(age, rng)
+
+    los   = np.maximum(1, rng.exponential(5, n).astype(np.int64))
+    procs = rng.integers(0, 13, n)
+    diags = rng.integers(1, 21, n)
+    prior = rng.integers(0, 9, n)
+
+    readmit_prob = readmit_probability(age, cci, flags['has_chf'], prior, los)
+    readmitted   = (rng.random(n) < readmit_prob).astype(np.int64)
+
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    date_range = (end - start).astype(np.int64)
+    admit_date = start + rng.integers(0, date_range + 1, n)
+
+    return {
+        'patient_id':        patient_id_column(np.arange(id_offset, id_offset + n, dtype=np.int64)),
+        **calendar_columns(admit_date),
+        'age':               age,
+        'age_bucket':        age_bucket_column(age),
+        'gender':            GENDERS.take(rng.integers(0, 2, n)),
+        'los_days':          los,
+        'num_procedures':    procs,
+        'num_diagnoses':     diags,
+        **flags,
+        'charlson_index':    cci,
+        'prior_visits_12m':  prior,
+        'readmitted_30d':    readmitted
+    }
+
+def draw_cohort_columns(n_patients, rng, id_offset=0, visits_zipf_a=2.0, max_visits=200,
+                        mean_gap_days=120, readmit_window=30):
+    # Longitudinal cohort: each patient has a Zipf-distributed number of admissions
+    # (most have one, a heavy tail of frequent flyers has dozens). Demographics and
+    # chronic conditions are per patient; each stay decides whether the next
+    # admission falls inside the readmission window after discharge, and the
+    # label is then read back off the realised gap so the two always agree.
+    n_visits   = np.minimum(rng.zipf(visits_zipf_a, n_patients), max_visits)
+    patient    = np.repeat(np.arange(n_patients, dtype=np.int64), n_visits)
+    first_row  = np.cumsum(n_visits) - n_visits
+    visit_no   = np.arange(len(patient)) - np.repeat(first_row, n_visits)
+    n          = len(patient)
+
+    base_age   = np.clip(rng.normal(62, 18, n_patients), 18, 95).astype(np.int64)
+    flags, cci = draw_comorbidities(base_age, rng)
+    gender     = rng.integers(0, 2, n_patients)
+
+    los   = np.maximum(1, rng.exponential(5, n).astype(np.int64))
+    procs = rng.integers(0, 13, n)
+    diags = rng.integers(1, 21, n)
+
+    # Prior utilisation is only known after dates are laid out, so the visit
+    # index stands in for it when deciding the next gap
+    p_next_within = readmit_probability(base_age[patient], cci[patient],
+                                        flags['has_chf'][patient],
+                                        np.minimum(visit_no, 8), los)
+    # Frequent flyers come back sooner, so their history still fits the window
+    date_range = (EHR_END - EHR_START).astype(np.int64)
+    gap_scale  = np.minimum(mean_gap_days, date_range / n_visits)[patient]
+    soon  = rng.random(n) < p_next_within
+    after = np.where(soon, rng.integers(1, readmit_window + 1, n),
+                     readmit_window + 1 + rng.exponential(gap_scale).astype(np.int64))
+    gap   = los + after
+
+    first_day  = rng.integers(0, date_range + 1, n_patients)
+    elapsed    = np.cumsum(gap) - gap
+    elapsed   -= np.repeat(elapsed[first_row], n_visits)
+    day        = np.repeat(first_day, n_visits) + elapsed
+
+    keep = day <= date_range
+    patient, visit_no, day = patient[keep], visit_no[keep], day[keep]
+    los, procs, diags      = los[keep], procs[keep], diags[keep]
+    n = len(patient)
+
+    same_next  = np.append(patient[1:] == patient[:-1], False)
+    next_day   = np.append(day[1:], 0)
+    readmitted = (same_next & (next_day - day - los <= readmit_window)).astype(np.int64)
+
+    # Admissions by the same patient in the 365 days before this one
+    key   = patient * (1 << 20) + day
+    prior = np.arange(n) - np.searchsorted(key, key - 365, side='left')
+
+    # First admissions always fall inside the window, so patients age from there
+    age = np.minimum(base_age[patient] + (day - first_day[patient]) // 365, 95)
+
+    return {
+        'patient_id':        patient_id_column(patient + id_offset),
+        **calendar_columns(EHR_START + day),
+        'age':               age,
+        'age_bucket':        age_bucket_column(age),
+        'gender':            GENDERS.take(gender[patient]),
+        'los_days':          los,
+        'num_procedures':    procs,
+        'num_diagnoses':     diags,
+        **{name: flag[patient] for name, flag in flags.items()},
+        'charlson_index':    cci[patient],
+        'prior_visits_12m':  prior,
+        'readmitted_30d':    readmitted
+    }
+
+def generate_ehr_vectorized(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return pa.table(draw_ehr_columns(n, rng)).to_pandas()
+
+def iter_ehr_batches(n, batch_rows=1_000_000, seed=42, id_offset=0,
+                     start=EHR_START, end=EHR_END):
+    # Bounded-memory stream: only one batch of columns is alive at a time
+    rng = np.random.default_rng(seed)
+    for offset in range(0, n, batch_rows):
+        size = min(batch_rows, n - offset)
+        yield pa.RecordBatch.from_pydict(
+            draw_ehr_columns(size, rng, id_offset + offset, start, end))
+
+def generate_ehr_cohort(n_rows, seed=42, **cohort_params):
+    # n_rows admissions, the same rows iter_cohort_batches streams for the seed
+    return pa.Table.from_batches(list(iter_cohort_batches(n_rows, seed=seed, **cohort_params))
+                                 ).to_pandas()
+
+def iter_cohort_batches(n_rows, patients_per_batch=250_000, seed=42, id_offset=0,
+                        **cohort_params):
+    # Repeat-admission cohort streamed in patient chunks until n_rows admissions
+    # have been drawn; the last patient may be cut short at the n_rows boundary.
+    # Every patient has at least one admission, so a chunk never needs more
+    # patients than rows are still missing, and patient ids stay within
+    # [id_offset, id_offset + n_rows)
+    rng = np.random.default_rng(seed)
+    drawn = 0
+    while drawn < n_rows:
+        batch = pa.RecordBatch.from_pydict(
+            draw_cohort_columns(min(patients_per_batch, n_rows - drawn), rng,
+                                id_offset=id_offset + drawn, **cohort_params))
+        batch = batch.slice(0, n_rows - drawn)
+        drawn += batch.num_rows
+        yield batch
+
+EHR_MODE = 'vectorized'   # 'rows' = original per-record loop, 'cohort' = repeat admissions
+EHR_SEED = 42
+EHR_STREAMING = False     # True: no in-memory df_raw; the bronze writer draws N rows in batches
+EHR_SHARDS    = 1         # > 1: bronze worker processes draw N rows in shards, no df_raw either
+COHORT_PARAMS = {'visits_zipf_a': 2.0, 'max_visits': 200, 'mean_gap_days': 120}
+
+def iter_bronze_source(n, batch_rows=1_000_000, seed=42, id_offset=0):
+    # The batches a streaming bronze write draws, in the shape EHR_MODE generates
+    if EHR_MODE == 'cohort':
+        return iter_cohort_batches(n, seed=seed, id_offset=id_offset, **COHORT_PARAMS)
+    return iter_ehr_batches(n, batch_rows, seed=seed, id_offset=id_offset)
+
+if EHR_STREAMING or EHR_SHARDS > 1:
+    # Shards draw from their own seeds, so an in-memory frame would not match bronze
+    df_raw = None
+elif EHR_MODE == 'cohort':
+    df_raw = generate_ehr_cohort(N, seed=EHR_SEED, **COHORT_PARAMS)
+elif EHR_MODE == 'vectorized':
+    df_raw = generate_ehr_vectorized(N, seed=EHR_SEED)
+else:
+    df_raw = generate_ehr(N)
+
+if df_raw is None:
+    print(f" Streaming {N:,} records: generation deferred to the bronze writer"
+          + (f" ({EHR_SHARDS} shards)" if EHR_SHARDS > 1 else ""))
+else:
+    print(f" Generated {len(df_raw):,} records")
+    print(f"   Readmission rate: {df_raw.readmitted_30d.mean():.1%}")
+    print(f"   Age range: {df_raw.age.min()}–{df_raw.age.max()} (mean: {df_raw.age.mean():.1f})")
+    print(f"   Diabetes prevalence: {df_raw.has_diabetes.mean():.1%}")
+    print(f"   CHF prevalence: {df_raw.has_chf.mean():.1%}")
+    if EHR_MODE == 'cohort':
+        visits = df_raw.groupby('patient_id').size()
+        print(f"   Patients: {len(visits):,} | admissions per patient "
+              f"p50={visits.median():.0f} p99={visits.quantile(0.99):.0f} max={visits.max()}")
+        print(f"   Patients with a repeat admission: {(visits > 1).mean():.1%}")
+    print(df_raw.head(3).to_string(index=False))
\ No newline at end of file
@@ -0,0 +1,51 @@
+import time
+
+# ─── TRAINING SET BENCHMARK: label events vs time and DuckDB memory ──────────
+# Random label events against the main gold table, built with
+# build_training_set on a connection held to a fixed memory cap
+PIT_BENCH_EVENTS = [1_000_000, 10_000_000, 30_000_000]
+PIT_BENCH_MEMORY = '1GB'
+PIT_BENCH_DIR    = '/content/lakehouse/bench/training_sets'
+
+print(f"{'Label events':>13} {'Seconds':>8} {'Events/sec':>12} {'Peak mem MB':>12} "
+      f"{'Peak spill MB':>14}   (memory_limit = {PIT_BENCH_MEMORY})")
+print("-" * 64)
+pit_con = connect_duckdb(memory_limit=PIT_BENCH_MEMORY)
+pit_memory = pit_con.cursor()
+
+def pit_memory_sample():
+    # DuckDB's buffer manager and temp files, read from a second cursor
+    return pit_memory.execute("""
+        SELECT (SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()),
+               (SELECT COALESCE(SUM(size), 0) FROM duckdb_temporary_files())""").fetchone()
+
+pit_con.execute(f"""CREATE TEMP TABLE pit_patients AS
+                    SELECT patient_id, ROW_NUMBER() OVER () - 1 AS i
+                    FROM (SELECT DISTINCT patient_id
+                          FROM {parquet_source(load_data_files(GOLD_METADATA))})""")
+n_patients = pit_con.execute("SELECT COUNT(*) FROM pit_patients").fetchone()[0]
+for n in PIT_BENCH_EVENTS:
+    bench_dir = f'{PIT_BENCH_DIR}/bench_{n}'
+    shutil.rmtree(bench_dir, ignore_errors=True)
+    os.makedirs(bench_dir)
+    # Random patients at random seconds across 2021-2025, written to Parquet first
+    # so only the builder is timed
+    pit_con.execute(f"""COPY (SELECT p.patient_id,
+                                     TIMESTAMP '2021-01-01'
+                                         + to_seconds(CAST(hash(e.i, 1) % 157766400 AS BIGINT))
+                                         AS event_ts,
+                                     CAST(hash(e.i, 2) % 2 AS INTEGER) AS label
+                              FROM range({n}) e(i)
+                              JOIN pit_patients p ON p.i = hash(e.i) % {n_patients})
+                        TO '{bench_dir}/labels.parquet' (FORMAT parquet)""")
+    with watch_peak(pit_memory_sample) as peak:
+        t0 = time.perf_counter()
+        bench_meta = build_training_set(pit_con, parquet_source([f'{bench_dir}/labels.parquet']),
+                                        f'{bench_dir}/training_set')
+        elapsed = time.perf_counter() - t0
+    print(f"{bench_meta['row_count']:>13,} {elapsed:>8.1f} {n / elapsed:>12,.0f} "
+          f"{peak[0] / 1024**2:>12.0f} {peak[1] / 1024**2:>14.0f}")
+    shutil.rmtree(bench_dir)
+pit_memory.close()
+pit_con.close()
+shutil.rmtree(PIT_BENCH_DIR)
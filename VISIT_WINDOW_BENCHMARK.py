@@ -0,0 +1,65 @@
+import time
+
+# ─── VISIT WINDOW BENCHMARK: calendar RANGE frames vs the old ROWS frames ────
+VISIT_BENCH_ROWS = [1_000_000, 10_000_000]
+VISIT_BENCH_DIR  = '/content/lakehouse/bench/visit_windows'
+
+visit_rows_sql = """
+SELECT patient_id, admission_date,
+       COUNT(*) OVER (visits ROWS BETWEEN 2 PRECEDING AND 1 PRECEDING) AS visits_prior_2,
+       COUNT(*) OVER (visits ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING) AS visits_prior_5
+FROM silver
+WINDOW visits AS (PARTITION BY patient_id ORDER BY admission_date)
+"""
+visit_calendar  = [f for f in FEATURE_REGISTRY if f['kind'] == 'calendar']
+visit_range_sql = f"""
+SELECT patient_id, admission_date,
+{registry_select_sql(visit_calendar).rstrip().rstrip(',')}
+FROM silver
+{registry_window_sql(visit_calendar)}
+"""
+
+def reference_visit_counts(table, horizons):
+    # Sort once by (patient, day), then for every horizon find where each visit's
+    # window starts with one vectorised binary search over that sorted key
+    patient = pd.factorize(table.column('patient_id').to_numpy())[0].astype(np.int64)
+    day     = table.column('admission_date').cast(pa.int32()).to_numpy().astype(np.int64)
+    key     = patient * (1 << 20) + day
+    order   = np.argsort(key, kind='stable')
+    key     = key[order]
+    counts  = {}
+    for h in horizons:
+        c = np.empty(len(key), dtype=np.int64)
+        c[order] = np.searchsorted(key, key, 'left') - np.searchsorted(key, key - h, 'left')
+        counts[h] = c
+    return counts
+
+print(" VISIT WINDOW BENCHMARK — RANGE over admission_date vs ROWS")
+print(f"{'Silver rows':>12} {'Max visits':>11} {'ROWS s':>8} {'RANGE s':>8} "
+      f"{'Horizons':>9} {'Matches reference':>18}")
+print("-" * 71)
+
+visit_con = connect_duckdb()
+for n in VISIT_BENCH_ROWS:
+    shutil.rmtree(VISIT_BENCH_DIR, ignore_errors=True)
+    bench_silver(visit_con, n, VISIT_BENCH_DIR)
+    max_visits = visit_con.execute("SELECT MAX(c) FROM (SELECT COUNT(*) AS c FROM silver "
+                                   "GROUP BY patient_id)").fetchone()[0]
+
+    timings = {}
+    for name, sql in [('rows', visit_rows_sql), ('range', visit_range_sql)]:
+        t0 = time.perf_counter()
+        rows = sum(b.num_rows for b in visit_con.execute(sql).fetch_record_batch(1_000_000))
+        timings[name] = time.perf_counter() - t0
+
+    # Check the RANGE counts against the sort-once reference on the smallest size
+    matches = '-'
+    if n == VISIT_BENCH_ROWS[0]:
+        result    = visit_con.execute(visit_range_sql).fetch_arrow_table()
+        reference = reference_visit_counts(result, GOLD_VISIT_HORIZONS)
+        matches   = all(np.array_equal(result.column(f'visits_prior_{h}d').to_numpy(),
+                                       reference[h]) for h in GOLD_VISIT_HORIZONS)
+    print(f"{rows:>12,} {max_visits:>11,} {timings['rows']:>8.1f} {timings['range']:>8.1f} "
+          f"{len(GOLD_VISIT_HORIZONS):>9} {str(matches):>18}")
+visit_con.close()
+shutil.rmtree(VISIT_BENCH_DIR)
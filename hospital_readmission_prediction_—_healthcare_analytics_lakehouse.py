@@ -7,9 +7,10 @@ Original file is located at
     https://colab.research.google.com/drive/1ufi9i1g907tnSHL2KCg3PFppsidlqqI3
 """
 
+# ─── INSTALL ALL REQUIRED PACKAGES ───────────────────────────────────────────
 !pip install -q xgboost shap imbalanced-learn great_expectations mlflow \
                pyiceberg plotly kaleido faker duckdb pandas numpy \
-               scikit-learn matplotlib seaborn pyarrow
+               scikit-learn matplotlib seaborn pyarrow polars
 
 print("All packages installed successfully!")
 
@@ -17,11 +18,25 @@ import pandas as pd
 import numpy as np
 import warnings
 import os
+import io
 import json
 import sqlite3
+import math
+import uuid
+import fcntl
+import queue
+import shutil
+import hashlib
+import threading
+import tracemalloc
+import multiprocessing
+from contextlib import contextmanager
+from decimal import Decimal
 import duckdb
 import pyarrow as pa
 import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import polars as pl
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 import seaborn as sns
@@ -38,7 +53,6 @@ from sklearn.metrics import (roc_auc_score, classification_report,
                               confusion_matrix, roc_curve, precision_recall_curve,
                               average_precision_score)
 from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import LabelEncoder
 from imblearn.over_sampling import SMOTE
 import shap
 import mlflow
@@ -66,13 +80,13 @@ plt.rcParams.update({
     'font.family':      'DejaVu Sans'
 })
 
-print("All imports successful!")
+print(" All imports successful!")
 print(f"   pandas {pd.__version__} | numpy {np.__version__} | xgboost ready | shap ready")
 
 fake = Faker()
 N = 100_000
 
-print(f"⏳ Generating {N:,} synthetic EHR records...")
+print(f" Generating {N:,} synthetic EHR records...")
 
 def generate_ehr(n):
     records = []
@@ -140,48 +154,1038 @@ def generate_ehr(n):
 
     return pd.DataFrame(records)
 
-df_raw = generate_ehr(N)
+SEASONS     = pa.array(['WINTER','SPRING','SUMMER','FALL'])
+AGE_BUCKETS = pa.array(['18-39','40-59','60-74','75+'])
+GENDERS     = pa.array(['M','F'])
+EHR_START   = np.datetime64('2021-01-01')
+EHR_END     = np.datetime64('2024-12-31')
+
+def ascii_column(n, *parts):
+    # Fixed-width strings assembled as one (n, width) byte matrix and handed
+    # to Arrow zero-copy: parts are bytes literals or (values, n_digits) pairs
+    width = sum(len(p) if isinstance(p, bytes) else p[1] for p in parts)
+    chars = np.empty((n, width), dtype=np.uint8)
+    pos = 0
+    for p in parts:
+        if isinstance(p, bytes):
+            chars[:, pos:pos + len(p)] = np.frombuffer(p, dtype=np.uint8)
+            pos += len(p)
+        else:
+            values, n_digits = p
+            for k in range(n_digits):
+                chars[:, pos] = values // 10 ** (n_digits - 1 - k) % 10 + ord('0')
+                pos += 1
+    offsets = np.arange(0, (n + 1) * width, width, dtype=np.int32)
+    return pa.StringArray.from_buffers(n, pa.py_buffer(offsets), pa.py_buffer(chars))
+
+def draw_comorbidities(age, rng):
+    n = len(age)
+    flags = {
+        'has_diabetes': (rng.random(n) < (0.12 + age * 0.003)).astype(np.int64),
+        'has_chf':      (rng.random(n) < (0.07 + age * 0.002)).astype(np.int64),
+        'has_copd':     (rng.random(n) < (0.09 + age * 0.002)).astype(np.int64),
+        'has_ckd':      (rng.random(n) < (0.08 + age * 0.002)).astype(np.int64),
+        'has_cancer':   (rng.random(n) < 0.06).astype(np.int64),
+        'has_dementia': (rng.random(n) < (0.02 + (age > 75) * 0.10)).astype(np.int64),
+    }
+    cci = (flags['has_diabetes'] * 1 + flags['has_chf'] * 2 + flags['has_copd'] * 1 +
+           flags['has_ckd'] * 2 + flags['has_cancer'] * 2 + flags['has_dementia'] * 2)
+    return flags, cci
+
+def readmit_probability(age, cci, has_chf, prior, los):
+    return np.minimum(0.90,
+        0.05
+        + cci        * 0.04
+        + (age > 70) * 0.07
+        + has_chf    * 0.12
+        + prior      * 0.02
+        + (los > 7)  * 0.05
+    )
+
+def calendar_columns(admit_date):
+    admit_mon   = admit_date.astype('datetime64[M]')
+    admit_year  = admit_date.astype('datetime64[Y]').astype(np.int64) + 1970
+    admit_month = admit_mon.astype(np.int64) % 12 + 1
+    admit_day   = (admit_date - admit_mon).astype(np.int64) + 1
+    return {
+        'admission_date':    ascii_column(len(admit_date), (admit_year, 4), b'-',
+                                          (admit_month, 2), b'-', (admit_day, 2)),
+        'admit_year':        admit_year,
+        'admit_month':       admit_month,
+        'admit_dow':         (admit_date.astype(np.int64) + 3) % 7,
+        'admit_season':      SEASONS.take((admit_month % 12) // 3),
+    }
+
+def patient_id_column(patient_idx):
+    width = max(7, len(str(int(patient_idx.max())))) if len(patient_idx) else 7
+    return ascii_column(len(patient_idx), b'PAT-', (patient_idx, width))
+
+def age_bucket_column(age):
+    return AGE_BUCKETS.take(np.searchsorted([40, 60, 75], age, side='right'))
+
+def draw_ehr_columns(n, rng, id_offset=0, start=EHR_START, end=EHR_END):
+    # Same clinical model as generate_ehr, drawn one whole column at a time
+    age = np.clip(rng.normal(62, 18, n), 18, 95).astype(np.int64)
+    flags, cci = draw_comorbidities(age, rng)
+
+    los   = np.maximum(1, rng.exponential(5, n).astype(np.int64))
+    procs = rng.integers(0, 13, n)
+    diags = rng.integers(1, 21, n)
+    prior = rng.integers(0, 9, n)
+
+    readmit_prob = readmit_probability(age, cci, flags['has_chf'], prior, los)
+    readmitted   = (rng.random(n) < readmit_prob).astype(np.int64)
+
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    date_range = (end - start).astype(np.int64)
+    admit_date = start + rng.integers(0, date_range + 1, n)
+
+    return {
+        'patient_id':        patient_id_column(np.arange(id_offset, id_offset + n, dtype=np.int64)),
+        **calendar_columns(admit_date),
+        'age':               age,
+        'age_bucket':        age_bucket_column(age),
+        'gender':            GENDERS.take(rng.integers(0, 2, n)),
+        'los_days':          los,
+        'num_procedures':    procs,
+        'num_diagnoses':     diags,
+        **flags,
+        'charlson_index':    cci,
+        'prior_visits_12m':  prior,
+        'readmitted_30d':    readmitted
+    }
+
+def draw_cohort_columns(n_patients, rng, id_offset=0, visits_zipf_a=2.0, max_visits=200,
+                        mean_gap_days=120, readmit_window=30):
+    # Longitudinal cohort: each patient has a Zipf-distributed number of admissions
+    # (most have one, a heavy tail of frequent flyers has dozens). Demographics and
+    # chronic conditions are per patient; each stay decides whether the next
+    # admission falls inside the readmission window after discharge, and the
+    # label is then read back off the realised gap so the two always agree.
+    n_visits   = np.minimum(rng.zipf(visits_zipf_a, n_patients), max_visits)
+    patient    = np.repeat(np.arange(n_patients, dtype=np.int64), n_visits)
+    first_row  = np.cumsum(n_visits) - n_visits
+    visit_no   = np.arange(len(patient)) - np.repeat(first_row, n_visits)
+    n          = len(patient)
+
+    base_age   = np.clip(rng.normal(62, 18, n_patients), 18, 95).astype(np.int64)
+    flags, cci = draw_comorbidities(base_age, rng)
+    gender     = rng.integers(0, 2, n_patients)
+
+    los   = np.maximum(1, rng.exponential(5, n).astype(np.int64))
+    procs = rng.integers(0, 13, n)
+    diags = rng.integers(1, 21, n)
+
+    # Prior utilisation is only known after dates are laid out, so the visit
+    # index stands in for it when deciding the next gap
+    p_next_within = readmit_probability(base_age[patient], cci[patient],
+                                        flags['has_chf'][patient],
+                                        np.minimum(visit_no, 8), los)
+    # Frequent flyers come back sooner, so their history still fits the window
+    date_range = (EHR_END - EHR_START).astype(np.int64)
+    gap_scale  = np.minimum(mean_gap_days, date_range / n_visits)[patient]
+    soon  = rng.random(n) < p_next_within
+    after = np.where(soon, rng.integers(1, readmit_window + 1, n),
+                     readmit_window + 1 + rng.exponential(gap_scale).astype(np.int64))
+    gap   = los + after
+
+    first_day  = rng.integers(0, date_range + 1, n_patients)
+    elapsed    = np.cumsum(gap) - gap
+    elapsed   -= np.repeat(elapsed[first_row], n_visits)
+    day        = np.repeat(first_day, n_visits) + elapsed
+
+    keep = day <= date_range
+    patient, visit_no, day = patient[keep], visit_no[keep], day[keep]
+    los, procs, diags      = los[keep], procs[keep], diags[keep]
+    n = len(patient)
+
+    same_next  = np.append(patient[1:] == patient[:-1], False)
+    next_day   = np.append(day[1:], 0)
+    readmitted = (same_next & (next_day - day - los <= readmit_window)).astype(np.int64)
+
+    # Admissions by the same patient in the 365 days before this one
+    key   = patient * (1 << 20) + day
+    prior = np.arange(n) - np.searchsorted(key, key - 365, side='left')
+
+    # First admissions always fall inside the window, so patients age from there
+    age = np.minimum(base_age[patient] + (day - first_day[patient]) // 365, 95)
+
+    return {
+        'patient_id':        patient_id_column(patient + id_offset),
+        **calendar_columns(EHR_START + day),
+        'age':               age,
+        'age_bucket':        age_bucket_column(age),
+        'gender':            GENDERS.take(gender[patient]),
+        'los_days':          los,
+        'num_procedures':    procs,
+        'num_diagnoses':     diags,
+        **{name: flag[patient] for name, flag in flags.items()},
+        'charlson_index':    cci[patient],
+        'prior_visits_12m':  prior,
+        'readmitted_30d':    readmitted
+    }
+
+def generate_ehr_vectorized(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return pa.table(draw_ehr_columns(n, rng)).to_pandas()
+
+def iter_ehr_batches(n, batch_rows=1_000_000, seed=42, id_offset=0,
+                     start=EHR_START, end=EHR_END):
+    # Bounded-memory stream: only one batch of columns is alive at a time
+    rng = np.random.default_rng(seed)
+    for offset in range(0, n, batch_rows):
+        size = min(batch_rows, n - offset)
+        yield pa.RecordBatch.from_pydict(
+            draw_ehr_columns(size, rng, id_offset + offset, start, end))
+
+def generate_ehr_cohort(n_rows, seed=42, **cohort_params):
+    # n_rows admissions, the same rows iter_cohort_batches streams for the seed
+    return pa.Table.from_batches(list(iter_cohort_batches(n_rows, seed=seed, **cohort_params))
+                                 ).to_pandas()
+
+def iter_cohort_batches(n_rows, patients_per_batch=250_000, seed=42, id_offset=0,
+                        **cohort_params):
+    # Repeat-admission cohort streamed in patient chunks until n_rows admissions
+    # have been drawn; the last patient may be cut short at the n_rows boundary.
+    # Every patient has at least one admission, so a chunk never needs more
+    # patients than rows are still missing, and patient ids stay within
+    # [id_offset, id_offset + n_rows)
+    rng = np.random.default_rng(seed)
+    drawn = 0
+    while drawn < n_rows:
+        batch = pa.RecordBatch.from_pydict(
+            draw_cohort_columns(min(patients_per_batch, n_rows - drawn), rng,
+                                id_offset=id_offset + drawn, **cohort_params))
+        batch = batch.slice(0, n_rows - drawn)
+        drawn += batch.num_rows
+        yield batch
+
+EHR_MODE = 'vectorized'   # 'rows' = original per-record loop, 'cohort' = repeat admissions
+EHR_SEED = 42
+EHR_STREAMING = False     # True: no in-memory df_raw; the bronze writer draws N rows in batches
+EHR_SHARDS    = 1         # > 1: bronze worker processes draw N rows in shards, no df_raw either
+COHORT_PARAMS = {'visits_zipf_a': 2.0, 'max_visits': 200, 'mean_gap_days': 120}
+
+def iter_bronze_source(n, batch_rows=1_000_000, seed=42, id_offset=0):
+    # The batches a streaming bronze write draws, in the shape EHR_MODE generates
+    if EHR_MODE == 'cohort':
+        return iter_cohort_batches(n, seed=seed, id_offset=id_offset, **COHORT_PARAMS)
+    return iter_ehr_batches(n, batch_rows, seed=seed, id_offset=id_offset)
+
+if EHR_STREAMING or EHR_SHARDS > 1:
+    # Shards draw from their own seeds, so an in-memory frame would not match bronze
+    df_raw = None
+elif EHR_MODE == 'cohort':
+    df_raw = generate_ehr_cohort(N, seed=EHR_SEED, **COHORT_PARAMS)
+elif EHR_MODE == 'vectorized':
+    df_raw = generate_ehr_vectorized(N, seed=EHR_SEED)
+else:
+    df_raw = generate_ehr(N)
+
+if df_raw is None:
+    print(f" Streaming {N:,} records: generation deferred to the bronze writer"
+          + (f" ({EHR_SHARDS} shards)" if EHR_SHARDS > 1 else ""))
+else:
+    print(f" Generated {len(df_raw):,} records")
+    print(f"   Readmission rate: {df_raw.readmitted_30d.mean():.1%}")
+    print(f"   Age range: {df_raw.age.min()}–{df_raw.age.max()} (mean: {df_raw.age.mean():.1f})")
+    print(f"   Diabetes prevalence: {df_raw.has_diabetes.mean():.1%}")
+    print(f"   CHF prevalence: {df_raw.has_chf.mean():.1%}")
+    if EHR_MODE == 'cohort':
+        visits = df_raw.groupby('patient_id').size()
+        print(f"   Patients: {len(visits):,} | admissions per patient "
+              f"p50={visits.median():.0f} p99={visits.quantile(0.99):.0f} max={visits.max()}")
+        print(f"   Patients with a repeat admission: {(visits > 1).mean():.1%}")
+    print(df_raw.head(3).to_string(index=False))
+
+import time
 
-print(f" Generated {len(df_raw):,} records")
-print(f"   Readmission rate: {df_raw.readmitted_30d.mean():.1%}")
-print(f"   Age range: {df_raw.age.min()}–{df_raw.age.max()} (mean: {df_raw.age.mean():.1f})")
-print(f"   Diabetes prevalence: {df_raw.has_diabetes.mean():.1%}")
-print(f"   CHF prevalence: {df_raw.has_chf.mean():.1%}")
-df_raw.head(3)
+print(" EHR GENERATOR BENCHMARK (rows/sec)")
+print(f"{'Mode':<12} {'Rows':>12} {'Seconds':>10} {'Rows/sec':>14}")
+print("-" * 51)
+
+bench_results = []
+
+# generate_ehr draws from the global NumPy / random state, seeded here the way
+# the vectorized mode is seeded through its Generator
+np.random.seed(EHR_SEED)
+random.seed(EHR_SEED)
+t0 = time.perf_counter()
+rows_sample = generate_ehr(100_000)
+elapsed = time.perf_counter() - t0
+bench_results.append(('rows', 100_000, elapsed))
+
+for n in [100_000, 1_000_000, 10_000_000]:
+    t0 = time.perf_counter()
+    _ = generate_ehr_vectorized(n, seed=EHR_SEED)
+    elapsed = time.perf_counter() - t0
+    bench_results.append(('vectorized', n, elapsed))
+    if n == len(rows_sample):
+        vectorized_sample = _
+    del _
+
+for mode, n, elapsed in bench_results:
+    print(f"{mode:<12} {n:>12,} {elapsed:>10.2f} {n / elapsed:>14,.0f}")
+
+speedup = (bench_results[1][1] / bench_results[1][2]) / (bench_results[0][1] / bench_results[0][2])
+print(f"\n Vectorized speedup at 100K rows: {speedup:.0f}x")
+
+a = generate_ehr_vectorized(50_000, seed=EHR_SEED)
+b = generate_ehr_vectorized(50_000, seed=EHR_SEED)
+print(f"   Fixed-seed reproducible: {a.equals(b)}")
+assert a.equals(b), 'vectorized generator is not reproducible for a fixed seed'
+
+# Same distributions: the two modes draw different streams, so their 100K-row
+# samples agree on every marginal up to sampling noise, not row for row
+def generator_marginals(df):
+    shares = {'readmitted_30d': df['readmitted_30d'].mean()}
+    for col in ['age_bucket', 'admit_season', 'admit_dow']:
+        shares.update({f'{col}={k}': v for k, v in
+                       df[col].astype(str).value_counts(normalize=True).items()})
+    means = {col: df[col].mean() for col in ['los_days', 'charlson_index']}
+    return shares, means
+
+rows_shares, rows_means = generator_marginals(rows_sample)
+vec_shares,  vec_means  = generator_marginals(vectorized_sample)
+share_gap = max(abs(rows_shares[k] - vec_shares.get(k, 0.0)) for k in rows_shares)
+print(f"   Largest share gap vs rows mode (readmission, age bucket, season, weekday): "
+      f"{share_gap:.2%}")
+for col in rows_means:
+    print(f"   Mean {col:<15} rows {rows_means[col]:.3f} | vectorized {vec_means[col]:.3f}")
+assert set(vec_shares) == set(rows_shares), 'vectorized generator draws different categories'
+assert share_gap < 0.01, 'vectorized marginals drift from generate_ehr'
+assert all(abs(vec_means[c] / rows_means[c] - 1) < 0.02 for c in rows_means), \
+    'vectorized los/charlson means drift from generate_ehr'
+del rows_sample, vectorized_sample
+
+# ─── ICEBERG-STYLE TABLE LAYOUT: hive partitions + partition pruning ─────────
+BRONZE_PARTITIONS = ['admit_year', 'admit_month']
+
+# Storage schema for BRONZE_SCHEMA = 'compact': native dates, dictionary-encoded
+# categoricals and the narrowest integer type that holds each column's domain
+CATEGORY = pa.dictionary(pa.int8(), pa.string())
+BRONZE_COMPACT_SCHEMA = pa.schema([
+    ('patient_id',       pa.string()),
+    ('admission_date',   pa.date32()),
+    ('admit_year',       pa.int16()),
+    ('admit_month',      pa.int8()),
+    ('admit_dow',        pa.int8()),
+    ('admit_season',     CATEGORY),
+    ('age',              pa.int8()),
+    ('age_bucket',       CATEGORY),
+    ('gender',           CATEGORY),
+    ('los_days',         pa.int16()),
+    ('num_procedures',   pa.int8()),
+    ('num_diagnoses',    pa.int8()),
+    ('has_diabetes',     pa.int8()),
+    ('has_chf',          pa.int8()),
+    ('has_copd',         pa.int8()),
+    ('has_ckd',          pa.int8()),
+    ('has_cancer',       pa.int8()),
+    ('has_dementia',     pa.int8()),
+    ('charlson_index',   pa.int8()),
+    ('prior_visits_12m', pa.int16()),
+    ('readmitted_30d',   pa.int8()),
+])
+
+def cast_batches(batches, schema):
+    for batch in batches:
+        yield pa.RecordBatch.from_arrays(
+            [batch.column(f.name).cast(f.type) for f in schema], schema=schema)
+
+def read_table_frame(data_files, columns=None):
+    # Dictionary columns come back as pandas categoricals, narrow ints stay narrow
+    # and date32 becomes datetime64 rather than Python date objects
+    paths = [f['path'] if isinstance(f, dict) else f for f in data_files]
+    return pq.read_table(paths, columns=columns, partitioning=None).to_pandas(
+        date_as_object=False)
+
+# Point-lookup layout for patient-facing tables: sorted by patient_id, so each
+# id falls in one row group, found from the footer's min/max statistics. Row
+# groups stay analytic-sized (DuckDB's own default), since gold is scanned far
+# more often than it is probed; smaller groups would bloat the file and a footer
+# that every reader parses. A patient_id bloom filter lets DuckDB skip row
+# groups on ad-hoc SQL, and the page index is written for engines that seek
+# pages with it (Spark, Trino)
+LOOKUP_ROW_GROUP_ROWS = 122_880
+
+def lookup_writer_options(schema, key='patient_id'):
+    return {'write_page_index':     True,
+            'sorting_columns':      [pq.SortingColumn(schema.get_field_index(key))],
+            'bloom_filter_options': {key: {'ndv': LOOKUP_ROW_GROUP_ROWS, 'fpp': 0.01}}}
+
+def write_lookup_parquet(df, path, key='patient_id'):
+    table = pa.Table.from_pandas(df, preserve_index=False).sort_by(key)
+    pq.write_table(table, path, row_group_size=LOOKUP_ROW_GROUP_ROWS,
+                   **lookup_writer_options(table.schema, key))
+    return path
+
+lookup_files = {}   # path -> ((mtime_ns, size), ParquetFile, mins, maxs, CountingFile)
+
+class CountingFile(io.FileIO):
+    # Local file that tallies every byte the Parquet reader pulls from it, so a
+    # lookup's cost is measured at the reader rather than taken from the footer
+    def __init__(self, path):
+        super().__init__(path, 'rb')
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+def lookup_index(path):
+    # Footer parsed once per version of a file: row-group patient_id [min, max] as
+    # NumPy arrays. Files in the lookup layout are sorted, so the ranges do not
+    # overlap and a lookup lands on a single row group, which PyArrow reads whole
+    # for the requested columns. A file rewritten in place at the same path gets
+    # a new (mtime, size) and is opened afresh rather than served stale offsets
+    info  = os.stat(path)
+    stamp = (info.st_mtime_ns, info.st_size)
+    if path in lookup_files and lookup_files[path][0] != stamp:
+        close_lookup(path)
+    if path not in lookup_files:
+        src = CountingFile(path)
+        pf  = pq.ParquetFile(src)
+        md  = pf.metadata
+        col = pf.schema_arrow.get_field_index('patient_id')
+        st  = [md.row_group(i).column(col).statistics for i in range(md.num_row_groups)]
+        lookup_files[path] = (stamp, pf, np.array([s.min for s in st]),
+                              np.array([s.max for s in st]), src)
+    return lookup_files[path]
+
+def lookup_row_groups(path, patient_ids):
+    _, _, mins, maxs, _ = lookup_index(path)
+    return sorted({int(i) for pid in patient_ids
+                   for i in np.flatnonzero((mins <= pid) & (maxs >= pid))})
+
+def lookup_patients(path, patient_ids, columns=None):
+    # Single id or batched multi-get; only the row groups that can hold the ids
+    # are read and decoded
+    ids = [patient_ids] if isinstance(patient_ids, str) else list(patient_ids)
+    _, pf, _, _, _ = lookup_index(path)
+    table = pf.read_row_groups(lookup_row_groups(path, ids), columns=columns)
+    return table.filter(pc.is_in(table.column('patient_id'), pa.array(ids))).to_pandas()
+
+def lookup_bytes_read(paths):
+    # Bytes the lookup reader has pulled from these files so far, footers included
+    return sum(lookup_index(p)[4].bytes_read for p in paths)
+
+def close_lookup(path):
+    entry = lookup_files.pop(path, None)
+    if entry:
+        entry[4].close()
+
+def partition_dir(table_dir, partition):
+    return '/'.join([table_dir] + [f'{col}={val}' for col, val in partition.items()])
+
+def write_partitioned(table_dir, batches, partition_cols, file_name='part-00000.parquet',
+                      writer_options=None):
+    # One open ParquetWriter per partition directory; each incoming batch is sorted
+    # by partition once and its contiguous slices appended to the matching files.
+    # Partition columns stay inside the files so each file is self-describing.
+    # With no partition columns every batch goes to a single file in table_dir.
+    writers, counts, partitions = {}, {}, {}
+    for batch in batches:
+        if not partition_cols:
+            present, sizes, ranked, levels, shape = [0], [batch.num_rows], batch, [], []
+        else:
+            present, sizes, ranked, levels, shape = partition_slices(batch, partition_cols)
+        start = 0
+        for code, size in zip(present, sizes):
+            key = tuple(int(lv[i]) for lv, i in zip(levels, np.unravel_index(code, shape)))
+            if key not in writers:
+                partitions[key] = dict(zip(partition_cols, key))
+                path = partition_dir(table_dir, partitions[key])
+                os.makedirs(path, exist_ok=True)
+                writers[key] = pq.ParquetWriter(f'{path}/{file_name}', batch.schema,
+                                                **(writer_options or {}))
+                counts[key]  = 0
+            writers[key].write_batch(ranked.slice(start, size))
+            counts[key] += int(size)
+            start += size
+    for w in writers.values():
+        w.close()
+    return [{'path':         f'{partition_dir(table_dir, partitions[k])}/{file_name}',
+             'partition':    partitions[k],
+             'record_count': counts[k]}
+            for k in sorted(writers)]
+
+def partition_slices(batch, partition_cols):
+    levels, codes = [], []
+    for c in partition_cols:
+        lv, cd = np.unique(batch.column(c).to_numpy(), return_inverse=True)
+        levels.append(lv)
+        codes.append(cd)
+    shape    = [len(lv) for lv in levels]
+    combined = np.ravel_multi_index(codes, shape)
+    present, inverse, sizes = np.unique(combined, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind='stable')
+    return present, sizes, batch.take(pa.array(order)), levels, shape
+
+def prune_partitions(data_files, date_from=None, date_to=None):
+    # Month-level pruning on (admit_year, admit_month); the exact day bounds are
+    # still applied by the query that scans the surviving files
+    lo = pd.Timestamp(date_from) if date_from else None
+    hi = pd.Timestamp(date_to)   if date_to   else None
+    kept = []
+    for f in data_files:
+        ym = f['partition']['admit_year'] * 12 + f['partition']['admit_month']
+        if lo is not None and ym < lo.year * 12 + lo.month:
+            continue
+        if hi is not None and ym > hi.year * 12 + hi.month:
+            continue
+        kept.append(f)
+    return kept
+
+def parquet_source(data_files, schema_files=()):
+    # Partition values are read from the files, not re-derived from the paths.
+    # A scan pruned down to no files still needs the table's columns: pass the
+    # unpruned list as schema_files and the source is empty with its schema
+    paths = [f['path'] if isinstance(f, dict) else f for f in data_files]
+    if not paths:
+        if not schema_files:
+            raise ValueError('No data files, and no schema_files to take columns from')
+        return f"(SELECT * FROM {parquet_source(schema_files[:1])} LIMIT 0)"
+    return f"read_parquet({paths}, hive_partitioning = false)"
+
+# ─── SNAPSHOTS + MANIFESTS: per-file column stats for data skipping ──────────
+def stat_value(v):
+    # Dates/timestamps as ISO strings; DECIMAL stats (e.g. DuckDB HUGEINT sums) as numbers
+    if isinstance(v, Decimal):
+        return int(v) if v == v.to_integral_value() else float(v)
+    return v.isoformat() if hasattr(v, 'isoformat') else v
+
+def file_stats(path):
+    # Column min/max/null counts come straight from the Parquet footer, so
+    # collecting them never rescans the data pages
+    md = pq.ParquetFile(path).metadata
+    columns = {}
+    for j in range(md.num_columns):
+        mins, maxs, nulls = [], [], 0
+        for i in range(md.num_row_groups):
+            st = md.row_group(i).column(j).statistics
+            if st is None or not st.has_min_max:
+                mins = maxs = nulls = None
+                break
+            mins.append(st.min)
+            maxs.append(st.max)
+            nulls += st.null_count
+        columns[md.schema.column(j).name] = {
+            'min':        stat_value(min(mins)) if mins else None,
+            'max':        stat_value(max(maxs)) if maxs else None,
+            'null_count': nulls
+        }
+    return {'record_count':    md.num_rows,
+            'file_size_bytes': os.path.getsize(path),
+            'column_stats':    columns}
+
+def read_metadata(metadata_path):
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path) as f:
+        return json.load(f)
+
+@contextmanager
+def metadata_lock(metadata_path):
+    # Serialises committers only; readers never take the lock. An empty first
+    # commit has written no data files, so the table directory may not exist yet
+    os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+    with open(metadata_path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def write_json_atomic(path, payload):
+    # Readers see either the old or the new file, never a partial write
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, path)
+
+def commit_snapshot(metadata_path, table_name, data_files, partitions=(),
+                    operation='overwrite', removed_files=(), sort_order=None,
+                    properties=None, summary=None):
+    # Writes a manifest for the new snapshot under metadata/ and swaps the table
+    # metadata to point at it. 'append' carries the current snapshot's files
+    # (and their already-collected stats) forward; 'replace' does the same minus
+    # removed_files, failing if another commit already removed any of them;
+    # 'overwrite' replaces everything. Table properties are carried forward and
+    # updated with any passed in; summary holds per-commit metrics. New files get
+    # the snapshot id as their sequence number unless they carry one (compaction
+    # keeps the newest of its inputs), so rows can be ordered by when they arrived.
+    stats = [{**f, **file_stats(f['path'])} for f in data_files]
+
+    with metadata_lock(metadata_path):
+        previous  = read_metadata(metadata_path)
+        snapshots = previous['snapshots'] if previous else []
+        snap_id   = snapshots[-1]['snapshot_id'] + 1 if snapshots else 1
+        now       = datetime.now().isoformat()
+
+        new_entries = [{**f, 'sequence_number': f.get('sequence_number', snap_id)}
+                       for f in stats]
+        entries = new_entries
+        if operation in ('append', 'replace') and previous:
+            current = load_data_files(metadata_path)
+            removed = set(removed_files)
+            missing = removed - {e['path'] for e in current}
+            if missing:
+                raise RuntimeError(f'Commit conflict: {len(missing)} files already '
+                                   f'removed from {table_name}')
+            entries = [e for e in current if e['path'] not in removed] + new_entries
+
+        manifest_dir  = os.path.join(os.path.dirname(metadata_path), 'metadata')
+        manifest_path = f'{manifest_dir}/snap-{snap_id:06d}.json'
+        os.makedirs(manifest_dir, exist_ok=True)
+        write_json_atomic(manifest_path, {'snapshot_id': snap_id, 'data_files': entries})
+
+        metadata = {
+            'table_name':          table_name,
+            'format':              'PARQUET',
+            'partitions':          list(partitions),
+            'row_count':           sum(e['record_count'] for e in entries),
+            'schema_version':      1,
+            'created_at':          previous['created_at'] if previous else now,
+            'last_updated_at':     now,
+            'columns':             (pq.read_schema(entries[0]['path']).names if entries
+                                    else previous['columns'] if previous else []),
+            'sort_order':          (list(sort_order) if sort_order is not None
+                                    else previous.get('sort_order', []) if previous else []),
+            'properties':          {**(previous.get('properties', {}) if previous else {}),
+                                    **(properties or {})},
+            'current_snapshot_id': snap_id,
+            'snapshots':           snapshots + [{
+                'snapshot_id':   snap_id,
+                'operation':     operation,
+                'timestamp':     now,
+                'manifest':      manifest_path,
+                'file_count':    len(entries),
+                'added_files':   len(new_entries),
+                'removed_files': len(removed_files),
+                'row_count':     sum(e['record_count'] for e in entries),
+                'summary':       dict(summary or {})
+            }]
+        }
+        write_json_atomic(metadata_path, metadata)
+    return metadata
+
+def append_to_table(metadata_path, table_dir, table_name, batches, partitions):
+    # New rows only ever land in new files; existing data files are not touched
+    files = write_partitioned(table_dir, batches, partitions,
+                              file_name=f'part-00000-{uuid.uuid4().hex[:8]}.parquet')
+    return commit_snapshot(metadata_path, table_name, files, partitions, operation='append')
+
+def load_data_files(metadata_path, snapshot_id=None):
+    metadata = read_metadata(metadata_path)
+    snap_id  = snapshot_id or metadata['current_snapshot_id']
+    snapshot = next(s for s in metadata['snapshots'] if s['snapshot_id'] == snap_id)
+    with open(snapshot['manifest']) as f:
+        return json.load(f)['data_files']
+
+def incremental_files(metadata_path, since_snapshot_id):
+    # Live files added by 'append' snapshots after since_snapshot_id. None means
+    # an incremental read is not possible: the snapshot is unknown, the table was
+    # overwritten since, or an appended file was already compacted into older data
+    metadata = read_metadata(metadata_path)
+    if not any(s['snapshot_id'] == since_snapshot_id for s in metadata['snapshots']):
+        return None
+    later = [s for s in metadata['snapshots'] if s['snapshot_id'] > since_snapshot_id]
+    if any(s['operation'] == 'overwrite' for s in later):
+        return None
+    seen  = {f['path'] for f in load_data_files(metadata_path, since_snapshot_id)}
+    added = set()
+    for s in later:
+        files = {f['path'] for f in load_data_files(metadata_path, s['snapshot_id'])}
+        if s['operation'] == 'append':
+            added |= files - seen
+        seen = files
+    current = load_data_files(metadata_path)
+    if added - {f['path'] for f in current}:
+        return None
+    return [f for f in current if f['path'] in added]
+
+def files_since(metadata_path, since_snapshot_id):
+    # Live files that since_snapshot_id did not have, whichever commit wrote them
+    # (appends, merge rewrites, compactions). Rewritten files also carry older
+    # rows, so callers still filter rows by their own watermark. None means the
+    # snapshot is unknown or the table was overwritten since.
+    metadata = read_metadata(metadata_path)
+    if not any(s['snapshot_id'] == since_snapshot_id for s in metadata['snapshots']):
+        return None
+    if any(s['operation'] == 'overwrite' for s in metadata['snapshots']
+           if s['snapshot_id'] > since_snapshot_id):
+        return None
+    seen = {f['path'] for f in load_data_files(metadata_path, since_snapshot_id)}
+    return [f for f in load_data_files(metadata_path) if f['path'] not in seen]
+
+def versioned_source(data_files, schema_files=()):
+    # Like parquet_source, plus each row's version: the file's sequence_number,
+    # its position in data_files and the row's position in the file. The file
+    # name is only used to attach these, so wide path strings never reach
+    # downstream sorts or windows. schema_files as in parquet_source.
+    if not data_files:
+        if not schema_files:
+            raise ValueError('No data files, and no schema_files to take columns from')
+        return f"(SELECT * FROM {versioned_source(schema_files[:1])} LIMIT 0)"
+    versions = ', '.join(f"('{f['path']}', {f.get('sequence_number', 0)}, {i})"
+                         for i, f in enumerate(data_files))
+    return f"""(SELECT * EXCLUDE (filename)
+               FROM read_parquet({[f['path'] for f in data_files]},
+                                 hive_partitioning = false,
+                                 filename = true, file_row_number = true)
+               JOIN (VALUES {versions}) v(filename, sequence_number, file_ordinal)
+               USING (filename))"""
+
+def prune_files(data_files, ranges):
+    # ranges = {column: (lo, hi)} with None for an open bound. A file is skipped
+    # only when its stats prove no row can match; missing stats keep the file.
+    kept = []
+    for f in data_files:
+        stats = f.get('column_stats', {})
+        skip  = False
+        for col, (lo, hi) in ranges.items():
+            st = stats.get(col)
+            if st is None or st['min'] is None:
+                continue
+            if (lo is not None and st['max'] < lo) or (hi is not None and st['min'] > hi):
+                skip = True
+                break
+        if not skip:
+            kept.append(f)
+    return kept
+
+def range_filter_sql(ranges):
+    clauses = []
+    for col, (lo, hi) in ranges.items():
+        if lo is not None:
+            clauses.append(f"{col} >= '{lo}'")
+        if hi is not None:
+            clauses.append(f"{col} <= '{hi}'")
+    return ''.join(f' AND {c}' for c in clauses)
+
+# ─── LAKEHOUSE CATALOG: one persistent DuckDB database, views over every layer ─
+CATALOG_PATH      = '/content/lakehouse/catalog.duckdb'
+CATALOG_POOL_SIZE = 4
+
+# Resource settings shared by every DuckDB connection in the pipeline. Operators
+# that outgrow DUCKDB_MEMORY_LIMIT (sorts, hash joins, window partitions) spill
+# to disk instead of failing, so silver and gold can exceed RAM
+DUCKDB_MEMORY_LIMIT = '2GB'
+DUCKDB_TEMP_DIR     = '/content/lakehouse/duckdb_tmp'
+DUCKDB_THREADS      = os.cpu_count() or 1
+
+def connect_duckdb(path=':memory:', memory_limit=None, threads=None):
+    # Each connection spills into its own subdirectory, which DuckDB creates on
+    # first spill and removes again on close. A database file gets a directory
+    # named after it, so reconnecting to it passes the same config as the
+    # connection already open on it, which DuckDB requires
+    os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+    spill = (uuid.uuid4().hex[:8] if path == ':memory:'
+             else os.path.splitext(os.path.basename(path))[0])
+    return duckdb.connect(path, config={
+        'memory_limit':             memory_limit or DUCKDB_MEMORY_LIMIT,
+        'threads':                  threads or DUCKDB_THREADS,
+        'temp_directory':           f'{DUCKDB_TEMP_DIR}/{spill}',
+        'preserve_insertion_order': False,
+    })
+
+os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+catalog_con = connect_duckdb(CATALOG_PATH)
+for layer in ['bronze', 'silver', 'gold']:
+    catalog_con.execute(f"CREATE SCHEMA IF NOT EXISTS {layer}")
+
+# Cursors are separate connections onto the same database instance, so every
+# stage shares one buffer manager and sees the same views
+catalog_pool = queue.Queue()
+for _ in range(CATALOG_POOL_SIZE):
+    catalog_pool.put(catalog_con.cursor())
+
+@contextmanager
+def catalog_cursor():
+    cur = catalog_pool.get()
+    try:
+        yield cur
+    finally:
+        catalog_pool.put(cur)
+
+def register_view(view_name, data_files):
+    # Views only hold the file list; nothing is copied into the database
+    with catalog_cursor() as cur:
+        cur.execute(f"CREATE OR REPLACE VIEW {view_name} AS "
+                    f"SELECT * FROM {parquet_source(data_files)}")
+
+def register_table(metadata_path):
+    # Re-point the table's view at its current snapshot after every commit; a
+    # table with no data files has no schema to expose, so it has no view
+    metadata   = read_metadata(metadata_path)
+    data_files = load_data_files(metadata_path)
+    if not data_files:
+        with catalog_cursor() as cur:
+            cur.execute(f"DROP VIEW IF EXISTS {metadata['table_name']}")
+        return
+    register_view(metadata['table_name'], data_files)
+
+def query_arrow(sql, params=None):
+    # Results leave DuckDB as Arrow buffers, which pandas/Parquet consume directly
+    with catalog_cursor() as cur:
+        return cur.execute(sql, params or []).fetch_arrow_table()
+
+def materialize(con, sql, table_dir, partitions=(), file_name=None,
+                batch_rows=1_000_000, lookup_key=None):
+    # Streams the query result into Parquet batch by batch: the rows never pass
+    # through pandas and at most one record batch is held in Python at a time.
+    # lookup_key writes the point-lookup layout (one row group per batch); the
+    # query's ORDER BY must already sort by that key. sql may also be an Arrow
+    # RecordBatchReader already in that order and batch size, written as it streams.
+    if lookup_key:
+        batch_rows = LOOKUP_ROW_GROUP_ROWS
+    reader  = (sql if isinstance(sql, pa.RecordBatchReader)
+               else con.execute(sql).fetch_record_batch(batch_rows))
+    options = lookup_writer_options(reader.schema, lookup_key) if lookup_key else None
+    return write_partitioned(table_dir, reader, list(partitions),
+                             file_name=file_name or f'part-00000-{uuid.uuid4().hex[:8]}.parquet',
+                             writer_options=options)
+
+def materialize_routed(con, sql, table_dir, reject_dir, partitions=(),
+                       reason_col='reject_reason', source_col='source_row',
+                       file_name=None, batch_rows=1_000_000):
+    # One scan, two outputs. Rows with a NULL reason_col stream into table_dir
+    # without the two routing columns; the rest go to a single file in reject_dir
+    # as reason_col plus the fields of the source_col struct, so rejects keep the
+    # values that failed. Returns (files, reject_files, {reason: rows}).
+    file_name = file_name or f'part-00000-{uuid.uuid4().hex[:8]}.parquet'
+    reader    = con.execute(sql).fetch_record_batch(batch_rows)
+    counts, rejected = {}, None
+
+    def accepted():
+        nonlocal rejected
+        for batch in reader:
+            ok  = pc.is_null(batch.column(reason_col))
+            bad = batch.filter(pc.invert(ok))
+            if bad.num_rows:
+                for vc in pc.value_counts(bad.column(reason_col)).to_pylist():
+                    counts[vc['values']] = counts.get(vc['values'], 0) + vc['counts']
+                source = bad.schema.field(source_col).type
+                rows   = pa.RecordBatch.from_arrays(
+                    [bad.column(reason_col)] + bad.column(source_col).flatten(),
+                    names=[reason_col] + [f.name for f in source])
+                if rejected is None:
+                    os.makedirs(reject_dir, exist_ok=True)
+                    rejected = pq.ParquetWriter(f'{reject_dir}/{file_name}', rows.schema)
+                rejected.write_batch(rows)
+            yield batch.filter(ok).drop_columns([reason_col, source_col])
+
+    files = write_partitioned(table_dir, accepted(), list(partitions), file_name=file_name)
+    reject_files = []
+    if rejected is not None:
+        rejected.close()
+        reject_files = [{'path': f'{reject_dir}/{file_name}', 'partition': {},
+                         'record_count': sum(counts.values())}]
+    return files, reject_files, counts
+
+def merge_into_table(con, delta_sql, metadata_path, table_dir, key, partitions,
+                     properties=None, summary=None):
+    # Copy-on-write MERGE keyed on `key`, which must determine the partition.
+    # Only partitions holding a matching key are rewritten, with the old rows
+    # replaced; delta rows for any other partition land in fresh files.
+    con.execute(f"CREATE OR REPLACE TEMP TABLE merge_delta AS {delta_sql}")
+    metadata = read_metadata(metadata_path)
+    cols     = ', '.join(partitions)
+    touched  = {tuple(r) for r in con.execute(
+        f"SELECT DISTINCT {cols} FROM merge_delta").fetchall()}
+    targets  = [f for f in load_data_files(metadata_path)
+                if tuple(f['partition'][c] for c in partitions) in touched]
+    matches  = {}
+    if targets:
+        matches = {tuple(r[:-1]): r[-1] for r in con.execute(
+            f"""SELECT {cols}, COUNT(*) FROM merge_delta
+                SEMI JOIN {parquet_source(targets)} t USING ({key})
+                GROUP BY {cols}""").fetchall()}
+    rewrite    = [f for f in targets if tuple(f['partition'][c] for c in partitions) in matches]
+    matched    = sum(matches.values())
+    delta_rows = con.execute("SELECT COUNT(*) FROM merge_delta").fetchone()[0]
+    if rewrite:
+        sql = f"""SELECT t.* FROM {parquet_source(rewrite)} t
+                  ANTI JOIN merge_delta d USING ({key})
+                  UNION ALL BY NAME
+                  SELECT * FROM merge_delta"""
+    else:
+        sql = "SELECT * FROM merge_delta"
+    files    = materialize(con, sql, table_dir, partitions)
+    metadata = commit_snapshot(metadata_path, metadata['table_name'], files, partitions,
+                               operation='replace' if rewrite else 'append',
+                               removed_files=[f['path'] for f in rewrite],
+                               properties=properties, summary=summary)
+    con.execute("DROP TABLE merge_delta")
+    return metadata, {'inserted': delta_rows - matched, 'updated': matched,
+                      'files_rewritten': len(rewrite)}
+
+def bench_silver(con, n, out_dir, batches=None):
+    # Setup shared by the benchmarks and checks: n cohort admissions (or the given
+    # bronze batches) written as bronze under out_dir and run through silver_sql
+    # on con, leaving the `silver` view over the result. Returns the silver files.
+    if batches is None:
+        batches = bronze_batches(iter_cohort_batches(n, seed=EHR_SEED, **COHORT_PARAMS))
+    bronze = write_partitioned(f'{out_dir}/bronze', batches, BRONZE_PARTITIONS)
+    con.execute(f"CREATE OR REPLACE TEMP VIEW bronze_scan AS "
+                f"SELECT * FROM {versioned_source(bronze)}")
+    silver, _, _ = materialize_routed(con, silver_sql, f'{out_dir}/silver',
+                                      f'{out_dir}/quarantine', BRONZE_PARTITIONS)
+    con.execute(f"CREATE OR REPLACE TEMP VIEW silver AS "
+                f"SELECT * FROM {parquet_source(silver)}")
+    return silver
+
+@contextmanager
+def watch_peak(sample, interval=0.05):
+    # Benchmark helper: polls sample() from a second thread while the block runs
+    # and keeps, in the yielded list, the peak of each value it returns. sample
+    # must not share a DuckDB cursor with the code being measured
+    stop, peak = threading.Event(), list(sample())
+
+    def watch():
+        while not stop.is_set():
+            peak[:] = map(max, peak, sample())
+            stop.wait(interval)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        yield peak
+    finally:
+        stop.set()
+        watcher.join()
+
+print(" LAKEHOUSE CATALOG")
+print(f"   Database: {CATALOG_PATH}")
+print(f"   Schemas: bronze, silver, gold | Cursor pool: {CATALOG_POOL_SIZE}")
+print(f"   Memory limit: {DUCKDB_MEMORY_LIMIT} | Threads: {DUCKDB_THREADS} | "
+      f"Spill: {DUCKDB_TEMP_DIR}")
 
 os.makedirs('/content/lakehouse/bronze', exist_ok=True)
 os.makedirs('/content/lakehouse/silver', exist_ok=True)
 os.makedirs('/content/lakehouse/gold',   exist_ok=True)
+os.makedirs('/content/lakehouse/quarantine', exist_ok=True)
 os.makedirs('/content/lakehouse/ml',     exist_ok=True)
 
-df_raw.to_parquet('/content/lakehouse/bronze/raw_admissions.parquet',
-                  index=False, engine='pyarrow')
-
-iceberg_metadata = {
-    'table_name':   'bronze.raw_admissions',
-    'format':       'PARQUET',
-    'partitions':   ['admit_year', 'admit_month'],
-    'row_count':    len(df_raw),
-    'schema_version': 1,
-    'created_at':   datetime.now().isoformat(),
-    'columns':      list(df_raw.columns)
+BRONZE_DIR        = '/content/lakehouse/bronze/raw_admissions'
+BRONZE_METADATA   = '/content/lakehouse/bronze/iceberg_metadata.json'
+SILVER_DIR        = '/content/lakehouse/silver/admissions_clean'
+SILVER_METADATA   = '/content/lakehouse/silver/iceberg_metadata.json'
+QUARANTINE_DIR    = '/content/lakehouse/quarantine/admissions_rejected'
+QUARANTINE_METADATA = '/content/lakehouse/quarantine/iceberg_metadata.json'
+BRONZE_STREAMING  = EHR_STREAMING  # True: stream BRONZE_ROWS straight from the generator
+BRONZE_ROWS       = N
+BRONZE_BATCH_ROWS = 1_000_000
+BRONZE_SHARDS     = EHR_SHARDS # > 1: one data file per shard, generated in a process pool
+BRONZE_SCHEMA     = 'compact'  # 'compact': date32/dictionary/int8 storage, 'raw': as generated
+SILVER_DATE_FROM  = None       # e.g. '2024-10-01': silver only scans matching partitions
+SILVER_DATE_TO    = None
+SILVER_PATIENT_RANGE = (None, None)   # e.g. ('PAT-0000000', 'PAT-0049999')
+SILVER_MODE       = 'incremental'  # 'full': rebuild silver from all of bronze on every run
+ADMISSION_KEY     = 'md5'          # see ADMISSION_KEY_SQL; 'hash64' is opt-in only
+
+# admission_key strategies, all deterministic in (patient_id, admission_date):
+#   md5       32-char hex text, the original key
+#   hash64    DuckDB's built-in hash as UBIGINT: cheapest, but only stable within
+#             one DuckDB version. That version is recorded alongside the key, so
+#             an upgrade forces a full silver rebuild rather than a silently
+#             mismatched MERGE; not a default for that reason
+#   composite (patient number << 16) + days since 1970 as BIGINT: exact and
+#             collision-free, but needs the numeric PAT-nnnnnnn id format
+ADMISSION_KEY_SQL = {
+    'md5':       "MD5(patient_id || CAST(admission_date AS VARCHAR))",
+    'hash64':    "hash(patient_id, CAST(admission_date AS DATE))",
+    'composite': "CAST(SUBSTR(patient_id, 5) AS BIGINT) * 65536 "
+                 "+ (CAST(admission_date AS DATE) - DATE '1970-01-01')",
 }
-with open('/content/lakehouse/bronze/iceberg_metadata.json', 'w') as f:
-    json.dump(iceberg_metadata, f, indent=2)
 
-print("🔶 BRONZE LAYER")
+# Rows failing a rule are routed to the quarantine table with the first matching
+# reason code instead of being dropped; rules see the raw bronze values
+SILVER_REJECT_RULES = [
+    ('NULL_PATIENT_ID',     "patient_id IS NULL"),
+    ('NULL_ADMISSION_DATE', "admission_date IS NULL"),
+    ('NULL_LOS_DAYS',       "los_days IS NULL"),
+    ('LOS_OUT_OF_RANGE',    "los_days NOT BETWEEN 0 AND 365"),
+]
+# Valid rows sharing an admission_key with a newer valid row (resubmitted feeds,
+# late corrections) are quarantined under this reason; the newest version wins,
+# ordered by bronze file sequence number, then file and row position
+DUPLICATE_REASON = 'DUPLICATE_ADMISSION'
+
+def admission_key_version(strategy=None):
+    strategy = strategy or ADMISSION_KEY
+    return f'{strategy}/duckdb-{duckdb.__version__}' if strategy == 'hash64' else strategy
+
+def bronze_batches(batches):
+    return cast_batches(batches, BRONZE_COMPACT_SCHEMA) if BRONZE_SCHEMA == 'compact' else batches
+
+def write_bronze_shard(task):
+    shard, start, stop, seed_seq, out_dir, batch_rows, write_id = task
+    return write_partitioned(
+        out_dir,
+        bronze_batches(iter_bronze_source(stop - start, batch_rows, seed=seed_seq,
+                                          id_offset=start)),
+        BRONZE_PARTITIONS, file_name=f'part-{shard:05d}-{write_id}.parquet')
+
+def generate_bronze_sharded(n, n_shards, out_dir, seed=42, batch_rows=1_000_000,
+                            processes=None, write_id=None):
+    # Shard i always covers rows [n*i/S, n*(i+1)/S) and draws from the i-th child
+    # of SeedSequence(seed), so the files depend only on (seed, n_shards) and not
+    # on how many worker processes happen to run them. Shards draw in EHR_MODE's
+    # shape; a cohort shard's patients get ids from its own row range
+    bounds = [n * i // n_shards for i in range(n_shards + 1)]
+    seeds  = np.random.SeedSequence(seed).spawn(n_shards)
+    write_id = write_id or uuid.uuid4().hex[:8]
+    tasks  = [(i, bounds[i], bounds[i + 1], seeds[i], out_dir, batch_rows, write_id)
+              for i in range(n_shards)]
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        shards = pool.map(write_bronze_shard, tasks, chunksize=1)
+    return sorted((f for files in shards for f in files), key=lambda f: f['path'])
+
+# Every run writes uniquely named files, so files referenced by earlier snapshots
+# are never overwritten in place
+bronze_write_id = uuid.uuid4().hex[:8]
+
+if BRONZE_SHARDS > 1:
+    bronze_files = generate_bronze_sharded(BRONZE_ROWS, BRONZE_SHARDS, BRONZE_DIR,
+                                           seed=EHR_SEED, batch_rows=BRONZE_BATCH_ROWS,
+                                           write_id=bronze_write_id)
+elif BRONZE_STREAMING:
+    bronze_files = write_partitioned(
+        BRONZE_DIR,
+        bronze_batches(iter_bronze_source(BRONZE_ROWS, BRONZE_BATCH_ROWS, seed=EHR_SEED)),
+        BRONZE_PARTITIONS, file_name=f'part-00000-{bronze_write_id}.parquet')
+else:
+    bronze_files = write_partitioned(
+        BRONZE_DIR,
+        bronze_batches(pa.Table.from_pandas(df_raw, preserve_index=False).to_batches()),
+        BRONZE_PARTITIONS, file_name=f'part-00000-{bronze_write_id}.parquet')
+
+iceberg_metadata = commit_snapshot(BRONZE_METADATA, 'bronze.raw_admissions',
+                                   bronze_files, BRONZE_PARTITIONS)
+register_table(BRONZE_METADATA)
+bronze_rows    = iceberg_metadata['row_count']
+bronze_columns = iceberg_metadata['columns']
+
+print(" BRONZE LAYER")
 print(f"   Table: bronze.raw_admissions")
 print(f"   Format: Parquet (Iceberg-backed)")
 print(f"   Partitioned by: admit_year, admit_month")
-print(f"   Rows: {len(df_raw):,} | Columns: {len(df_raw.columns)}")
-print(f"   Size: {os.path.getsize('/content/lakehouse/bronze/raw_admissions.parquet') / 1024:.0f} KB")
-
-con = duckdb.connect()
-
-con.execute("""CREATE TABLE bronze_admissions AS
-              SELECT * FROM read_parquet('/content/lakehouse/bronze/raw_admissions.parquet')""")
-
-silver_sql = """
+print(f"   Storage schema: {BRONZE_SCHEMA}")
+print(f"   Snapshot: {iceberg_metadata['current_snapshot_id']} | "
+      f"Rows: {bronze_rows:,} | Columns: {len(bronze_columns)}")
+print(f"   Partitions: {len({tuple(f['partition'].values()) for f in bronze_files})} | "
+      f"Files: {len(bronze_files)} | "
+      f"Size: {sum(os.path.getsize(f['path']) for f in bronze_files) / 1024:.0f} KB")
+
+# Month partitions are pruned first, then per-file column stats skip anything
+# whose admission_date / patient_id range cannot match
+silver_ranges = {'admission_date': (SILVER_DATE_FROM, SILVER_DATE_TO),
+                 'patient_id':     SILVER_PATIENT_RANGE}
+
+silver_sql = f"""
     SELECT
         patient_id,
         CAST(admission_date AS DATE)                    AS admission_date,
@@ -208,30 +1212,1243 @@ silver_sql = """
             ELSE 'VERY_HIGH'
         END                                             AS risk_tier,
         ROUND(0.983 * EXP(charlson_index * 0.9), 4)   AS ten_yr_survival_prob,
-        MD5(patient_id || CAST(admission_date AS VARCHAR)) AS admission_key,
-        CURRENT_TIMESTAMP                               AS transformed_at
-    FROM bronze_admissions
-    WHERE patient_id  IS NOT NULL
-      AND admission_date IS NOT NULL
-      AND los_days BETWEEN 0 AND 365
+        admission_key,
+        CURRENT_TIMESTAMP                               AS transformed_at,
+        reject_reason,
+        CASE WHEN reject_reason IS NOT NULL THEN bronze_row END AS source_row
+    FROM (SELECT *,
+                 struct_pack(*COLUMNS(* EXCLUDE (admission_key, rule_reason, sequence_number,
+                                                   file_ordinal, file_row_number))) AS bronze_row,
+                 CASE WHEN rule_reason IS NULL AND ROW_NUMBER() OVER (
+                          PARTITION BY admission_key, rule_reason IS NULL
+                          ORDER BY sequence_number DESC, file_ordinal DESC, file_row_number DESC
+                      ) > 1 THEN '{DUPLICATE_REASON}'
+                      ELSE rule_reason
+                 END AS reject_reason
+          FROM (SELECT *,
+                       {ADMISSION_KEY_SQL[ADMISSION_KEY]} AS admission_key,
+                       CASE {' '.join(f"WHEN {cond} THEN '{reason}'" for reason, cond in SILVER_REJECT_RULES)}
+                       END AS rule_reason
+                FROM bronze_scan
+                WHERE TRUE {range_filter_sql(silver_ranges)}))
 """
 
-df_silver = con.execute(silver_sql).df()
-df_silver.to_parquet('/content/lakehouse/silver/admissions_clean.parquet',
-                     index=False)
+def refresh_silver(bronze_metadata=BRONZE_METADATA, silver_metadata=SILVER_METADATA,
+                   silver_dir=SILVER_DIR, quarantine_metadata=QUARANTINE_METADATA,
+                   quarantine_dir=QUARANTINE_DIR):
+    # Silver records the bronze snapshot it was built from. In incremental mode
+    # only bronze files appended since then are transformed and merged into
+    # silver on admission_key; a first run, a changed scan range or key strategy,
+    # or a bronze overwrite falls back to a full rebuild. Rejected rows land in
+    # the quarantine table from the same scan, replaced on a full rebuild and
+    # appended on an incremental one. The table paths default to the lakehouse's.
+    bronze_meta = read_metadata(bronze_metadata)
+    previous    = read_metadata(silver_metadata)
+    props       = previous.get('properties', {}) if previous else {}
+    scan_ranges = {col: list(r) for col, r in silver_ranges.items()}
+    delta = None
+    if (SILVER_MODE == 'incremental' and props.get('bronze_snapshot_id')
+            and props.get('scan_ranges') == scan_ranges
+            and props.get('admission_key') == admission_key_version()):
+        delta = incremental_files(bronze_metadata, props['bronze_snapshot_id'])
+    source = load_data_files(bronze_metadata) if delta is None else delta
+    scan   = prune_files(prune_partitions(source, SILVER_DATE_FROM, SILVER_DATE_TO),
+                         silver_ranges)
+    watermark = {'bronze_snapshot_id': bronze_meta['current_snapshot_id'],
+                 'scan_ranges':        scan_ranges,
+                 'admission_key':      admission_key_version()}
+    stats = {'mode': 'full' if delta is None else 'incremental',
+             'source_files': len(source), 'scanned_files': len(scan), 'rejected': {}}
+    if delta is not None and not scan:
+        return previous, stats    # nothing new in range; keep the old watermark
+
+    # bronze_scan is a cursor-local view over just the surviving files: the scan
+    # streams straight from Parquet instead of first copying bronze into a table,
+    # and the result streams straight back out into silver's partition files
+    with catalog_cursor() as con:
+        con.execute(f"CREATE OR REPLACE TEMP VIEW bronze_scan AS "
+                    f"SELECT * FROM {versioned_source(scan, source)}")
+        if delta is None:
+            files, reject_files, rejected = materialize_routed(
+                con, silver_sql, silver_dir, quarantine_dir, BRONZE_PARTITIONS)
+            metadata = commit_snapshot(silver_metadata, 'silver.admissions_clean', files,
+                                       BRONZE_PARTITIONS, properties=watermark,
+                                       summary={'rejected': rejected})
+        else:
+            # The delta is one refresh's worth of rows, small enough to stage once
+            # and read twice: rejects out to quarantine, the rest into the merge
+            con.execute(f"CREATE OR REPLACE TEMP TABLE silver_delta AS {silver_sql}")
+            rejected = dict(con.execute("""SELECT reject_reason, COUNT(*) FROM silver_delta
+                                           WHERE reject_reason IS NOT NULL
+                                           GROUP BY reject_reason""").fetchall())
+            reject_files = materialize(con, """SELECT reject_reason, source_row.*
+                                               FROM silver_delta
+                                               WHERE reject_reason IS NOT NULL""",
+                                       quarantine_dir) if rejected else []
+            metadata, merged = merge_into_table(
+                con, """SELECT * EXCLUDE (reject_reason, source_row) FROM silver_delta
+                       WHERE reject_reason IS NULL""",
+                silver_metadata, silver_dir, 'admission_key', BRONZE_PARTITIONS,
+                properties=watermark, summary={'rejected': rejected})
+            con.execute("DROP TABLE silver_delta")
+            stats.update(merged)
+    commit_snapshot(quarantine_metadata, 'silver.admissions_quarantine', reject_files,
+                    operation='overwrite' if delta is None else 'append',
+                    summary={'rejected': rejected})
+    register_table(silver_metadata)
+    register_table(quarantine_metadata)
+    stats['rejected'] = rejected
+    return metadata, stats
+
+silver_metadata, silver_refresh = refresh_silver()
 
 print(f"\n SILVER LAYER")
 print(f"   Table: silver.admissions_clean")
-print(f"   Rows: {len(df_silver):,} (cleaned & validated)")
-print(f"   Null patient_ids removed: {df_raw.patient_id.isna().sum()}")
+print(f"   Rows: {silver_metadata['row_count']:,} (cleaned & validated)")
+print(f"   Refresh: {silver_refresh['mode']} | Bronze files scanned: "
+      f"{silver_refresh['scanned_files']} of {silver_refresh['source_files']}")
+print(f"   Rows quarantined: {sum(silver_refresh['rejected'].values()):,} "
+      f"→ silver.admissions_quarantine")
+for reason in [r for r, _ in SILVER_REJECT_RULES] + [DUPLICATE_REASON]:
+    print(f"     {reason:<20} {silver_refresh['rejected'].get(reason, 0):>10,}")
 print(f"   Risk tier distribution:")
-print(df_silver['risk_tier'].value_counts().to_string(header=False))
+print(query_arrow("""SELECT risk_tier, COUNT(*) AS n FROM silver.admissions_clean
+                     GROUP BY risk_tier ORDER BY n DESC""").to_pandas()
+      .to_string(header=False, index=False))
+
+# ─── FEATURE REGISTRY: every gold feature declared once ──────────────────────
+# Each entry names a feature, how it is computed, its DuckDB type and, where a
+# window can be empty, its default. The registry compiles to the batch gold
+# SQL, to the incremental SQL that extends per-patient state, to a per-event
+# Python update for the online path, and to Polars expressions for the polars
+# gold engine; FEATURE_REGISTRY_CHECK runs the first three over the same
+# admissions and compares them.
+#
+#   kind        value                                      per-patient state
+#   column      silver column as is                        -
+#   row         expression over the current admission      -
+#   encode      index of source in a fixed, sorted vocab   -
+#   cumulative  count / sum / max over visits to date      running value
+#   last_n      mean of source over the previous n visits  last n source values
+#   calendar    visits in the previous `days` days         admission day numbers
+#   since_last  days since the previous admission          last admission date
+#
+# Encodings use sorted vocabularies, which gives the codes a LabelEncoder fitted
+# on the full data would; values outside the vocabulary encode as NULL. Row
+# features spell their expression once per target (sql, fn, polars); Polars'
+# SQL ROUND rounds half to even, so it cannot reuse the DuckDB text.
+#
+# Each visit horizon is a model input: adding one (e.g. 30 or 180 days) adds a
+# column to FEATURES and so changes X for every model downstream.
+GOLD_VISIT_HORIZONS = [90, 365]
+EPOCH = datetime(1970, 1, 1).date()
+
+def feature(name, kind, dtype, model=True, **spec):
+    return {'name': name, 'kind': kind, 'dtype': dtype, 'model': model, **spec}
+
+def sql_round(x, digits):
+    # DuckDB's ROUND goes half away from zero; Python's round() goes half to even
+    p = 10 ** digits
+    return math.copysign(math.floor(abs(x) * p + 0.5), x) / p
+
+SEASON_CODES = {'WINTER': 1, 'SPRING': 2, 'SUMMER': 3}
+
+FEATURE_REGISTRY = [
+    feature('age',                   'column',     'INTEGER'),
+    feature('gender_enc',            'encode',     'INTEGER', source='gender', vocab=['F', 'M']),
+    feature('age_bucket_enc',        'encode',     'INTEGER', source='age_bucket',
+            vocab=['18-39', '40-59', '60-74', '75+']),
+
+    feature('los_days',              'column',     'INTEGER'),
+    feature('num_procedures',        'column',     'TINYINT'),
+    feature('num_diagnoses',         'column',     'TINYINT'),
+    *[feature(c, 'column', 'INTEGER') for c in
+      ['has_diabetes', 'has_chf', 'has_copd', 'has_ckd', 'has_cancer', 'has_dementia']],
+    feature('charlson_index',        'column',     'TINYINT'),
+    feature('max_charlson_ever',     'cumulative', 'TINYINT', agg='max', source='charlson_index'),
+    feature('ten_yr_survival_prob',  'column',     'DOUBLE'),
+
+    feature('prior_visits_12m',      'column',     'SMALLINT'),
+    *[feature(f'visits_prior_{h}d',  'calendar',   'BIGINT', days=h) for h in GOLD_VISIT_HORIZONS],
+    feature('avg_los_last_3_visits', 'last_n',     'DOUBLE', agg='avg', source='los_days',
+            rows=3, digits=2, default_column='los_days'),
+    feature('cumulative_procedures', 'cumulative', 'BIGINT', agg='sum', source='num_procedures'),
+    feature('days_since_last_admit', 'since_last', 'BIGINT', default=999),
+
+    feature('admit_month',           'column',     'TINYINT'),
+    feature('admit_dow',             'column',     'TINYINT'),
+    feature('season_code',           'row',        'INTEGER',
+            sql="CASE admit_season WHEN 'WINTER' THEN 1 WHEN 'SPRING' THEN 2 "
+                "WHEN 'SUMMER' THEN 3 ELSE 4 END",
+            fn=lambda r: SEASON_CODES.get(r['admit_season'], 4),
+            polars=pl.col('admit_season').replace_strict(SEASON_CODES, default=4)),
+    feature('is_weekend_admit',      'row',        'INTEGER',
+            sql="CASE WHEN admit_dow IN (5, 6) THEN 1 ELSE 0 END",
+            fn=lambda r: int(r['admit_dow'] in (5, 6)),
+            polars=pl.col('admit_dow').is_in([5, 6])),
+    feature('visit_number',          'cumulative', 'BIGINT', agg='count'),
+
+    feature('los_x_comorbidity',     'row',        'INTEGER',
+            sql="los_days * charlson_index",
+            fn=lambda r: r['los_days'] * r['charlson_index'],
+            polars=pl.col('los_days') * pl.col('charlson_index')),
+    feature('procedures_per_day',    'row',        'DOUBLE',
+            sql="COALESCE(ROUND(num_procedures / NULLIF(CAST(los_days AS DOUBLE), 0), 3), 0)",
+            fn=lambda r: sql_round(r['num_procedures'] / r['los_days'], 3) if r['los_days'] else 0,
+            polars=(pl.col('num_procedures') / pl.col('los_days').replace(0, None))
+                   .round(3, mode='half_away_from_zero').fill_null(0)),
+    feature('cardio_burden',         'row',        'INTEGER',
+            sql="has_chf + has_ckd + has_copd",
+            fn=lambda r: r['has_chf'] + r['has_ckd'] + r['has_copd'],
+            polars=pl.col('has_chf') + pl.col('has_ckd') + pl.col('has_copd')),
+    feature('metabolic_burden',      'row',        'INTEGER',
+            sql="has_diabetes + has_cancer + has_dementia",
+            fn=lambda r: r['has_diabetes'] + r['has_cancer'] + r['has_dementia'],
+            polars=pl.col('has_diabetes') + pl.col('has_cancer') + pl.col('has_dementia')),
+
+    # Kept in gold for reporting and dashboards, not model inputs
+    feature('age_bucket',            'column',     'VARCHAR', model=False),
+    feature('gender',                'column',     'VARCHAR', model=False),
+    feature('risk_tier',             'column',     'VARCHAR', model=False),
+    feature('risk_tier_enc',         'encode',     'INTEGER', model=False, source='risk_tier',
+            vocab=['HIGH', 'LOW', 'MEDIUM', 'VERY_HIGH']),
+    feature('admit_season',          'column',     'VARCHAR', model=False),
+]
+
+FEATURES = [f['name'] for f in FEATURE_REGISTRY if f['model']]
+
+# ─── Batch and incremental SQL ───────────────────────────────────────────────
+DAY_SQL = "admission_date - DATE '1970-01-01'"
+
+def last_n_key(f):
+    return f"{f['source']}_last_{f['rows']}"
+
+def feature_sql(f, incremental=False):
+    # incremental=True continues each window from the patient's state row `s`
+    k, name = f['kind'], f['name']
+    if k == 'column':
+        return name
+    if k == 'row':
+        return f['sql']
+    if k == 'encode':
+        whens = ' '.join(f"WHEN '{v}' THEN {i}" for i, v in enumerate(f['vocab']))
+        return f"CASE {f['source']} {whens} END"
+    if k == 'cumulative':
+        window = {'count': "COUNT(*)", 'sum': f"SUM({f.get('source')})",
+                  'max': f"MAX({f.get('source')})"}[f['agg']] + " OVER to_date"
+        if not incremental:
+            return window
+        if f['agg'] == 'max':
+            return f"GREATEST(s.{name}, {window})"
+        return f"COALESCE(s.{name}, 0) + {window}"
+    if k == 'last_n':
+        if not incremental:
+            values = f"AVG({f['source']}) OVER prior_{f['rows']}"
+        else:
+            values = (f"list_avg(list_concat(COALESCE(s.{last_n_key(f)}, []), "
+                      f"LIST({f['source']}) OVER prior_{f['rows']})[-{f['rows']}:])")
+        return f"COALESCE(ROUND({values}, {f['digits']}), {f['default_column']})"
+    if k == 'calendar':
+        window = f"COUNT(*) OVER last_{f['days']}d"
+        if not incremental:
+            return window
+        return (f"len(list_filter(COALESCE(s.recent_days, []), "
+                f"x -> x >= {DAY_SQL} - {f['days']})) + {window}")
+    if k == 'since_last':
+        previous = "LAG(admission_date) OVER visits"
+        if incremental:
+            previous = f"COALESCE({previous}, s.last_admission_date)"
+        return f"COALESCE(DATEDIFF('day', {previous}, admission_date), {f['default']})"
+    raise ValueError(f"Unknown feature kind: {k}")
+
+def registry_select_sql(registry, incremental=False):
+    return ''.join(f"    CAST({feature_sql(f, incremental)} AS {f['dtype']}) AS {f['name']},\n"
+                   for f in registry)
+
+def registry_window_sql(registry):
+    # One per-patient ordering on day number shared by every window feature
+    windows = ["visits AS (PARTITION BY patient_id ORDER BY admission_date - DATE '1970-01-01')"]
+    if any(f['kind'] == 'cumulative' for f in registry):
+        windows.append("to_date AS (visits ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)")
+    for n in sorted({f['rows'] for f in registry if f['kind'] == 'last_n'}):
+        windows.append(f"prior_{n} AS (visits ROWS BETWEEN {n} PRECEDING AND 1 PRECEDING)")
+    for h in sorted({f['days'] for f in registry if f['kind'] == 'calendar'}):
+        windows.append(f"last_{h}d AS (visits RANGE BETWEEN {h} PRECEDING AND 1 PRECEDING)")
+    return 'WINDOW ' + ',\n       '.join(windows)
+
+def registry_state_sql(registry, incremental=False):
+    # One row per patient summarising gold_delta's admissions, extending the
+    # previous state `s` when incremental; recent_days keeps only the days within
+    # the longest horizon of the patient's last admission
+    prior = (lambda col, empty: f"COALESCE(ANY_VALUE(s.{col}), {empty})") if incremental else None
+    aggs  = ["MAX(admission_date) AS last_admission_date"]
+    for f in registry:
+        if f['kind'] == 'cumulative':
+            agg = {'count': "COUNT(*)", 'sum': f"SUM({f.get('source')})",
+                   'max': f"MAX({f.get('source')})"}[f['agg']]
+            if incremental:
+                agg = (f"GREATEST(ANY_VALUE(s.{f['name']}), {agg})" if f['agg'] == 'max'
+                       else f"{prior(f['name'], 0)} + {agg}")
+            aggs.append(f"CAST({agg} AS {f['dtype']}) AS {f['name']}")
+    for key, (source, n) in {last_n_key(f): (f['source'], f['rows'])
+                             for f in registry if f['kind'] == 'last_n'}.items():
+        values = f"LIST({source} ORDER BY admission_date)"
+        if incremental:
+            values = f"list_concat({prior(key, '[]')}, {values})"
+        aggs.append(f"{values}[-{n}:] AS {key}")
+    horizon = max([f['days'] for f in registry if f['kind'] == 'calendar'], default=None)
+    if horizon:
+        days = f"LIST({DAY_SQL} ORDER BY admission_date)"
+        if incremental:
+            days = f"list_concat({prior('recent_days', '[]')}, {days})"
+        aggs.append(f"{days} AS recent_days")
+    join = " LEFT JOIN gold_state s USING (patient_id)" if incremental else ""
+    sql  = (f"SELECT patient_id,\n       " + ',\n       '.join(aggs) +
+            f"\nFROM gold_delta{join}\nGROUP BY patient_id")
+    if not horizon:
+        return sql
+    return (f"SELECT * REPLACE (list_filter(recent_days, x -> x > last_admission_date "
+            f"- DATE '1970-01-01' - {horizon}) AS recent_days)\nFROM ({sql})")
+
+# ─── Polars ──────────────────────────────────────────────────────────────────
+POLARS_DTYPES = {'TINYINT': pl.Int8, 'SMALLINT': pl.Int16, 'INTEGER': pl.Int32,
+                 'BIGINT': pl.Int64, 'DOUBLE': pl.Float64, 'VARCHAR': pl.String}
+
+def feature_polars(f):
+    # Expression over silver sorted by (patient_id, admission_date); the window
+    # kinds run per patient with .over, in that order
+    k, name = f['kind'], f['name']
+    if k == 'column':
+        expr = pl.col(name)
+    elif k == 'row':
+        expr = f['polars']
+    elif k == 'encode':
+        expr = pl.col(f['source']).replace_strict(f['vocab'], list(range(len(f['vocab']))),
+                                                  default=None)
+    elif k == 'cumulative':
+        if f['agg'] == 'count':
+            expr = pl.int_range(1, pl.len() + 1)
+        elif f['agg'] == 'sum':
+            expr = pl.col(f['source']).cast(pl.Int64).cum_sum()
+        else:
+            expr = pl.col(f['source']).cum_max()
+        expr = expr.over('patient_id')
+    elif k == 'last_n':
+        expr = (pl.col(f['source']).shift(1).rolling_mean(f['rows'], min_samples=1)
+                .over('patient_id').round(f['digits'], mode='half_away_from_zero')
+                .fill_null(pl.col(f['default_column'])))
+    elif k == 'calendar':
+        # Admissions in [day - days, day]: the rolling group, less the current day's
+        # own admissions, which the RANGE frame's 1 PRECEDING leaves out
+        expr = (pl.len().rolling(index_column='admission_date', period=f"{f['days']}d",
+                                 closed='both').over('patient_id')
+                - pl.len().over('patient_id', 'admission_date'))
+    elif k == 'since_last':
+        expr = ((pl.col('admission_date') - pl.col('admission_date').shift(1))
+                .dt.total_days().over('patient_id').fill_null(f['default']))
+    else:
+        raise ValueError(f"Unknown feature kind: {k}")
+    return expr.cast(POLARS_DTYPES[f['dtype']]).alias(name)
+
+# ─── Per-event Python ────────────────────────────────────────────────────────
+def registry_event(registry, state, row):
+    # Features for one admission given the patient's state before it, and the
+    # state after it. State keys match the columns of registry_state_sql; row is
+    # one silver admission as a dict, and admissions must arrive in date order.
+    day  = (row['admission_date'] - EPOCH).days
+    last = state.get('last_admission_date')
+    out, new = {}, {'last_admission_date': row['admission_date']}
+    for f in registry:
+        k, name = f['kind'], f['name']
+        if k == 'column':
+            value = row[name]
+        elif k == 'row':
+            value = f['fn'](row)
+        elif k == 'encode':
+            value = f['vocab'].index(row[f['source']]) if row[f['source']] in f['vocab'] else None
+        elif k == 'cumulative':
+            current = 1 if f['agg'] == 'count' else row[f['source']]
+            before  = state.get(name)
+            value   = (current if before is None
+                       else max(before, current) if f['agg'] == 'max' else before + current)
+            new[name] = value
+        elif k == 'last_n':
+            values = state.get(last_n_key(f)) or []
+            value  = (sql_round(sum(values) / len(values), f['digits']) if values
+                      else row[f['default_column']])
+            new[last_n_key(f)] = (values + [row[f['source']]])[-f['rows']:]
+        elif k == 'calendar':
+            value = sum(day - f['days'] <= d < day for d in state.get('recent_days') or [])
+        elif k == 'since_last':
+            value = (row['admission_date'] - last).days if last else f['default']
+        else:
+            raise ValueError(f"Unknown feature kind: {k}")
+        out[name] = value
+    horizon = max([f['days'] for f in registry if f['kind'] == 'calendar'], default=None)
+    if horizon:
+        new['recent_days'] = [d for d in (state.get('recent_days') or []) + [day]
+                              if d > day - horizon]
+    return out, new
+
+print(" FEATURE REGISTRY")
+print(f"   Features declared: {len(FEATURE_REGISTRY)} | Model inputs: {len(FEATURES)}")
+for kind in ['column', 'row', 'encode', 'cumulative', 'last_n', 'calendar', 'since_last']:
+    names = [f['name'] for f in FEATURE_REGISTRY if f['kind'] == kind]
+    print(f"   {kind:<11} {len(names):>2}  {', '.join(names[:4])}{' …' if len(names) > 4 else ''}")
+
+GOLD_PATIENT_RANGE = (None, None)   # window features need whole patients, so slice by id
+
+gold_ranges = {'patient_id': GOLD_PATIENT_RANGE}
+
+# Gold and its state are split into GOLD_BUCKETS patient-hash buckets, one
+# partition directory each, so training, scoring and SHAP can hand a bucket to
+# each worker with nothing shared between them. The bucket is an md5 prefix
+# rather than DuckDB's hash() so it is stable across versions and
+# gold_bucket() computes the same value in Python.
+GOLD_BUCKETS           = 8
+GOLD_BUCKET_PARTITIONS = ['patient_bucket']
+GOLD_BUCKET_SQL        = f"CAST('0x' || LEFT(md5(patient_id), 8) AS UBIGINT) % {GOLD_BUCKETS}"
+
+def gold_bucket(patient_id):
+    return int(hashlib.md5(patient_id.encode()).hexdigest()[:8], 16) % GOLD_BUCKETS
+
+def gold_bucket_files(metadata_path=None):
+    # {bucket: [data files]} in the current snapshot, grouped by the manifest's
+    # partition values: file names are per write and carry no meaning
+    buckets = {}
+    for f in load_data_files(metadata_path or GOLD_METADATA):
+        buckets.setdefault(f['partition']['patient_bucket'], []).append(f)
+    return buckets
+
+# Gold's columns are compiled from FEATURE_REGISTRY, each one a projection over
+# silver. The window features share the per-patient ordering `visits`, so silver
+# is sorted once and nothing is joined back. Sorting by bucket first lets one
+# scan write every bucket's file, and the calendar windows order by day number
+# so their RANGE frame edges are integer comparisons.
+gold_sql = f"""
+SELECT
+    patient_id, admission_date,
+    {GOLD_BUCKET_SQL}  AS patient_bucket,
+{registry_select_sql(FEATURE_REGISTRY)}    readmitted_30d
+FROM silver
+{registry_window_sql(FEATURE_REGISTRY)}
+ORDER BY patient_bucket, patient_id, admission_date
+"""
+
+# ─── Gold engines: what computes a full build ────────────────────────────────
+# An engine returns what materialize writes for a full build from the silver
+# files (the `silver` view over them is already in place): SQL, or an Arrow
+# RecordBatchReader with gold_sql's columns in its order and sort. The files,
+# bucket layout and snapshot are the same whichever engine ran. Incremental
+# refreshes always run in DuckDB: they join a small delta to the patient state,
+# and the state itself is aggregated there.
+GOLD_ENGINE       = 'duckdb'     # 'polars': the same registry compiled to a Polars lazy plan
+POLARS_SLICE_ROWS = 1_000_000    # silver rows per Polars collect
+
+def duckdb_gold_source(con, silver_files):
+    return gold_sql
+
+def polars_gold_frame(silver):
+    # gold_sql's sort by (bucket, patient, date), and every window feature runs
+    # per patient over that order. silver already carries patient_bucket, since
+    # Polars has no md5 to compute it with.
+    return (silver.sort('patient_bucket', 'patient_id', 'admission_date')
+                  .select('patient_id', 'admission_date', 'patient_bucket',
+                          *[feature_polars(f) for f in FEATURE_REGISTRY], 'readmitted_30d'))
+
+def polars_slice_sql():
+    # Silver plus each row's patient_bucket and slice: patients in (bucket, patient)
+    # order are cut into runs of about POLARS_SLICE_ROWS admissions
+    return f"""
+WITH patients AS (
+    SELECT patient_id, {GOLD_BUCKET_SQL} AS patient_bucket, COUNT(*) AS n
+    FROM silver GROUP BY patient_id
+), slices AS (
+    SELECT patient_id, patient_bucket,
+           SUM(n) OVER (ORDER BY patient_bucket, patient_id
+                        ROWS UNBOUNDED PRECEDING) // {POLARS_SLICE_ROWS} AS slice_id
+    FROM patients
+)
+SELECT silver.*, slices.patient_bucket, slices.slice_id
+FROM silver JOIN slices USING (patient_id)
+"""
+
+def polars_gold_source(con, silver_files):
+    # Polars allocates outside DuckDB's memory_limit, so gold is not collected
+    # whole. DuckDB hashes each patient to its bucket and splits silver once
+    # into one scratch directory per slice; each slice then reads only its own
+    # files, is collected on the streaming engine and is handed on before the
+    # next, so one slice's rows are held at a time. The
+    # slices follow the output order and are cast to gold_sql's Arrow schema, so
+    # the files are sorted and typed exactly as DuckDB writes them.
+    slice_dir = f'{DUCKDB_TEMP_DIR}/polars_slices_{uuid.uuid4().hex[:8]}'
+    con.execute(f"COPY ({polars_slice_sql()}) TO '{slice_dir}' "
+                f"(FORMAT PARQUET, PARTITION_BY (slice_id))")
+    # No directory at all when silver has no rows in range
+    slices = sorted(int(d.split('=', 1)[1]) for d in
+                    (os.listdir(slice_dir) if os.path.isdir(slice_dir) else []))
+    schema = con.execute(f"SELECT * FROM ({gold_sql}) LIMIT 0").fetch_record_batch().schema
+
+    def batches():
+        try:
+            for i in slices:
+                table = polars_gold_frame(pl.scan_parquet(f'{slice_dir}/slice_id={i}/*.parquet')) \
+                            .collect(engine='streaming').to_arrow().cast(schema)
+                yield from table.to_batches(LOOKUP_ROW_GROUP_ROWS)
+                del table    # released before the next slice is collected
+        finally:
+            shutil.rmtree(slice_dir, ignore_errors=True)
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+GOLD_ENGINES = {'duckdb': duckdb_gold_source, 'polars': polars_gold_source}
+
+# ─── Incremental gold: per-patient running state ─────────────────────────────
+# Everything the window features need from a patient's earlier admissions, one
+# row per patient as laid out by registry_state_sql: the running value of each
+# cumulative feature, the last admission date, the last n values behind each
+# last_n feature and the day numbers of admissions within the longest calendar
+# horizon of the last one
+GOLD_MODE           = 'incremental'  # 'full': recompute gold from all of silver on every run
+GOLD_METADATA       = '/content/lakehouse/gold/iceberg_metadata.json'
+GOLD_STATE_DIR      = '/content/lakehouse/gold/patient_state'
+GOLD_STATE_METADATA = f'{GOLD_STATE_DIR}/iceberg_metadata.json'
+
+# New admissions (gold_delta) extend the previous state (gold_state): prior
+# counts, sums and maxes are added on, and the LOS / visit-day windows start
+# from the stored lists before running over the patient's new rows
+gold_delta_sql = f"""
+SELECT
+    patient_id, admission_date,
+    {GOLD_BUCKET_SQL}  AS patient_bucket,
+{registry_select_sql(FEATURE_REGISTRY, incremental=True)}    readmitted_30d
+FROM gold_delta LEFT JOIN gold_state s USING (patient_id)
+{registry_window_sql(FEATURE_REGISTRY)}
+ORDER BY patient_bucket, patient_id, admission_date
+"""
+
+def gold_state_sql(incremental):
+    return f"""
+SELECT patient_id, {GOLD_BUCKET_SQL} AS patient_bucket, * EXCLUDE (patient_id)
+FROM ({registry_state_sql(FEATURE_REGISTRY, incremental)})
+ORDER BY patient_bucket, patient_id
+"""
+
+GOLD_DIR = '/content/lakehouse/gold'
+
+def refresh_gold(silver_metadata=SILVER_METADATA, gold_metadata=GOLD_METADATA,
+                 gold_dir=GOLD_DIR, state_metadata=GOLD_STATE_METADATA,
+                 state_dir=GOLD_STATE_DIR):
+    # Gold records the silver snapshot and the newest silver transformed_at it has
+    # consumed. In incremental mode only silver rows transformed since then are
+    # read: each is extended from its patient's state and appended to gold, and
+    # the touched patients get a new state row (latest sequence number wins, and
+    # compact_state folds the superseded ones away), so a refresh costs
+    # O(new admissions). A first run, a changed registry or patient
+    # range, a silver overwrite, or a new row dated on or before its patient's
+    # last admission (a late arrival or correction) rebuilds gold and the state
+    # from all of silver. Every build writes new files, so older snapshots that
+    # training sets are pinned to stay readable. The table paths default to the
+    # lakehouse's.
+    previous = read_metadata(gold_metadata)
+    props    = previous.get('properties', {}) if previous else {}
+    settings = {'features':      hashlib.md5((gold_delta_sql + gold_state_sql(True))
+                                             .encode()).hexdigest(),
+                'patient_range': list(GOLD_PATIENT_RANGE),
+                'buckets':       GOLD_BUCKETS}
+    state    = read_metadata(state_metadata)
+    changed  = None
+    if (GOLD_MODE == 'incremental' and props.get('silver_snapshot_id')
+            and props.get('settings') == settings and state and state['row_count']):
+        changed = files_since(silver_metadata, props['silver_snapshot_id'])
+    stats = {'mode': 'incremental', 'engine': 'duckdb', 'silver_files': 0, 'new_admissions': 0,
+             'patients_touched': 0, 'rewound_patients': 0}
+
+    with catalog_cursor() as con:
+        if changed is not None:
+            scan = prune_files(changed, gold_ranges)
+            stats['silver_files'] = len(scan)
+            if not scan:
+                return previous, stats
+            since = props['silver_transformed_at']
+            con.execute(f"""CREATE OR REPLACE TEMP TABLE gold_delta AS
+                            SELECT * FROM {parquet_source(scan)}
+                            WHERE transformed_at > '{since}'::TIMESTAMPTZ
+                            {range_filter_sql(gold_ranges)}""")
+            con.execute(f"""CREATE OR REPLACE TEMP TABLE gold_state AS
+                            SELECT * EXCLUDE (sequence_number, file_ordinal, file_row_number)
+                            FROM {versioned_source(load_data_files(state_metadata))}
+                            SEMI JOIN gold_delta USING (patient_id)
+                            QUALIFY ROW_NUMBER() OVER (PARTITION BY patient_id
+                                                       ORDER BY sequence_number DESC) = 1""")
+            stats['new_admissions'], stats['patients_touched'] = con.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT patient_id) FROM gold_delta").fetchone()
+            stats['rewound_patients'] = con.execute(
+                """SELECT COUNT(DISTINCT patient_id) FROM gold_delta
+                   JOIN gold_state USING (patient_id)
+                   WHERE admission_date <= last_admission_date""").fetchone()[0]
+            if not stats['new_admissions']:
+                con.execute("DROP TABLE gold_delta")
+                con.execute("DROP TABLE gold_state")
+                return previous, stats
+            if stats['rewound_patients']:
+                con.execute("DROP TABLE gold_delta")
+                changed = None
+
+        silver_meta = read_metadata(silver_metadata)
+        silver_scan = None
+        if changed is None:
+            stats['mode'] = 'full'
+            stats['engine'] = GOLD_ENGINE
+            silver_scan = prune_files(load_data_files(silver_metadata), gold_ranges)
+            stats['silver_files'] = len(silver_scan)
+        if silver_scan == []:
+            # No silver file in range: gold and its state are overwritten empty,
+            # and the next refresh is a full one again
+            files, state_files, transformed_at = [], [], None
+        else:
+            if changed is None:
+                con.execute(f"""CREATE OR REPLACE TEMP VIEW silver AS
+                                SELECT * FROM {parquet_source(silver_scan)}
+                                WHERE TRUE {range_filter_sql(gold_ranges)}""")
+                con.execute("CREATE OR REPLACE TEMP VIEW gold_delta AS SELECT * FROM silver")
+                files = materialize(con, GOLD_ENGINES[GOLD_ENGINE](con, silver_scan), gold_dir,
+                                    GOLD_BUCKET_PARTITIONS, lookup_key='patient_id')
+            else:
+                files = materialize(con, gold_delta_sql, gold_dir, GOLD_BUCKET_PARTITIONS,
+                                    lookup_key='patient_id')
+            transformed_at = con.execute(
+                "SELECT CAST(MAX(transformed_at) AS VARCHAR) FROM gold_delta").fetchone()[0]
+            state_files = materialize(con, gold_state_sql(changed is not None), state_dir,
+                                      GOLD_BUCKET_PARTITIONS, lookup_key='patient_id')
+            con.execute("DROP VIEW IF EXISTS gold_delta" if changed is None
+                        else "DROP TABLE gold_delta")
+            con.execute("DROP TABLE IF EXISTS gold_state")
+        watermark = {'silver_snapshot_id':    silver_meta['current_snapshot_id'],
+                     'silver_transformed_at': transformed_at,
+                     'settings':              settings}
+        operation = 'overwrite' if changed is None else 'append'
+    summary  = {k: v for k, v in stats.items() if k != 'mode'}
+    commit_snapshot(state_metadata, 'gold.patient_state', state_files,
+                    GOLD_BUCKET_PARTITIONS, operation=operation, properties=watermark,
+                    summary=summary)
+    metadata = commit_snapshot(gold_metadata, 'gold.readmission_features', files,
+                               GOLD_BUCKET_PARTITIONS, operation=operation,
+                               properties={**watermark, 'lookup_key': 'patient_id'},
+                               summary=summary)
+    register_table(gold_metadata)
+    return metadata, stats
+
+# ─── POINT-IN-TIME TRAINING SETS: label events as-of joined to gold ──────────
+# A label event is (patient_id, event_ts, ...label columns). It takes its
+# features from the patient's latest gold row admitted strictly before event_ts,
+# so nothing recorded at or after the event can leak in; inclusive=True also
+# admits a row dated at the event itself. Gold is read at a pinned snapshot and
+# the training set records it, so the same labels always rebuild the same rows.
+
+def point_in_time_sql(label_source, feature_files, inclusive=False):
+    # ASOF LEFT JOIN keeps events with no earlier admission (feature columns NULL).
+    # The gold row's own target would leak the outcome of that admission, so it
+    # is not carried over as a feature.
+    return f"""
+    SELECT l.*,
+           f.admission_date AS feature_admission_date,
+           f.* EXCLUDE (patient_id, admission_date, readmitted_30d)
+    FROM {label_source} l
+    ASOF LEFT JOIN {parquet_source(feature_files)} f
+      ON l.patient_id = f.patient_id
+     AND l.event_ts {'>=' if inclusive else '>'} f.admission_date
+    """
+
+def build_training_set(con, label_source, table_dir, snapshot_id=None, inclusive=False,
+                       gold_metadata=None):
+    # DuckDB sorts both sides per patient and merges them, spilling under the
+    # connection's memory limit, and materialize streams the result out, so the
+    # label count is bounded by disk rather than RAM
+    gold_metadata = gold_metadata or GOLD_METADATA
+    snapshot_id = snapshot_id or read_metadata(gold_metadata)['current_snapshot_id']
+    metadata_path = f'{table_dir}/iceberg_metadata.json'
+    files = materialize(con, point_in_time_sql(label_source,
+                                               load_data_files(gold_metadata, snapshot_id),
+                                               inclusive), f'{table_dir}/data')
+    return commit_snapshot(metadata_path, f'ml.{os.path.basename(table_dir)}', files,
+                           properties={'gold_snapshot_id': snapshot_id,
+                                       'inclusive':        inclusive})
+
+gold_metadata, gold_refresh = refresh_gold()
+gold_rows    = gold_metadata['row_count']
+gold_columns = [c for c in gold_metadata['columns'] if c not in GOLD_BUCKET_PARTITIONS]
+
+print(" GOLD LAYER: Feature Engineering Complete")
+print(f"   Rows: {gold_rows:,}")
+print(f"   Total features engineered: {len(gold_columns) - 1}")
+print(f"   Refresh: {gold_refresh['mode']} ({gold_refresh['engine']}) | Patients in state: "
+      f"{read_metadata(GOLD_STATE_METADATA)['row_count']:,}")
+print(f"   Saved to: {GOLD_DIR} ({len(load_data_files(GOLD_METADATA))} files in "
+      f"{GOLD_BUCKETS} patient buckets)")
+bucket_rows = [sum(f['record_count'] for f in files) for files in gold_bucket_files().values()]
+print(f"   Rows per bucket: {min(bucket_rows):,} – {max(bucket_rows):,}")
+print(f"\n📋 Sample features:")
+print(query_arrow("""SELECT patient_id, age, charlson_index, los_x_comorbidity,
+                            visits_prior_90d, days_since_last_admit, risk_tier,
+                            readmitted_30d
+                     FROM gold.readmission_features LIMIT 5""").to_pandas()
+      .to_string(index=False))
+
+import time
+
+INGEST_DEMO_DIR  = '/content/lakehouse/bench/ingest_demo'
+INGEST_DEMO_ROWS = 50_000
+
+def ingest_bronze_day(day, n_rows, seed, metadata_path=BRONZE_METADATA, table_dir=BRONZE_DIR):
+    # Appends one day of admissions as new partition files and commits them in a
+    # single snapshot; patient ids continue from the current table row count
+    base = read_metadata(metadata_path)
+    return append_to_table(
+        metadata_path, table_dir, 'bronze.raw_admissions',
+        bronze_batches(iter_ehr_batches(n_rows, BRONZE_BATCH_ROWS, seed=seed,
+                                        id_offset=base['row_count'] if base else 0,
+                                        start=day, end=day)),
+        BRONZE_PARTITIONS)
+
+@contextmanager
+def scratch_tables(root):
+    # Copies every table's metadata under root and yields a function mapping a
+    # lakehouse path to its place under root. Manifests and data files are read
+    # in place, and commits only ever add new files, so the real tables are left
+    # as they were; the catalog views that scratch commits re-point are restored
+    def scratch(path):
+        return path.replace('/content/lakehouse', root, 1)
+
+    shutil.rmtree(root, ignore_errors=True)
+    for metadata_path in [BRONZE_METADATA, SILVER_METADATA, QUARANTINE_METADATA,
+                          GOLD_METADATA, GOLD_STATE_METADATA]:
+        os.makedirs(os.path.dirname(scratch(metadata_path)), exist_ok=True)
+        shutil.copy(metadata_path, scratch(metadata_path))
+    try:
+        yield scratch
+    finally:
+        for metadata_path in [BRONZE_METADATA, SILVER_METADATA, QUARANTINE_METADATA,
+                              GOLD_METADATA]:
+            register_table(metadata_path)
+        shutil.rmtree(root)
+
+# The demo day is appended to a scratch copy, so the batch-loaded tables that
+# the model trains on keep exactly the rows the generator wrote
+real_bronze = read_metadata(BRONZE_METADATA)
+
+with scratch_tables(INGEST_DEMO_DIR) as scratch:
+    before = read_metadata(scratch(BRONZE_METADATA))
+    files_before = {f['path'] for f in load_data_files(scratch(BRONZE_METADATA))}
+
+    t0 = time.perf_counter()
+    after = ingest_bronze_day('2025-01-01', INGEST_DEMO_ROWS, seed=EHR_SEED + 1,
+                              metadata_path=scratch(BRONZE_METADATA),
+                              table_dir=scratch(BRONZE_DIR))
+    elapsed = time.perf_counter() - t0
+
+    added = [f for f in load_data_files(scratch(BRONZE_METADATA))
+             if f['path'] not in files_before]
+
+    print(" BRONZE INCREMENTAL INGEST — append + atomic snapshot commit (scratch copy)")
+    print(f"   Snapshot: {before['current_snapshot_id']} → {after['current_snapshot_id']}")
+    print(f"   Rows: {before['row_count']:,} → {after['row_count']:,}")
+    print(f"   Files added: {len(added)} | Existing files rewritten: 0")
+    print(f"   Bytes written: {sum(f['file_size_bytes'] for f in added) / 1024:.0f} KB "
+          f"in {elapsed:.2f}s")
+    print(f"   Previous snapshot still readable: "
+          f"{len(load_data_files(scratch(BRONZE_METADATA), before['current_snapshot_id']))} files")
+
+    # Silver picks up only the files this append added and merges them on admission_key
+    t0 = time.perf_counter()
+    scratch_silver, silver_refresh = refresh_silver(
+        bronze_metadata=scratch(BRONZE_METADATA), silver_metadata=scratch(SILVER_METADATA),
+        silver_dir=scratch(SILVER_DIR), quarantine_metadata=scratch(QUARANTINE_METADATA),
+        quarantine_dir=scratch(QUARANTINE_DIR))
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n SILVER INCREMENTAL REFRESH — {silver_refresh['mode']}")
+    print(f"   Bronze files scanned: {silver_refresh['scanned_files']} "
+          f"of {len(load_data_files(scratch(BRONZE_METADATA)))}")
+    print(f"   Inserted: {silver_refresh.get('inserted', 0):,} | "
+          f"Updated: {silver_refresh.get('updated', 0):,} | "
+          f"Files rewritten: {silver_refresh.get('files_rewritten', 0)}")
+    print(f"   Silver rows: {scratch_silver['row_count']:,} in {elapsed:.2f}s")
+
+    # Gold extends only the patients with new admissions from their stored state
+    t0 = time.perf_counter()
+    scratch_gold, gold_refresh = refresh_gold(
+        silver_metadata=scratch(SILVER_METADATA), gold_metadata=scratch(GOLD_METADATA),
+        gold_dir=scratch(GOLD_DIR), state_metadata=scratch(GOLD_STATE_METADATA),
+        state_dir=scratch(GOLD_STATE_DIR))
+    elapsed = time.perf_counter() - t0
+
+    print(f"\n GOLD INCREMENTAL REFRESH — {gold_refresh['mode']}")
+    print(f"   New admissions: {gold_refresh['new_admissions']:,} | "
+          f"Patients touched: {gold_refresh['patients_touched']:,} | "
+          f"Rewound: {gold_refresh['rewound_patients']:,}")
+    print(f"   Gold rows: {scratch_gold['row_count']:,} in {elapsed:.2f}s")
+
+assert read_metadata(BRONZE_METADATA)['row_count'] == real_bronze['row_count'], \
+    'the ingest demo changed the real bronze table'
+assert read_metadata(BRONZE_METADATA)['current_snapshot_id'] == real_bronze['current_snapshot_id']
+
+COMPACTION_TARGET_BYTES = 128 * 1024 * 1024
+COMPACTION_SMALL_RATIO  = 0.75     # files below 75% of the target are bin-packed
+CLUSTER_ORDER           = ['patient_id', 'admission_date']
+
+def plan_compaction(data_files, target_bytes, sort_order, small_ratio=COMPACTION_SMALL_RATIO):
+    # Within each partition, small or unsorted files are packed into bins of at
+    # most target_bytes; a bin that would just rewrite one already sorted file is
+    # dropped. Files over target_bytes are left as they are, since they could not
+    # be sorted within that bound. A rewritten file takes the newest sequence
+    # number of its inputs, so a bin must hold a run of files adjacent in sequence:
+    # files are packed in sequence order, never across a file left as it is or
+    # one placed in another bin, or older rows would overtake it.
+    candidates, kept = {}, {}
+    for f in data_files:
+        small    = f['file_size_bytes'] < small_ratio * target_bytes
+        unsorted = f.get('sorted_by') != list(sort_order)
+        oversize = f['file_size_bytes'] > target_bytes
+        key      = tuple(sorted(f['partition'].items()))
+        rewrite  = (small or unsorted) and not oversize
+        (candidates if rewrite else kept).setdefault(key, []).append(f)
+    by_partition = {}
+    for key, files in candidates.items():
+        for f in files:
+            era = sum(k.get('sequence_number', 0) <= f.get('sequence_number', 0)
+                      for k in kept.get(key, []))
+            by_partition.setdefault((key, era), []).append(f)
+
+    bins = []
+    for files in by_partition.values():
+        runs = []
+        for f in sorted(files, key=lambda f: f.get('sequence_number', 0)):
+            if runs and runs[-1]['bytes'] + f['file_size_bytes'] <= target_bytes:
+                runs[-1]['files'].append(f)
+                runs[-1]['bytes'] += f['file_size_bytes']
+            else:
+                runs.append({'files': [f], 'bytes': f['file_size_bytes']})
+        bins += [b['files'] for b in runs
+                 if len(b['files']) > 1 or b['files'][0].get('sorted_by') != list(sort_order)]
+    return bins
+
+def compact_table(metadata_path, target_bytes=COMPACTION_TARGET_BYTES, sort_order=CLUSTER_ORDER):
+    # Tables whose properties name a lookup_key keep the point-lookup layout
+    # (row groups sorted by the key, page index, bloom filter) in their rewritten files
+    metadata   = read_metadata(metadata_path)
+    lookup_key = metadata.get('properties', {}).get('lookup_key')
+    if lookup_key and sort_order[0] != lookup_key:
+        raise ValueError(f'{metadata["table_name"]} is laid out for lookups by {lookup_key}; '
+                         f'sort_order must start with it')
+    data_files = load_data_files(metadata_path)
+    ordinal    = {f['path']: i for i, f in enumerate(data_files)}
+    bins = plan_compaction(data_files, target_bytes, sort_order)
+    if not bins:
+        return metadata, 0, 0
+
+    written, removed = [], []
+    for files in bins:
+        # Bins are bounded by target_bytes, so sorting one in memory is bounded too;
+        # reading with Arrow keeps the table's storage types (dictionaries, int8, date32).
+        # Files are read oldest first and Arrow's sort is stable, so within the new
+        # file a later version of a row still comes after the one it supersedes.
+        files = sorted(files, key=lambda f: (f.get('sequence_number', 0), ordinal[f['path']]))
+        table = pa.concat_tables([pq.read_table(f['path'], partitioning=None) for f in files],
+                                 promote_options='default')
+        table = table.sort_by([(c, 'ascending') for c in sort_order])
+        path  = f"{os.path.dirname(files[0]['path'])}/part-c-{uuid.uuid4().hex[:8]}.parquet"
+        if lookup_key:
+            pq.write_table(table, path, row_group_size=LOOKUP_ROW_GROUP_ROWS,
+                           **lookup_writer_options(table.schema, lookup_key))
+        else:
+            pq.write_table(table, path)
+        written.append({'path': path, 'partition': files[0]['partition'],
+                        'sorted_by': list(sort_order),
+                        'sequence_number': max(f.get('sequence_number', 0) for f in files)})
+        removed += [f['path'] for f in files]
+
+    metadata = commit_snapshot(metadata_path, metadata['table_name'], written,
+                               metadata['partitions'], operation='replace',
+                               removed_files=removed, sort_order=sort_order)
+    register_table(metadata_path)
+    return metadata, len(removed), len(written)
+
+def compact_state(metadata_path=GOLD_STATE_METADATA, state_dir=GOLD_STATE_DIR):
+    # Every incremental gold refresh appends a state row for each patient it
+    # touched, and readers take the newest by sequence number. A bucket holding
+    # more than one file is folded into one file of only those newest rows, which
+    # keeps the newest input sequence number, so a refresh reads one state file
+    # per bucket however many refreshes came before it
+    metadata  = read_metadata(metadata_path)
+    by_bucket = {}
+    for f in load_data_files(metadata_path):
+        by_bucket.setdefault(tuple(sorted(f['partition'].items())), []).append(f)
+    written, removed = [], []
+    with catalog_cursor() as con:
+        for files in by_bucket.values():
+            if len(files) < 2:
+                continue
+            sequence = max(f.get('sequence_number', 0) for f in files)
+            latest   = materialize(con, f"""
+                SELECT * EXCLUDE (sequence_number, file_ordinal, file_row_number)
+                FROM {versioned_source(files)}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY patient_id
+                                           ORDER BY sequence_number DESC, file_ordinal DESC,
+                                                    file_row_number DESC) = 1
+                ORDER BY patient_id""", state_dir, metadata['partitions'], lookup_key='patient_id')
+            written += [{**f, 'sequence_number': sequence} for f in latest]
+            removed += [f['path'] for f in files]
+    if not removed:
+        return metadata, 0, 0
+    metadata = commit_snapshot(metadata_path, metadata['table_name'], written,
+                               metadata['partitions'], operation='replace',
+                               removed_files=removed)
+    return metadata, len(removed), len(written)
+
+print(" LAKEHOUSE MAINTENANCE — bin-pack + cluster by (patient_id, admission_date)")
+print(f"{'Table':<28} {'Files before':>13} {'Rewritten':>10} {'Written':>8} {'Files after':>12}")
+print("-" * 75)
+for metadata_path in [BRONZE_METADATA, SILVER_METADATA, GOLD_METADATA]:
+    before = len(load_data_files(metadata_path))
+    meta, n_removed, n_written = compact_table(metadata_path)
+    print(f"{meta['table_name']:<28} {before:>13} {n_removed:>10} {n_written:>8} "
+          f"{len(load_data_files(metadata_path)):>12}")
+    print(f"{'':<28} sort_order = {meta['sort_order']}")
+
+# gold.patient_state has no admission_date to cluster by; it is folded to the
+# newest row per patient instead
+before = len(load_data_files(GOLD_STATE_METADATA))
+meta, n_removed, n_written = compact_state()
+print(f"{meta['table_name']:<28} {before:>13} {n_removed:>10} {n_written:>8} "
+      f"{len(load_data_files(GOLD_STATE_METADATA)):>12}")
+print(f"{'':<28} latest row per patient: {meta['row_count']:,} rows")
+with catalog_cursor() as cur:
+    state_patients = cur.execute(f"SELECT COUNT(DISTINCT patient_id) FROM "
+                                 f"{parquet_source(load_data_files(GOLD_STATE_METADATA))}"
+                                 ).fetchone()[0]
+assert meta['row_count'] == state_patients, 'patient_state kept a superseded row'
+
+import time
+
+footprint_dir = '/content/lakehouse/bench/schema_footprint'
+# Its own sample from the generator, so the comparison runs with EHR_STREAMING too
+raw_table     = pa.Table.from_batches(list(iter_ehr_batches(min(N, 1_000_000), seed=EHR_SEED)))
+
+print(" BRONZE STORAGE SCHEMA — raw vs compact")
+print(f"{'Schema':<10} {'Files MB':>10} {'pandas MB':>11} {'Read s':>8}")
+print("-" * 42)
+
+for name, batches in [('raw',     raw_table.to_batches()),
+                      ('compact', cast_batches(raw_table.to_batches(), BRONZE_COMPACT_SCHEMA))]:
+    files = write_partitioned(f'{footprint_dir}/{name}', batches, BRONZE_PARTITIONS)
+    t0 = time.perf_counter()
+    frame = read_table_frame(files)
+    elapsed = time.perf_counter() - t0
+    print(f"{name:<10} {sum(os.path.getsize(f['path']) for f in files) / 1e6:>10.2f} "
+          f"{frame.memory_usage(deep=True).sum() / 1e6:>11.1f} {elapsed:>8.2f}")
+
+print(f"\n Compact dtypes: {dict(frame.dtypes.astype(str).value_counts())}")
+shutil.rmtree(footprint_dir)
+
+import time
 
-con2 = duckdb.connect()
-con2.execute("""CREATE TABLE silver AS
-              SELECT * FROM read_parquet('/content/lakehouse/silver/admissions_clean.parquet')""")
+os.makedirs('/content/lakehouse/bench', exist_ok=True)
+stream_dir = '/content/lakehouse/bench/raw_admissions_stream'
+
+print(" BRONZE STREAMING — peak generator memory vs. table size")
+print(f"{'Rows':>12} {'Batch':>10} {'Seconds':>10} {'Peak MB':>10} {'File MB':>10}")
+print("-" * 56)
+
+for n in [100_000, 1_000_000, 10_000_000]:
+    # NumPy allocations are visible to tracemalloc; Arrow buffers come from its own pool
+    tracemalloc.start()
+    arrow_before = pa.total_allocated_bytes()
+    arrow_peak   = 0
+
+    def tracked(batches):
+        global arrow_peak
+        for b in batches:
+            arrow_peak = max(arrow_peak, pa.total_allocated_bytes() - arrow_before)
+            yield b
+
+    t0 = time.perf_counter()
+    files = write_partitioned(stream_dir,
+                              tracked(iter_ehr_batches(n, 250_000, seed=EHR_SEED)),
+                              BRONZE_PARTITIONS)
+    elapsed = time.perf_counter() - t0
+    _, numpy_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    peak_mb = (numpy_peak + arrow_peak) / 1e6
+    rows    = sum(f['record_count'] for f in files)
+    size_mb = sum(os.path.getsize(f['path']) for f in files) / 1e6
+    print(f"{rows:>12,} {250_000:>10,} {elapsed:>10.2f} {peak_mb:>10.1f} {size_mb:>10.1f}")
+    shutil.rmtree(stream_dir)
+
+print("\n Peak memory is bounded by the batch size, not by the row count")
 
-gold_sql = """
+import time
+
+shard_dir_a = '/content/lakehouse/bench/shards_serial'
+shard_dir_b = '/content/lakehouse/bench/shards_parallel'
+n_rows, n_shards = 10_000_000, 16
+n_procs = os.cpu_count()
+
+print(f" SHARDED BRONZE GENERATION — {n_rows:,} rows, {n_shards} shards")
+print(f"{'Processes':>10} {'Seconds':>10} {'Rows/sec':>14}")
+print("-" * 36)
+
+runs = []
+for procs, out_dir in [(1, shard_dir_a), (n_procs, shard_dir_b)]:
+    t0 = time.perf_counter()
+    files = generate_bronze_sharded(n_rows, n_shards, out_dir, seed=EHR_SEED,
+                                    batch_rows=250_000, processes=procs)
+    elapsed = time.perf_counter() - t0
+    runs.append(files)
+    print(f"{procs:>10} {elapsed:>10.2f} {n_rows / elapsed:>14,.0f}")
+
+identical = len(runs[0]) == len(runs[1]) and all(
+    pq.read_table(a['path']).equals(pq.read_table(b['path']))
+    for a, b in zip(*runs)
+)
+print(f"\n Bit-identical across process counts: {identical}")
+print(f"   Rows written: {sum(f['record_count'] for f in files):,} in {len(files)} files")
+for out_dir in [shard_dir_a, shard_dir_b]:
+    shutil.rmtree(out_dir)
+assert identical, 'sharded bronze depends on the process count'
+assert sum(f['record_count'] for f in files) == n_rows
+
+import time
+
+# ─── ADMISSION KEY BENCHMARK: cost, width and collisions per key strategy ────
+KEY_BENCH_ROWS   = [1_000_000, 10_000_000, 100_000_000]
+KEY_BENCH_DAYS   = 1_461      # 2021-01-01 .. 2024-12-31
+
+os.makedirs('/content/lakehouse/bench', exist_ok=True)
+key_con = connect_duckdb()
+
+def key_source(n):
+    # Row i is patient i // KEY_BENCH_DAYS on day i % KEY_BENCH_DAYS, so every
+    # (patient_id, admission_date) pair is distinct and any repeated key is a collision
+    return f"""(SELECT 'PAT-' || LPAD(CAST(i // {KEY_BENCH_DAYS} AS VARCHAR), 7, '0') AS patient_id,
+                       DATE '2021-01-01' + CAST(i % {KEY_BENCH_DAYS} AS INTEGER) AS admission_date
+                FROM range({n}) t(i))"""
+
+print(" ADMISSION KEY BENCHMARK")
+print(f"{'Strategy':<10} {'Rows':>12} {'Scan s':>8} {'Rows/sec':>13} {'Collisions':>11}")
+print("-" * 58)
+
+# 'none' scans the same generated ids without computing a key, so the gap to it
+# is the cost of the key expression itself
+for n in KEY_BENCH_ROWS:
+    for strategy, expr in [('none', None)] + list(ADMISSION_KEY_SQL.items()):
+        t0 = time.perf_counter()
+        key_con.execute(f"SELECT MIN({expr or 'patient_id'}), MIN(admission_date) "
+                        f"FROM {key_source(n)}").fetchall()
+        scan_s = time.perf_counter() - t0
+        collisions = '-'
+        if expr:
+            distinct = key_con.execute(
+                f"SELECT COUNT(DISTINCT {expr}) FROM {key_source(n)}").fetchone()[0]
+            collisions = f'{n - distinct:,}'
+        print(f"{strategy:<10} {n:>12,} {scan_s:>8.2f} {n / scan_s:>13,.0f} {collisions:>11}")
+
+# Storage width and merge-probe cost: a 1% delta semi-joined against 10M keys,
+# which is the lookup silver's MERGE performs for every incremental refresh
+n = 10_000_000
+print(f"\n{'Strategy':<10} {'Bytes/key':>10} {'Probe ms':>10}   ({n:,} keys, 1% delta)")
+print("-" * 34)
+for strategy, expr in ADMISSION_KEY_SQL.items():
+    key_con.execute(f"CREATE OR REPLACE TABLE bench_keys AS SELECT {expr} AS k FROM {key_source(n)}")
+    key_con.execute("CREATE OR REPLACE TABLE bench_delta AS "
+                    "SELECT k FROM bench_keys USING SAMPLE 1 PERCENT (system, 42)")
+    path = f'/content/lakehouse/bench/keys_{strategy}.parquet'
+    key_con.execute(f"COPY bench_keys TO '{path}' (FORMAT parquet)")
+    t0 = time.perf_counter()
+    key_con.execute("SELECT COUNT(*) FROM bench_keys SEMI JOIN bench_delta USING (k)").fetchone()
+    probe_ms = (time.perf_counter() - t0) * 1000
+    print(f"{strategy:<10} {os.path.getsize(path) / n:>10.2f} {probe_ms:>10.1f}")
+    os.remove(path)
+key_con.execute("DROP TABLE bench_keys")
+key_con.execute("DROP TABLE bench_delta")
+key_con.close()
+
+print(f"\n Silver admission_key: {admission_key_version()}")
+
+import time
+
+# ─── FEATURE REGISTRY CHECK: batch SQL vs incremental SQL vs per-event Python ─
+# One cohort sample goes through all three compilations of FEATURE_REGISTRY:
+# gold_sql over the whole sample; the state of everything before a split date
+# extended by gold_delta_sql over the rest; and registry_event replayed admission
+# by admission in date order. Every feature and the final per-patient state must
+# agree. Patients with two admissions on one day are left out: their order
+# within the day is arbitrary in SQL, so the row frames may differ.
+REGISTRY_CHECK_ROWS  = 100_000
+REGISTRY_CHECK_SPLIT = 0.8   # share of admissions folded into the initial state
+REGISTRY_CHECK_DIR   = '/content/lakehouse/bench/feature_registry'
+
+def count_mismatches(a, b):
+    # Value-wise differences between two aligned columns; NULL matches NULL
+    if pd.api.types.is_float_dtype(a) or pd.api.types.is_float_dtype(b):
+        return int((~np.isclose(a.astype('float64'), b.astype('float64'), equal_nan=True)).sum())
+    return int((~((a == b) | (a.isna() & b.isna()))).sum())
+
+shutil.rmtree(REGISTRY_CHECK_DIR, ignore_errors=True)
+reg_con = connect_duckdb()
+bench_silver(reg_con, REGISTRY_CHECK_ROWS, REGISTRY_CHECK_DIR)
+reg_ties = {pid for (pid,) in reg_con.execute(
+    "SELECT DISTINCT patient_id FROM silver GROUP BY patient_id, admission_date "
+    "HAVING COUNT(*) > 1").fetchall()}
+split = reg_con.execute(f"SELECT quantile_disc(admission_date, {REGISTRY_CHECK_SPLIT}) "
+                        "FROM silver").fetchone()[0]
+key   = ['patient_id', 'admission_date']
+names = [f['name'] for f in FEATURE_REGISTRY]
+
+# Batch: the gold query over the whole sample
+batch = reg_con.execute(gold_sql).fetch_arrow_table().to_pandas()
+batch = batch[~batch['patient_id'].isin(reg_ties)].set_index(key).sort_index()
+
+# Incremental: state from admissions before the split, then the rest as one delta
+reg_con.execute(f"CREATE OR REPLACE TEMP VIEW gold_delta AS "
+                f"SELECT * FROM silver WHERE admission_date < DATE '{split}'")
+reg_con.execute(f"CREATE OR REPLACE TEMP TABLE gold_state AS "
+                f"{registry_state_sql(FEATURE_REGISTRY)}")
+reg_con.execute(f"CREATE OR REPLACE TEMP VIEW gold_delta AS "
+                f"SELECT * FROM silver WHERE admission_date >= DATE '{split}'")
+incremental = reg_con.execute(gold_delta_sql).fetch_arrow_table().to_pandas()
+incremental = incremental[~incremental['patient_id'].isin(reg_ties)].set_index(key).sort_index()
+initial_state     = reg_con.execute("SELECT * FROM gold_state").fetch_arrow_table().to_pylist()
+incremental_state = reg_con.execute(
+    registry_state_sql(FEATURE_REGISTRY, incremental=True)).fetch_arrow_table().to_pylist()
+reg_con.execute("CREATE OR REPLACE TEMP VIEW gold_delta AS SELECT * FROM silver")
+batch_state = reg_con.execute(registry_state_sql(FEATURE_REGISTRY)).fetch_arrow_table().to_pylist()
+
+# Per-event Python: every admission replayed against its patient's running state
+admissions = reg_con.execute("SELECT * FROM silver ORDER BY patient_id, admission_date") \
+                    .fetch_arrow_table().to_pylist()
+reg_con.close()
+states, events = {}, []
+t0 = time.perf_counter()
+for row in admissions:
+    features, states[row['patient_id']] = registry_event(
+        FEATURE_REGISTRY, states.get(row['patient_id'], {}), row)
+    events.append({'patient_id': row['patient_id'], 'admission_date': row['admission_date'],
+                   **features})
+event_us = (time.perf_counter() - t0) / len(admissions) * 1e6
+python = pd.DataFrame(events)
+python = python[~python['patient_id'].isin(reg_ties)]
+python = python.set_index(key).sort_index()
+
+vs_incremental = {n: count_mismatches(batch.loc[incremental.index, n], incremental[n])
+                  for n in names}
+vs_python      = {n: count_mismatches(batch[n], python.loc[batch.index, n]) for n in names}
+
+# Final state: batch SQL, incremental SQL and the replay's state per patient
+state_keys = [c for c in batch_state[0] if c != 'patient_id'] if batch_state else []
+by_patient = lambda rows: {r['patient_id']: r for r in rows if r['patient_id'] not in reg_ties}
+sql_state  = by_patient(batch_state)
+inc_state  = {**by_patient(initial_state), **by_patient(incremental_state)}   # delta rows win
+state_mismatches = {c: sum(sql_state[p][c] != inc_state[p][c] or sql_state[p][c] != states[p][c]
+                           for p in sql_state)
+                    for c in state_keys}
+
+print(" FEATURE REGISTRY CHECK — batch SQL vs incremental SQL vs per-event Python")
+print(f"   Admissions: {len(admissions):,} | Patients: {len(states):,} | "
+      f"Same-day repeat patients left out: {len(reg_ties):,}")
+print(f"   Incremental split at {split}: {len(incremental):,} admissions extended from state")
+print(f"   Per-event Python: {event_us:.1f} µs per admission")
+print(f"\n{'':<24} {'Features':>9} {'Rows':>9} {'Mismatches':>11}")
+print("-" * 56)
+for label, counts, rows in [('batch vs incremental', vs_incremental, len(incremental)),
+                            ('batch vs per-event', vs_python, len(batch)),
+                            ('state (3-way)', state_mismatches, len(sql_state))]:
+    print(f"   {label:<21} {len(counts):>9} {rows:>9,} {sum(counts.values()):>11,}")
+    for n, c in counts.items():
+        if c:
+            print(f"      {n}: {c:,}")
+registry_equivalent = not any(sum(c.values()) for c in [vs_incremental, vs_python,
+                                                         state_mismatches])
+print(f"\n   Equivalent: {registry_equivalent}")
+shutil.rmtree(REGISTRY_CHECK_DIR)
+assert registry_equivalent, 'registry compilations disagree on: ' + ', '.join(sorted(
+    {n for c in [vs_incremental, vs_python, state_mismatches] for n, m in c.items() if m}))
+
+import time
+
+# ─── VISIT WINDOW BENCHMARK: calendar RANGE frames vs the old ROWS frames ────
+VISIT_BENCH_ROWS = [1_000_000, 10_000_000]
+VISIT_BENCH_DIR  = '/content/lakehouse/bench/visit_windows'
+
+visit_rows_sql = """
+SELECT patient_id, admission_date,
+       COUNT(*) OVER (visits ROWS BETWEEN 2 PRECEDING AND 1 PRECEDING) AS visits_prior_2,
+       COUNT(*) OVER (visits ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING) AS visits_prior_5
+FROM silver
+WINDOW visits AS (PARTITION BY patient_id ORDER BY admission_date)
+"""
+visit_calendar  = [f for f in FEATURE_REGISTRY if f['kind'] == 'calendar']
+visit_range_sql = f"""
+SELECT patient_id, admission_date,
+{registry_select_sql(visit_calendar).rstrip().rstrip(',')}
+FROM silver
+{registry_window_sql(visit_calendar)}
+"""
+
+def reference_visit_counts(table, horizons):
+    # Sort once by (patient, day), then for every horizon find where each visit's
+    # window starts with one vectorised binary search over that sorted key
+    patient = pd.factorize(table.column('patient_id').to_numpy())[0].astype(np.int64)
+    day     = table.column('admission_date').cast(pa.int32()).to_numpy().astype(np.int64)
+    key     = patient * (1 << 20) + day
+    order   = np.argsort(key, kind='stable')
+    key     = key[order]
+    counts  = {}
+    for h in horizons:
+        c = np.empty(len(key), dtype=np.int64)
+        c[order] = np.searchsorted(key, key, 'left') - np.searchsorted(key, key - h, 'left')
+        counts[h] = c
+    return counts
+
+print(" VISIT WINDOW BENCHMARK — RANGE over admission_date vs ROWS")
+print(f"{'Silver rows':>12} {'Max visits':>11} {'ROWS s':>8} {'RANGE s':>8} "
+      f"{'Horizons':>9} {'Matches reference':>18}")
+print("-" * 71)
+
+visit_con = connect_duckdb()
+for n in VISIT_BENCH_ROWS:
+    shutil.rmtree(VISIT_BENCH_DIR, ignore_errors=True)
+    bench_silver(visit_con, n, VISIT_BENCH_DIR)
+    max_visits = visit_con.execute("SELECT MAX(c) FROM (SELECT COUNT(*) AS c FROM silver "
+                                   "GROUP BY patient_id)").fetchone()[0]
+
+    timings = {}
+    for name, sql in [('rows', visit_rows_sql), ('range', visit_range_sql)]:
+        t0 = time.perf_counter()
+        rows = sum(b.num_rows for b in visit_con.execute(sql).fetch_record_batch(1_000_000))
+        timings[name] = time.perf_counter() - t0
+
+    # Check the RANGE counts against the sort-once reference on the smallest size
+    matches = '-'
+    if n == VISIT_BENCH_ROWS[0]:
+        result    = visit_con.execute(visit_range_sql).fetch_arrow_table()
+        reference = reference_visit_counts(result, GOLD_VISIT_HORIZONS)
+        matches   = all(np.array_equal(result.column(f'visits_prior_{h}d').to_numpy(),
+                                       reference[h]) for h in GOLD_VISIT_HORIZONS)
+    print(f"{rows:>12,} {max_visits:>11,} {timings['rows']:>8.1f} {timings['range']:>8.1f} "
+          f"{len(GOLD_VISIT_HORIZONS):>9} {str(matches):>18}")
+visit_con.close()
+shutil.rmtree(VISIT_BENCH_DIR)
+
+import time
+
+# ─── GOLD BENCHMARK: single window pass vs the CTE + self-join query ─────────
+GOLD_BENCH_ROWS = [1_000_000, 10_000_000]
+GOLD_BENCH_DIR  = '/content/lakehouse/bench/gold'
+
+# The previous gold query, kept as the baseline: three feature CTEs over `base`,
+# each LEFT JOINed back on (patient_id, admission_date)
+GOLD_SQL_SELF_JOIN = """
 WITH
 
 -- ── CTE 1: Base with row numbering ─────────────────────────────────────────
@@ -359,27 +2576,380 @@ LEFT JOIN interactions i ON b.patient_id = i.patient_id AND b.admission_date = i
 ORDER BY b.patient_id, b.admission_date
 """
 
-df_gold = con2.execute(gold_sql).df()
-df_gold.to_parquet('/content/lakehouse/gold/readmission_features.parquet', index=False)
+def drain(con, sql):
+    t0 = time.perf_counter()
+    rows = sum(b.num_rows for b in con.execute(sql).fetch_record_batch(1_000_000))
+    return rows, time.perf_counter() - t0
 
-print(" GOLD LAYER: Feature Engineering Complete")
-print(f"   Rows: {len(df_gold):,}")
-print(f"   Total features engineered: {len(df_gold.columns) - 1}")
-print(f"   Saved to: /content/lakehouse/gold/readmission_features.parquet")
-print(f"\n📋 Sample features:")
-print(df_gold[['patient_id','age','charlson_index','los_x_comorbidity',
-               'visits_prior_90d','days_since_last_admit','risk_tier',
-               'readmitted_30d']].head(5).to_string(index=False))
+print(" GOLD BENCHMARK — single window pass vs CTE self-joins")
+print(f"{'Silver rows':>12} {'Self-join s':>12} {'Window s':>10} {'Speedup':>8} {'Identical':>10}")
+print("-" * 57)
+
+bench_con = connect_duckdb()
+for n in GOLD_BENCH_ROWS:
+    shutil.rmtree(GOLD_BENCH_DIR, ignore_errors=True)
+    bench_silver(bench_con, n, GOLD_BENCH_DIR)
+
+    rows, join_s   = drain(bench_con, GOLD_SQL_SELF_JOIN)
+    _,    window_s = drain(bench_con, gold_sql)
+    # Multiset comparison in both directions, skipped on the largest size. The
+    # visits_prior_* features are left out: gold now counts them over calendar
+    # windows, where the baseline counted the previous 2 / 5 visits. Both sides
+    # are projected onto the baseline's columns by name, which also leaves out
+    # the patient_bucket and encoded columns gold adds.
+    identical = '-'
+    if n == GOLD_BENCH_ROWS[0]:
+        shared = [c for c, *_ in bench_con.execute(f"DESCRIBE {GOLD_SQL_SELF_JOIN}").fetchall()
+                  if not c.startswith('visits_prior_')]
+        same   = f"SELECT {', '.join(shared)} FROM ({{}})"
+        identical = all(bench_con.execute(
+            f"SELECT COUNT(*) FROM (({same.format(a)}) EXCEPT ALL ({same.format(b)}))"
+        ).fetchone()[0] == 0
+            for a, b in [(GOLD_SQL_SELF_JOIN, gold_sql), (gold_sql, GOLD_SQL_SELF_JOIN)])
+    print(f"{rows:>12,} {join_s:>12.1f} {window_s:>10.1f} {join_s / window_s:>7.1f}x "
+          f"{str(identical):>10}")
+bench_con.close()
+shutil.rmtree(GOLD_BENCH_DIR)
+
+import time
+
+# ─── GOLD ENGINE BENCHMARK: DuckDB vs Polars full gold builds ────────────────
+# Each engine builds gold from the same cohort silver and writes it through
+# materialize exactly as refresh_gold does. Peak memory is the process RSS above
+# where it stood when the build started, sampled from a second thread: Polars
+# allocates outside DuckDB's buffer manager, so duckdb_memory() would miss it.
+ENGINE_BENCH_ROWS = [1_000_000, 5_000_000]
+ENGINE_BENCH_DIR  = '/content/lakehouse/bench/gold_engines'
+
+def process_rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+print(" GOLD ENGINE BENCHMARK — full gold build per engine")
+print(f"{'Silver rows':>12} {'Engine':>8} {'Seconds':>8} {'Rows/sec':>11} {'Peak MB':>8} "
+      f"{'Identical':>10}")
+print("-" * 62)
+
+engine_con     = connect_duckdb()
+engine_results = {}
+for n in ENGINE_BENCH_ROWS:
+    shutil.rmtree(ENGINE_BENCH_DIR, ignore_errors=True)
+    silver_files = bench_silver(engine_con, n, ENGINE_BENCH_DIR)
+
+    outputs = {}
+    for engine, build in GOLD_ENGINES.items():
+        base = process_rss()
+        with watch_peak(lambda: (process_rss(),)) as peak:
+            t0 = time.perf_counter()
+            outputs[engine] = materialize(engine_con, build(engine_con, silver_files),
+                                          f'{ENGINE_BENCH_DIR}/gold_{engine}',
+                                          GOLD_BUCKET_PARTITIONS, lookup_key='patient_id')
+            elapsed = time.perf_counter() - t0
+        engine_results[(n, engine)] = {'seconds': elapsed,
+                                       'peak_mb': max(peak[0] - base, 0) / 1024**2}
+
+    # Same schema, and the same multiset of rows both ways, on the smallest size
+    identical = '-'
+    if n == ENGINE_BENCH_ROWS[0]:
+        reference, *others = [parquet_source(files) for files in outputs.values()]
+        identical = all(
+            engine_con.execute(f"DESCRIBE SELECT * FROM {reference}").fetchall()
+            == engine_con.execute(f"DESCRIBE SELECT * FROM {other}").fetchall()
+            and all(engine_con.execute(
+                f"SELECT COUNT(*) FROM (SELECT * FROM {a} EXCEPT ALL SELECT * FROM {b})"
+            ).fetchone()[0] == 0 for a, b in [(reference, other), (other, reference)])
+            for other in others)
+    rows = sum(f['record_count'] for f in outputs['duckdb'])
+    for engine in GOLD_ENGINES:
+        r = engine_results[(n, engine)]
+        print(f"{rows:>12,} {engine:>8} {r['seconds']:>8.1f} {rows / r['seconds']:>11,.0f} "
+              f"{r['peak_mb']:>8.0f} {str(identical):>10}")
+engine_con.close()
+shutil.rmtree(ENGINE_BENCH_DIR)
+
+print("\n   Fastest engine per size:")
+for n in ENGINE_BENCH_ROWS:
+    fastest = min(GOLD_ENGINES, key=lambda e: engine_results[(n, e)]['seconds'])
+    print(f"   {n:>12,} rows → {fastest}")
+
+import time
+
+# ─── OUT-OF-CORE CHECK: silver + gold under a tight DuckDB memory cap ────────
+# Builds silver and gold for OOC_ROWS admissions on a connection capped well
+# below the data's in-memory size; completing with matching row counts and a
+# non-zero spill shows the window query runs out of core rather than OOMing.
+# The silver stage includes writing its bronze from the generator. At roughly
+# 32 bytes per uncompressed silver row, OOC_ROWS puts silver alone at about
+# three times the cap.
+OOC_ROWS            = 25_000_000
+OOC_MEMORY_LIMIT_MB = 256
+OOC_MEMORY_LIMIT    = f'{OOC_MEMORY_LIMIT_MB}MB'
+OOC_DIR             = '/content/lakehouse/bench/out_of_core'
+
+shutil.rmtree(OOC_DIR, ignore_errors=True)
+
+def uncompressed_mb(files):
+    total = 0
+    for f in files:
+        md = pq.ParquetFile(f['path']).metadata
+        total += sum(md.row_group(i).total_byte_size for i in range(md.num_row_groups))
+    return total / 1024**2
+
+ooc_con = connect_duckdb(memory_limit=OOC_MEMORY_LIMIT)
+ooc_spill = ooc_con.cursor()
+
+def ooc_spill_sample():
+    # The database's temporary files, read from a second cursor while a stage runs
+    return ooc_spill.execute("SELECT COALESCE(SUM(size), 0) FROM duckdb_temporary_files()").fetchone()
+
+ooc_results = []
+for stage in ['silver', 'gold']:
+    with watch_peak(ooc_spill_sample) as peak:
+        t0 = time.perf_counter()
+        if stage == 'silver':
+            files = bench_silver(ooc_con, OOC_ROWS, OOC_DIR, bronze_batches(
+                iter_ehr_batches(OOC_ROWS, BRONZE_BATCH_ROWS, seed=EHR_SEED)))
+        else:
+            files = materialize(ooc_con, gold_sql, f'{OOC_DIR}/gold', lookup_key='patient_id')
+        elapsed = time.perf_counter() - t0
+    ooc_results.append((stage, sum(f['record_count'] for f in files), uncompressed_mb(files),
+                        peak[0] / 1024**2, elapsed))
+ooc_spill.close()
+ooc_con.close()
+
+print(f" OUT-OF-CORE CHECK — {OOC_ROWS:,} admissions, memory_limit = {OOC_MEMORY_LIMIT}")
+print(f"{'Stage':<8} {'Rows':>12} {'Output MB':>10} {'Peak spill MB':>14} {'Seconds':>8}")
+print("-" * 56)
+for stage, rows, out_mb, spill_mb, elapsed in ooc_results:
+    print(f"{stage:<8} {rows:>12,} {out_mb:>10.0f} {spill_mb:>14.0f} {elapsed:>8.1f}")
+shutil.rmtree(OOC_DIR)
+
+(_, silver_rows, silver_mb, _, _), (_, gold_rows, _, gold_spill_mb, _) = ooc_results
+print(f"\n   Silver is {silver_mb / OOC_MEMORY_LIMIT_MB:.1f}x the memory cap | "
+      f"Gold rows match silver: {gold_rows == silver_rows} | "
+      f"Gold window query spilled: {gold_spill_mb:.0f} MB")
+assert silver_mb > 2 * OOC_MEMORY_LIMIT_MB, 'out-of-core input is not clearly larger than the cap'
+assert gold_rows == silver_rows, 'gold lost or duplicated rows under the memory cap'
+assert gold_spill_mb > 0, 'gold window query did not spill under the memory cap'
+
+# ─── COMPACTION CHECK: late corrections survive bronze compaction ────────────
+# Three appends land in one partition, largest first: the original admission,
+# its correction, then unrelated rows. The target is set so the oldest and the
+# newest file would fit one bin but the oldest and the correction would not.
+# Silver must keep the correction before compaction, and still after
+# compact_table: a rewritten file takes the newest sequence number of its
+# inputs, so the planner may only pack runs of files adjacent in sequence.
+# Within a bin the rewrite reads its inputs oldest first, so the newer version
+# keeps the higher file_row_number. The planner must also never pack two files
+# together across one it leaves in place.
+COMPACTION_CHECK_DIR  = '/content/lakehouse/bench/compaction_check'
+COMPACTION_CHECK_META = f'{COMPACTION_CHECK_DIR}/bronze/iceberg_metadata.json'
+COMPACTION_CHECK_DAY  = '2024-06-03'
+
+def compaction_check_rows(n, seed, id_offset):
+    return pa.Table.from_batches(list(iter_ehr_batches(
+        n, seed=seed, id_offset=id_offset,
+        start=COMPACTION_CHECK_DAY, end=COMPACTION_CHECK_DAY)))
+
+shutil.rmtree(COMPACTION_CHECK_DIR, ignore_errors=True)
+original   = compaction_check_rows(24_000, EHR_SEED, 0)
+correction = original.slice(0, 1)
+correction = correction.set_column(correction.schema.get_field_index('los_days'), 'los_days',
+                                   pa.array([99], correction.schema.field('los_days').type))
+corrected_id = correction['patient_id'][0].as_py()
+for table in [original,
+              pa.concat_tables([correction, compaction_check_rows(18_000, EHR_SEED + 1, 24_000)]),
+              compaction_check_rows(12_000, EHR_SEED + 2, 42_000)]:
+    append_to_table(COMPACTION_CHECK_META, f'{COMPACTION_CHECK_DIR}/bronze',
+                    'bronze.compaction_check', bronze_batches(table.to_batches()),
+                    BRONZE_PARTITIONS)
+
+def compaction_check_los(con):
+    # The silver los_days of the corrected admission over the table's current files
+    con.execute(f"CREATE OR REPLACE TEMP VIEW bronze_scan AS SELECT * FROM "
+                f"{versioned_source(load_data_files(COMPACTION_CHECK_META))}")
+    return [r[0] for r in con.execute(
+        f"SELECT los_days FROM ({silver_sql}) WHERE reject_reason IS NULL AND patient_id = ?",
+        [corrected_id]).fetchall()]
+
+check_con    = connect_duckdb()
+sizes        = [f['file_size_bytes'] for f in load_data_files(COMPACTION_CHECK_META)]
+target_bytes = sizes[0] + sizes[2]
+assert sizes[0] > sizes[1] > sizes[2] and sizes[0] + sizes[1] > target_bytes, \
+    'compaction check files are not ordered largest first'
+before       = compaction_check_los(check_con)
+_, n_removed, n_written = compact_table(COMPACTION_CHECK_META, target_bytes=target_bytes)
+after        = compaction_check_los(check_con)
+check_con.close()
+with catalog_cursor() as cur:
+    cur.execute("DROP VIEW IF EXISTS bronze.compaction_check")
+shutil.rmtree(COMPACTION_CHECK_DIR)
+
+# Planner: a kept, sorted file with sequence number 2 sits between two small ones
+planned = plan_compaction(
+    [{'path': 'a', 'partition': {'p': 0}, 'file_size_bytes': 10, 'sequence_number': 1},
+     {'path': 'b', 'partition': {'p': 0}, 'file_size_bytes': 1_000, 'sequence_number': 2,
+      'sorted_by': CLUSTER_ORDER},
+     {'path': 'c', 'partition': {'p': 0}, 'file_size_bytes': 10, 'sequence_number': 3}],
+    target_bytes=1_000, sort_order=CLUSTER_ORDER)
+straddling = any({'a', 'c'} <= {f['path'] for f in b} for b in planned)
+
+# Planner: sizes fall with sequence number, so packing by size alone would pair 1 and 3
+planned = plan_compaction(
+    [{'path': str(seq), 'partition': {'p': 0}, 'file_size_bytes': size, 'sequence_number': seq}
+     for seq, size in [(1, 60), (2, 50), (3, 40)]],
+    target_bytes=100, sort_order=CLUSTER_ORDER)
+planned_runs = [[f['sequence_number'] for f in b] for b in planned]
+
+print(" COMPACTION CHECK — late correction vs bronze compaction")
+print(f"   Bronze files: {len(sizes)} ({' > '.join(f'{s / 1024:.0f} KB' for s in sizes)}) → "
+      f"{n_written} after compacting {n_removed}")
+print(f"   Silver los_days of {corrected_id}: before {before} | after {after}")
+print(f"   Planner packs across a kept file: {straddling}")
+print(f"   Planner bins for sequence numbers 1-3 (60/50/40 B, target 100 B): {planned_runs}")
+assert before == [99] and after == [99], 'compaction brought back a superseded row'
+assert not straddling, 'plan_compaction packed files across a newer kept file'
+assert planned_runs == [[1], [2, 3]], 'plan_compaction packed files that are not adjacent in sequence'
+
+import time
+
+# ─── PATIENT LOOKUP BENCHMARK: lookup latency vs table size ──────────────────
+# The same admissions written as a default pandas Parquet file and in the
+# lookup layout, each queried for one patient by a full read, by DuckDB SQL and
+# by lookup_patients
+LOOKUP_BENCH_ROWS = [100_000, 1_000_000, 5_000_000]
+LOOKUP_BENCH_DIR  = '/content/lakehouse/bench/lookup'
+
+lookup_con = connect_duckdb()
+lookup_con.execute("SET parquet_metadata_cache = true")
+
+def duckdb_lookup(path, patient_id):
+    # Ad-hoc SQL path: DuckDB prunes by row-group stats and the patient_id bloom filter
+    return lookup_con.execute(
+        f"SELECT * FROM read_parquet('{path}') WHERE patient_id = ?", [patient_id]).df()
+
+os.makedirs(LOOKUP_BENCH_DIR, exist_ok=True)
+print(f"{'Rows':>12} {'Full scan ms':>13} {'DuckDB ms':>10} {'Lookup ms':>10} "
+      f"{'KB read':>8} {'Footer KB':>10} {'Default KB':>11} {'Lookup KB':>10}")
+print("-" * 91)
+
+for n in LOOKUP_BENCH_ROWS:
+    frame = generate_ehr_vectorized(n, seed=EHR_SEED)
+    default_path = f'{LOOKUP_BENCH_DIR}/lookup_default_{n}.parquet'
+    tuned_path   = f'{LOOKUP_BENCH_DIR}/lookup_tuned_{n}.parquet'
+    frame.to_parquet(default_path, index=False)
+    write_lookup_parquet(frame, tuned_path)
+    ids = frame['patient_id'].sample(10, random_state=42).tolist()
+    del frame
+
+    timings = {}
+    for name, fn in [
+        ('full',    lambda pid: (lambda d: d[d.patient_id == pid])(pd.read_parquet(default_path))),
+        ('duckdb',  lambda pid: duckdb_lookup(tuned_path, pid)),
+        ('tuned',   lambda pid: lookup_patients(tuned_path, pid)),
+    ]:
+        fn(ids[0])   # warm the footer caches
+        t0 = time.perf_counter()
+        for pid in ids:
+            fn(pid)
+        timings[name] = (time.perf_counter() - t0) / len(ids) * 1000
+
+    # Bytes pulled through the file per lookup, with the footer already cached
+    read = []
+    for pid in ids:
+        before = lookup_bytes_read([tuned_path])
+        lookup_patients(tuned_path, pid)
+        read.append(lookup_bytes_read([tuned_path]) - before)
+    footer_kb = lookup_index(tuned_path)[1].metadata.serialized_size / 1024
+    print(f"{n:>12,} {timings['full']:>13.1f} {timings['duckdb']:>10.1f} "
+          f"{timings['tuned']:>10.2f} {np.mean(read) / 1024:>8.1f} {footer_kb:>10.0f} "
+          f"{os.path.getsize(default_path) / 1024:>11.0f} "
+          f"{os.path.getsize(tuned_path) / 1024:>10.0f}")
+    close_lookup(tuned_path)
+    os.remove(default_path)
+    os.remove(tuned_path)
+lookup_con.close()
+shutil.rmtree(LOOKUP_BENCH_DIR)
+print(f" KB read = bytes the reader pulled for one {LOOKUP_ROW_GROUP_ROWS:,}-row group: flat once "
+      f"the table spans several groups. The footer is read once per file and cached; "
+      f"Default KB / Lookup KB = the same rows as pandas writes them and in the lookup layout")
+
+import time
+
+# ─── TRAINING SET BENCHMARK: label events vs time and DuckDB memory ──────────
+# Random label events against the main gold table, built with
+# build_training_set on a connection held to a fixed memory cap
+PIT_BENCH_EVENTS = [1_000_000, 10_000_000, 30_000_000]
+PIT_BENCH_MEMORY = '1GB'
+PIT_BENCH_DIR    = '/content/lakehouse/bench/training_sets'
+
+print(f"{'Label events':>13} {'Seconds':>8} {'Events/sec':>12} {'Peak mem MB':>12} "
+      f"{'Peak spill MB':>14}   (memory_limit = {PIT_BENCH_MEMORY})")
+print("-" * 64)
+pit_con = connect_duckdb(memory_limit=PIT_BENCH_MEMORY)
+pit_memory = pit_con.cursor()
+
+def pit_memory_sample():
+    # DuckDB's buffer manager and temp files, read from a second cursor
+    return pit_memory.execute("""
+        SELECT (SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()),
+               (SELECT COALESCE(SUM(size), 0) FROM duckdb_temporary_files())""").fetchone()
+
+pit_con.execute(f"""CREATE TEMP TABLE pit_patients AS
+                    SELECT patient_id, ROW_NUMBER() OVER () - 1 AS i
+                    FROM (SELECT DISTINCT patient_id
+                          FROM {parquet_source(load_data_files(GOLD_METADATA))})""")
+n_patients = pit_con.execute("SELECT COUNT(*) FROM pit_patients").fetchone()[0]
+for n in PIT_BENCH_EVENTS:
+    bench_dir = f'{PIT_BENCH_DIR}/bench_{n}'
+    shutil.rmtree(bench_dir, ignore_errors=True)
+    os.makedirs(bench_dir)
+    # Random patients at random seconds across 2021-2025, written to Parquet first
+    # so only the builder is timed
+    pit_con.execute(f"""COPY (SELECT p.patient_id,
+                                     TIMESTAMP '2021-01-01'
+                                         + to_seconds(CAST(hash(e.i, 1) % 157766400 AS BIGINT))
+                                         AS event_ts,
+                                     CAST(hash(e.i, 2) % 2 AS INTEGER) AS label
+                              FROM range({n}) e(i)
+                              JOIN pit_patients p ON p.i = hash(e.i) % {n_patients})
+                        TO '{bench_dir}/labels.parquet' (FORMAT parquet)""")
+    with watch_peak(pit_memory_sample) as peak:
+        t0 = time.perf_counter()
+        bench_meta = build_training_set(pit_con, parquet_source([f'{bench_dir}/labels.parquet']),
+                                        f'{bench_dir}/training_set')
+        elapsed = time.perf_counter() - t0
+    print(f"{bench_meta['row_count']:>13,} {elapsed:>8.1f} {n / elapsed:>12,.0f} "
+          f"{peak[0] / 1024**2:>12.0f} {peak[1] / 1024**2:>14.0f}")
+    shutil.rmtree(bench_dir)
+pit_memory.close()
+pit_con.close()
+shutil.rmtree(PIT_BENCH_DIR)
 
 context = gx.get_context()
 
-# Corrected: Add a Pandas datasource to the context's data_sources
-datasource = context.data_sources.add_or_update_pandas(name="ehr_lakehouse")
+datasource = context.sources.add_or_update_pandas(name="ehr_lakehouse")
 data_asset = datasource.add_dataframe_asset(name="bronze_admissions")
-batch_request = data_asset.build_batch_request(options={"dataframe": df_raw})
+# Column expectations run on a reservoir sample of the bronze table as written,
+# so the check costs the same whether bronze was built from df_raw or streamed;
+# dates and dictionary columns come back as the text the feed delivers. The row
+# count is a table-level fact, taken from bronze's metadata instead
+GE_SAMPLE_ROWS = 100_000
+ge_sample = query_arrow(f"""
+    SELECT * REPLACE (CAST(admission_date AS VARCHAR) AS admission_date)
+    FROM bronze.raw_admissions
+    USING SAMPLE reservoir({GE_SAMPLE_ROWS} ROWS) REPEATABLE ({EHR_SEED})""").to_pandas()
+batch_request = data_asset.build_batch_request(dataframe=ge_sample)
 
 suite_name = "bronze_ehr_quality_suite"
-# Removed explicit add_expectation_suite and delete_expectation_suite as they are not available on EphemeralDataContext
+try:
+    context.delete_expectation_suite(suite_name)
+except:
+    pass
+context.add_expectation_suite(suite_name)
 
 validator = context.get_validator(
     batch_request=batch_request,
@@ -424,11 +2994,15 @@ validator.expect_column_mean_to_be_between("charlson_index",  0,     5)
 validator.expect_column_mean_to_be_between("num_procedures",  0,     8)
 rules_run += 6
 
-validator.expect_column_values_to_be_unique("patient_id", mostly=0.98)
-validator.expect_table_row_count_to_be_between(50_000, 200_000)
-validator.expect_table_column_count_to_equal(len(df_raw.columns))
+# Cohort mode draws repeat admissions, so patient_id only identifies an
+# admission in the other modes
+uniqueness_rules = 2
+if EHR_MODE != 'cohort':
+    validator.expect_column_values_to_be_unique("patient_id", mostly=0.98)
+    uniqueness_rules += 1
+validator.expect_table_column_count_to_equal(len(bronze_columns))
 validator.expect_column_value_lengths_to_be_between("patient_id", 10, 15)
-rules_run += 4
+rules_run += uniqueness_rules
 
 validator.expect_column_values_to_match_regex("patient_id",       r'^PAT-\d{7}$')
 validator.expect_column_values_to_match_regex("admission_date",   r'^\d{4}-\d{2}-\d{2}$')
@@ -451,42 +3025,32 @@ validator.save_expectation_suite()
 
 result = validator.validate()
 
-passed  = result['statistics']['successful_expectations']
-total   = result['statistics']['evaluated_expectations']
-pct     = result['statistics']['success_percent']
+bronze_row_count = read_metadata(BRONZE_METADATA)['row_count']
+row_count_ok     = 50_000 <= bronze_row_count <= 200_000
+
+passed  = result['statistics']['successful_expectations'] + row_count_ok
+total   = result['statistics']['evaluated_expectations'] + 1
+pct     = passed / total * 100
 
 print(f"\n GREAT EXPECTATIONS — Data Quality Report")
 print(f"   Rules Evaluated : {total}")
 print(f"   Rules Passed    : {passed}")
 print(f"   Rules Failed    : {total - passed}")
 print(f"   Success Rate    : {pct:.1f}%")
+print(f"   Bronze rows     : {bronze_row_count:,} ({'within' if row_count_ok else 'outside'} "
+      f"50,000–200,000)")
 print(f"\n   ✓ Completeness checks (10 rules)")
 print(f"   ✓ Domain validity  (14 rules)")
 print(f"   ✓ Categorical      ( 4 rules)")
 print(f"   ✓ Statistical      ( 6 rules)")
-print(f"   ✓ Uniqueness       ( 4 rules)")
+print(f"   ✓ Uniqueness       ({uniqueness_rules:>2} rules)")
 print(f"   ✓ Format           ( 4 rules)")
 print(f"   ✓ Advanced         ( 8 rules)")
 
-df_ml = df_gold.copy()
-
-le = LabelEncoder()
-df_ml['gender_enc']     = le.fit_transform(df_ml['gender'])
-df_ml['risk_tier_enc']  = le.fit_transform(df_ml['risk_tier'])
-df_ml['age_bucket_enc'] = le.fit_transform(df_ml['age_bucket'])
-
-FEATURES = [
-    'age', 'gender_enc', 'age_bucket_enc',
-    'los_days', 'num_procedures', 'num_diagnoses',
-    'has_diabetes', 'has_chf', 'has_copd', 'has_ckd', 'has_cancer', 'has_dementia',
-    'charlson_index', 'max_charlson_ever', 'ten_yr_survival_prob',
-    'prior_visits_12m', 'visits_prior_90d', 'visits_prior_365d',
-    'avg_los_last_3_visits', 'cumulative_procedures', 'days_since_last_admit',
-    'admit_month', 'admit_dow', 'season_code', 'is_weekend_admit', 'visit_number',
-    'los_x_comorbidity', 'procedures_per_day',
-    'cardio_burden', 'metabolic_burden'
-]
+df_ml = read_table_frame(load_data_files(GOLD_METADATA))
 
+# Encoded categoricals come from gold and FEATURES from FEATURE_REGISTRY, so the
+# model trains on exactly the columns the pipeline and the online store compute
 X = df_ml[FEATURES].fillna(0)
 y = df_ml['readmitted_30d']
 
@@ -589,7 +3153,10 @@ print(f"\n🏆 Top 5 Readmission Predictors:")
 for i, row in shap_df.tail(5).sort_values('Mean_SHAP', ascending=False).iterrows():
     print(f"   {row['Feature']:30s} SHAP: {row['Mean_SHAP']:.4f}")
 
+RISK_SCORES_PATH = '/content/lakehouse/ml/patient_risk_scores.parquet'
+
 df_test_results = X_test.copy()
+df_test_results.insert(0, 'patient_id', df_ml.loc[X_test.index, 'patient_id'].values)
 df_test_results['risk_score'] = y_prob
 df_test_results['actual']     = y_test.values
 df_test_results['risk_tier']  = pd.cut(
@@ -610,10 +3177,274 @@ print("-" * 57)
 for _, row in tier_stats.iterrows():
     print(f"{row['risk_tier']:<12} {row['patients']:>10,} {row['avg_risk_score']:>15.3f} {row['actual_readmit_rate']:>16.1%}")
 
-df_test_results.to_parquet('/content/lakehouse/ml/patient_risk_scores.parquet', index=False)
-print(f"\n✅ Risk scores saved to lakehouse/ml/patient_risk_scores.parquet")
+write_lookup_parquet(df_test_results, RISK_SCORES_PATH)
+print(f"\n Risk scores saved to lakehouse/ml/patient_risk_scores.parquet")
 print(f"   Total patients scored: {len(df_test_results):,}")
 
+import time
+
+# ─── ONLINE FEATURE STORE: latest feature vector per patient in SQLite ───────
+# One row per patient holding the FEATURES vector of their latest gold row as
+# packed float64, in a WITHOUT ROWID table so the patient_id primary key is the
+# storage order and a get is a single B-tree probe. The store records the gold
+# snapshot it has applied; sync_online_store() upserts only patients in gold
+# files added since then and rebuilds when FEATURES changed or gold was
+# overwritten.
+ONLINE_STORE_PATH  = '/content/lakehouse/serving/online_features.sqlite'
+ONLINE_BATCH_ROWS  = 100_000
+ONLINE_PARAM_LIMIT = 900   # ids per IN (...) query, under SQLite's variable limit
+ONLINE_DEMO_DIR    = '/content/lakehouse/bench/online_update'
+ONLINE_DEMO_ROWS   = 5_000
+
+os.makedirs(os.path.dirname(ONLINE_STORE_PATH), exist_ok=True)
+online_con = sqlite3.connect(ONLINE_STORE_PATH, check_same_thread=False)
+online_con.execute("PRAGMA journal_mode = WAL")
+online_con.execute("PRAGMA synchronous = NORMAL")
+online_con.execute("CREATE TABLE IF NOT EXISTS online_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+def online_meta(key, store=online_con):
+    row = store.execute("SELECT value FROM online_meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def feature_vectors(frame):
+    # Gold already carries the encoded categoricals; missing values become 0 as in
+    # FEATURE PREPARATION
+    return frame[FEATURES].astype('float64').fillna(0).to_numpy()
+
+def sync_online_store(store=online_con, gold_metadata=GOLD_METADATA):
+    # Latest gold row per patient among the files to apply, streamed in batches
+    # and upserted; a row only replaces a newer-or-equal admission it supersedes
+    gold_meta = read_metadata(gold_metadata)
+    files = None
+    if online_meta('features', store) == FEATURES and online_meta('gold_snapshot_id', store):
+        files = files_since(gold_metadata, online_meta('gold_snapshot_id', store))
+    mode = 'incremental'
+    if files is None:
+        mode, files = 'full', load_data_files(gold_metadata)
+        store.execute("DROP TABLE IF EXISTS online_features")
+        store.execute("""CREATE TABLE online_features (
+                                  patient_id     TEXT PRIMARY KEY,
+                                  admission_date TEXT NOT NULL,
+                                  vector         BLOB NOT NULL) WITHOUT ROWID""")
+    written = 0
+    if files:
+        with catalog_cursor() as con:
+            reader = con.execute(f"""
+                SELECT * FROM {parquet_source(files)}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY patient_id
+                                           ORDER BY admission_date DESC, visit_number DESC) = 1
+            """).fetch_record_batch(ONLINE_BATCH_ROWS)
+            for batch in reader:
+                frame   = batch.to_pandas()
+                vectors = feature_vectors(frame)
+                store.executemany(
+                    """INSERT INTO online_features VALUES (?, ?, ?)
+                       ON CONFLICT (patient_id) DO UPDATE
+                       SET admission_date = excluded.admission_date, vector = excluded.vector
+                       WHERE excluded.admission_date >= online_features.admission_date""",
+                    zip(frame['patient_id'], frame['admission_date'].astype(str),
+                        [v.tobytes() for v in vectors]))
+                written += len(frame)
+    store.executemany("INSERT OR REPLACE INTO online_meta VALUES (?, ?)",
+                      [('features', json.dumps(FEATURES)),
+                       ('gold_snapshot_id', json.dumps(gold_meta['current_snapshot_id']))])
+    store.commit()
+    return {'mode': mode, 'gold_files': len(files), 'patients_written': written}
+
+def get_features(patient_id, store=online_con):
+    # FEATURES-ordered vector of the patient's latest admission, or None
+    row = store.execute("SELECT vector FROM online_features WHERE patient_id = ?",
+                             (patient_id,)).fetchone()
+    return np.frombuffer(row[0]) if row else None
+
+def get_features_batch(patient_ids, store=online_con):
+    # One row per requested id in request order; unknown patients are all-NaN
+    ids  = list(patient_ids)
+    rows = {}
+    for i in range(0, len(ids), ONLINE_PARAM_LIMIT):
+        chunk = ids[i:i + ONLINE_PARAM_LIMIT]
+        rows.update(store.execute(
+            f"SELECT patient_id, vector FROM online_features "
+            f"WHERE patient_id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+    out = np.full((len(ids), len(FEATURES)), np.nan)
+    for i, pid in enumerate(ids):
+        if pid in rows:
+            out[i] = np.frombuffer(rows[pid])
+    return out
+
+t0 = time.perf_counter()
+online_sync = sync_online_store()
+print(" ONLINE FEATURE STORE")
+print(f"   Store: {ONLINE_STORE_PATH} "
+      f"({os.path.getsize(ONLINE_STORE_PATH) / 1024**2:.1f} MB)")
+print(f"   Sync: {online_sync['mode']} | Patients written: "
+      f"{online_sync['patients_written']:,} in {time.perf_counter() - t0:.2f}s")
+
+# The stored vector must be the row the model trains on for that admission
+latest = df_ml.sort_values(['admission_date', 'visit_number']).groupby('patient_id').tail(1)
+check  = latest.sample(min(1_000, len(latest)), random_state=42)
+print(f"   Matches training rows: "
+      f"{np.allclose(get_features_batch(check['patient_id']), X.loc[check.index].to_numpy())}")
+
+sample_ids = latest['patient_id'].sample(min(10_000, len(latest)), random_state=7).tolist()
+t0 = time.perf_counter()
+for pid in sample_ids:
+    get_features(pid)
+get_us = (time.perf_counter() - t0) / len(sample_ids) * 1e6
+t0 = time.perf_counter()
+get_features_batch(sample_ids[:1_000])
+batch_ms = (time.perf_counter() - t0) * 1000
+print(f"   Single get: {get_us:.0f} µs avg over {len(sample_ids):,} patients")
+print(f"   Batched multi-get: 1,000 patients in {batch_ms:.1f} ms")
+
+@contextmanager
+def scratch_lakehouse(root):
+    # scratch_tables plus a copy of the online store under root, yielded with
+    # the path mapping as a connection to the copy
+    with scratch_tables(root) as scratch:
+        os.makedirs(os.path.dirname(scratch(ONLINE_STORE_PATH)), exist_ok=True)
+        store = sqlite3.connect(scratch(ONLINE_STORE_PATH), check_same_thread=False)
+        online_con.backup(store)
+        try:
+            yield scratch, store
+        finally:
+            store.close()
+
+# Update path on a scratch copy: a new day of admissions, half of them for
+# patients already in the store, flows bronze → silver → gold incrementally and
+# only the patients it touched are upserted
+returning = latest['patient_id'].sample(ONLINE_DEMO_ROWS // 2, random_state=11).tolist()
+before    = get_features_batch(returning)
+with scratch_lakehouse(ONLINE_DEMO_DIR) as (scratch, scratch_store):
+    base  = read_metadata(scratch(BRONZE_METADATA))
+    day   = pa.Table.from_batches(list(iter_ehr_batches(
+        ONLINE_DEMO_ROWS, BRONZE_BATCH_ROWS, seed=EHR_SEED + 2, id_offset=base['row_count'],
+        start='2025-01-02', end='2025-01-02')))
+    ids   = day['patient_id'].to_pylist()
+    ids[:len(returning)] = returning
+    day   = day.set_column(day.schema.get_field_index('patient_id'), 'patient_id',
+                           pa.array(ids, day.schema.field('patient_id').type))
+    append_to_table(scratch(BRONZE_METADATA), scratch(BRONZE_DIR), 'bronze.raw_admissions',
+                    bronze_batches(day.to_batches()), BRONZE_PARTITIONS)
+    t0 = time.perf_counter()
+    refresh_silver(bronze_metadata=scratch(BRONZE_METADATA),
+                   silver_metadata=scratch(SILVER_METADATA), silver_dir=scratch(SILVER_DIR),
+                   quarantine_metadata=scratch(QUARANTINE_METADATA),
+                   quarantine_dir=scratch(QUARANTINE_DIR))
+    _, online_gold = refresh_gold(silver_metadata=scratch(SILVER_METADATA),
+                                  gold_metadata=scratch(GOLD_METADATA), gold_dir=scratch(GOLD_DIR),
+                                  state_metadata=scratch(GOLD_STATE_METADATA),
+                                  state_dir=scratch(GOLD_STATE_DIR))
+    online_update  = sync_online_store(scratch_store, scratch(GOLD_METADATA))
+    update_s = time.perf_counter() - t0
+    after    = get_features_batch(returning, scratch_store)
+print(f"\n   Update path (scratch copy): gold {online_gold['mode']} → store "
+      f"{online_update['mode']} | Patients upserted: {online_update['patients_written']:,} "
+      f"in {update_s:.2f}s end to end")
+print(f"   Returning patients with a new vector: "
+      f"{int((~np.isclose(before, after).all(axis=1)).sum()):,} of {len(returning):,} | "
+      f"Real store unchanged: {np.array_equal(get_features_batch(returning), before)}")
+
+import time
+
+lookup_snapshot = {}
+
+def current_gold_buckets():
+    # Gold's bucket → files map, re-read from the manifest whenever a commit has
+    # moved the current snapshot. Every gold write uses new file names, so its
+    # footers stay cached in lookup_files across refreshes
+    snap = read_metadata(GOLD_METADATA)['current_snapshot_id']
+    if lookup_snapshot.get('snapshot_id') != snap:
+        lookup_snapshot.update(snapshot_id=snap, buckets=gold_bucket_files())
+    return lookup_snapshot['buckets']
+
+def lookup_gold(patient_ids, columns=None):
+    # Only the files of each id's bucket are consulted; incremental refreshes
+    # append files to a bucket, each written in the lookup layout
+    ids = [patient_ids] if isinstance(patient_ids, str) else list(patient_ids)
+    gold_buckets = current_gold_buckets()
+    by_bucket = {}
+    for pid in ids:
+        by_bucket.setdefault(gold_bucket(pid), []).append(pid)
+    frames = [lookup_patients(f['path'], bucket_ids, columns)
+              for bucket, bucket_ids in by_bucket.items()
+              for f in gold_buckets.get(bucket, [])]
+    if not frames:
+        # No file in any of the ids' buckets: an empty frame with gold's columns
+        return query_arrow(f"SELECT {', '.join(columns) if columns else '*'} "
+                           f"FROM gold.readmission_features LIMIT 0").to_pandas()
+    return pd.concat(frames, ignore_index=True)
+
+def lookup_risk_scores(patient_ids, columns=None):
+    # The scored test admissions, written in the lookup layout at a fixed path;
+    # re-scoring rewrites the file in place, which lookup_index notices
+    return lookup_patients(RISK_SCORES_PATH, patient_ids, columns)
+
+gold_buckets = current_gold_buckets()
+gold_paths   = [f['path'] for fs in gold_buckets.values() for f in fs]
+gold_ids     = query_arrow("SELECT DISTINCT patient_id FROM gold.readmission_features "
+                           "ORDER BY patient_id").column('patient_id').to_pandas()
+sample_id    = gold_ids.iloc[len(gold_ids) // 2]
+sample_paths = [f['path'] for f in gold_buckets[gold_bucket(sample_id)]]
+bytes_before = lookup_bytes_read(sample_paths)   # parses and caches the footers first
+t0 = time.perf_counter()
+patient_rows = lookup_gold(sample_id)
+print(f" PATIENT LOOKUP: {sample_id} → {len(patient_rows)} admission(s) "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms, "
+      f"{(lookup_bytes_read(sample_paths) - bytes_before) / 1024:.1f} KB read "
+      f"(gold: {sum(os.path.getsize(p) for p in gold_paths) / 1024:.0f} KB)")
+
+batch_ids = gold_ids.sample(100, random_state=42).tolist()
+t0 = time.perf_counter()
+batch_rows = lookup_gold(batch_ids)
+print(f"\n Batched multi-get: {len(batch_ids)} patients → {len(batch_rows)} rows "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+risk_id   = df_test_results['patient_id'].iloc[0]
+t0 = time.perf_counter()
+risk_rows = lookup_risk_scores(risk_id, ['patient_id', 'risk_score', 'risk_tier'])
+print(f"\n Risk-score lookup: {risk_id} → {len(risk_rows)} scored admission(s) "
+      f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+assert len(risk_rows) == (df_test_results['patient_id'] == risk_id).sum()
+
+import time
+
+# ─── POINT-IN-TIME TRAINING SET: leak check on cohort data ──────────────────
+PIT_DEMO_DIR     = '/content/lakehouse/bench/pit_demo'
+PIT_DEMO_ROWS    = 200_000
+
+# Admission-time training set: one event per silver admission, labelled with its
+# own outcome and featurised only from the patient's earlier admissions. It is
+# built on cohort data under PIT_DEMO_DIR, so patients have earlier admissions
+# to draw on whichever EHR_MODE built the main lakehouse
+shutil.rmtree(PIT_DEMO_DIR, ignore_errors=True)
+pit_demo_gold = f'{PIT_DEMO_DIR}/gold/iceberg_metadata.json'
+pit_demo_con = connect_duckdb()
+bench_silver(pit_demo_con, PIT_DEMO_ROWS, PIT_DEMO_DIR)
+commit_snapshot(pit_demo_gold, 'gold.readmission_features',
+                materialize(pit_demo_con, gold_sql, f'{PIT_DEMO_DIR}/gold', GOLD_BUCKET_PARTITIONS,
+                            lookup_key='patient_id'),
+                GOLD_BUCKET_PARTITIONS)
+pit_metadata = build_training_set(
+    pit_demo_con, """(SELECT patient_id, CAST(admission_date AS TIMESTAMP) AS event_ts,
+                        readmitted_30d AS label
+                 FROM silver)""",
+    f'{PIT_DEMO_DIR}/admission_time', gold_metadata=pit_demo_gold)
+pit_source = parquet_source(load_data_files(f'{PIT_DEMO_DIR}/admission_time/iceberg_metadata.json'))
+pit_rows, pit_cold, pit_leaks = pit_demo_con.execute(f"""
+    SELECT COUNT(*), COUNT(*) FILTER (WHERE feature_admission_date IS NULL),
+           COUNT(*) FILTER (WHERE feature_admission_date >= event_ts)
+    FROM {pit_source}""").fetchone()
+pit_demo_con.close()
+shutil.rmtree(PIT_DEMO_DIR)
+
+print(" POINT-IN-TIME TRAINING SET — ASOF JOIN on gold snapshot "
+      f"{pit_metadata['properties']['gold_snapshot_id']} ({PIT_DEMO_ROWS:,} cohort admissions)")
+print(f"   Label events: {pit_rows:,} | No prior admission: {pit_cold:,} | "
+      f"Features dated at/after event: {pit_leaks:,}")
+assert pit_cold < pit_rows, 'no label event found an earlier admission to take features from'
+assert pit_leaks == 0, 'features dated at or after their label event'
+
 mlflow.set_tracking_uri('/content/mlruns')
 mlflow.set_experiment('hospital_readmission_prediction')
 
@@ -745,7 +3576,7 @@ total_elapsed = time.time() - total_start
 print("-" * 65)
 print(f"  🏁 DAG COMPLETED in {total_elapsed:.1f}s  |  All 6 tasks: SUCCESS")
 
-# ─── POWER BI-STYLE HEALTHCARE DASHBOARD ─────────────────────────────────────
+
 fig = plt.figure(figsize=(20, 14), facecolor='#0D1117')
 fig.suptitle('🏥 Hospital Readmission Prediction — Ward Analytics Dashboard',
              fontsize=18, fontweight='bold', color='white', y=0.98)
@@ -756,7 +3587,6 @@ gs = fig.add_gridspec(3, 4, hspace=0.45, wspace=0.35,
 kpi_style  = dict(facecolor='#161B22')
 plot_style = dict(facecolor='#161B22')
 
-# ── KPI Row ──────────────────────────────────────────────────────────────────
 kpi_data = [
     ('ROC-AUC', f'{xgb_auc:.3f}', '↑ vs 0.71 baseline', '#00D4FF'),
     ('Readmit Rate', f'{y.mean():.1%}',  'Across 100K records', '#FF6B35'),
@@ -778,7 +3608,6 @@ for idx, (title, value, sub, color) in enumerate(kpi_data):
         spine.set_linewidth(2)
     ax.set_visible(True)
 
-# ── Plot 1: ROC Curve ─────────────────────────────────────────────────────────
 ax1 = fig.add_subplot(gs[1, :2], **plot_style)
 ax1.set_facecolor('#161B22')
 fpr_b, tpr_b, _ = roc_curve(y_test, baseline.predict_proba(X_test)[:,1])
@@ -796,7 +3625,6 @@ ax1.legend(fontsize=9, facecolor='#1E1E2E', labelcolor='white')
 ax1.tick_params(colors='#AAAAAA')
 ax1.spines[:].set_color('#333333')
 
-# ── Plot 2: Risk Tier Distribution ───────────────────────────────────────────
 ax2 = fig.add_subplot(gs[1, 2], **plot_style)
 ax2.set_facecolor('#161B22')
 tier_counts = df_test_results['risk_tier'].value_counts().sort_index()
@@ -810,7 +3638,6 @@ ax2.set_ylabel('Patients', color='#AAAAAA')
 ax2.tick_params(colors='#AAAAAA')
 ax2.spines[:].set_color('#333333')
 
-# ── Plot 3: SHAP Top Features ─────────────────────────────────────────────────
 ax3 = fig.add_subplot(gs[1, 3], **plot_style)
 ax3.set_facecolor('#161B22')
 top_features = shap_df.tail(8)
@@ -821,10 +3648,9 @@ ax3.set_xlabel('Mean |SHAP|', color='#AAAAAA', fontsize=9)
 ax3.tick_params(colors='#AAAAAA', labelsize=8)
 ax3.spines[:].set_color('#333333')
 
-# ── Plot 4: Readmission by Age Bucket ────────────────────────────────────────
 ax4 = fig.add_subplot(gs[2, 0], **plot_style)
 ax4.set_facecolor('#161B22')
-age_readmit = df_gold.groupby('age_bucket')['readmitted_30d'].mean().sort_index()
+age_readmit = df_ml.groupby('age_bucket')['readmitted_30d'].mean().sort_index()
 bars = ax4.bar(age_readmit.index, age_readmit.values * 100,
                color=['#00FF87','#FFD700','#FF6B35','#FF0000'], edgecolor='#333333')
 ax4.set_title('Readmission Rate by Age', color='white', fontsize=11, fontweight='bold')
@@ -832,7 +3658,6 @@ ax4.set_ylabel('Readmission %', color='#AAAAAA')
 ax4.tick_params(colors='#AAAAAA', labelsize=9)
 ax4.spines[:].set_color('#333333')
 
-# ── Plot 5: Confusion Matrix ──────────────────────────────────────────────────
 ax5 = fig.add_subplot(gs[2, 1], **plot_style)
 ax5.set_facecolor('#161B22')
 y_pred_thresh = (y_prob >= 0.40).astype(int)
@@ -848,10 +3673,9 @@ for i in range(2):
                  color='white' if cm[i,j] < cm.max()/2 else 'black')
 ax5.set_title('Confusion Matrix\n(threshold=0.40)', color='white', fontsize=11, fontweight='bold')
 
-# ── Plot 6: Readmission by Charlson Risk Tier ─────────────────────────────────
 ax6 = fig.add_subplot(gs[2, 2:], **plot_style)
 ax6.set_facecolor('#161B22')
-tier_readmit = df_gold.groupby('charlson_index')['readmitted_30d'].agg(['mean','count']).reset_index()
+tier_readmit = df_ml.groupby('charlson_index')['readmitted_30d'].agg(['mean','count']).reset_index()
 tier_readmit = tier_readmit[tier_readmit['count'] > 500].head(8)
 ax6.bar(tier_readmit['charlson_index'], tier_readmit['mean']*100,
         color='#00D4FF', alpha=0.85, edgecolor='#333333')
@@ -867,53 +3691,43 @@ ax6.spines[:].set_color('#333333')
 plt.savefig('/content/lakehouse/ml/ward_dashboard.png', dpi=150,
             bbox_inches='tight', facecolor='#0D1117')
 plt.show()
-print("✅ Ward Dashboard saved to /content/lakehouse/ml/ward_dashboard.png")
+print(" Ward Dashboard saved to /content/lakehouse/ml/ward_dashboard.png")
 
-# ─── FINAL RESULTS SUMMARY ─────────────────────────────────────────────────
-
-report = classification_report(
-    y_test,
-    (y_prob >= 0.40).astype(int),
-    target_names=['No Readmit', 'Readmit']
-)
+report = classification_report(y_test, (y_prob >= 0.40).astype(int),
+                                 target_names=['No Readmit','Readmit'])
 
 print("=" * 65)
-print("🏥 HOSPITAL READMISSION PREDICTION — PROJECT RESULTS")
+print(" HOSPITAL READMISSION PREDICTION — PROJECT RESULTS")
 print("=" * 65)
-
-print("\n📊 MODEL PERFORMANCE:")
+print(f"\n MODEL PERFORMANCE:")
 print(f"   Baseline ROC-AUC (Logistic Regression) : {baseline_auc:.4f}")
 print(f"   Champion ROC-AUC (XGBoost + SMOTE)     : {xgb_auc:.4f}  ✓")
 print(f"   Improvement                             : +{(xgb_auc - baseline_auc):.4f}")
 print(f"   Avg Precision Score                     : {average_precision_score(y_test, y_prob):.4f}")
 print(f"\n{report}")
-
-print("\n🗄️  DATA PIPELINE:")
+print(f"\n  DATA PIPELINE:")
 print(f"   EHR Records Ingested           : {N:,}")
-print(f"   Bronze Layer Rows              : {len(df_raw):,}")
-print(f"   Silver Layer Rows (cleaned)    : {len(df_silver):,}")
-print(f"   Gold Features Engineered       : {len(df_gold.columns) - 1:,}")
-print(f"   GE Rules Evaluated             : {total:,}")
-print(f"   GE Rules Passed                : {passed:,} ({pct:.1f}%)")
-
-print("\n🧊 LAKEHOUSE LAYERS:")
-print("   Bronze : raw_admissions.parquet       (Iceberg-partitioned)")
-print("   Silver : admissions_clean.parquet     (dbt-transformed)")
-print("   Gold   : readmission_features.parquet (40+ CTE features)")
-print("   ML     : patient_risk_scores.parquet  (SHAP risk tiers)")
-
-print("\n📋 RESUME BULLET PROOF POINTS:")
-print("   ✓ Advanced SQL (recursive CTEs, rolling windows) in DuckDB/Snowflake")
-print(f"   ✓ Engineered {len(df_gold.columns)-1:,}+ clinical features from {N:,}+ EHR records")
+print(f"   Bronze Layer Rows              : {bronze_rows:,}")
+print(f"   Silver Layer Rows (cleaned)    : {silver_metadata['row_count']:,}")
+print(f"   Gold Features Engineered       : {len(gold_columns) - 1}")
+print(f"   GE Rules Evaluated             : {total}")
+print(f"   GE Rules Passed                : {passed} ({pct:.1f}%)")
+print(f"\n LAKEHOUSE LAYERS:")
+print(f"   Bronze : raw_admissions.parquet       (Iceberg-partitioned)")
+print(f"   Silver : admissions_clean.parquet     (dbt-transformed)")
+print(f"   Gold   : readmission_features.parquet (40+ CTE features)")
+print(f"   ML     : patient_risk_scores.parquet  (SHAP risk tiers)")
+print(f"\n RESUME BULLET PROOF POINTS:")
+print(f"   ✓ Advanced SQL (recursive CTEs, rolling windows) in DuckDB/Snowflake")
+print(f"   ✓ Engineered {len(gold_columns)-1}+ clinical features from {N:,}+ EHR records")
 print(f"   ✓ XGBoost ROC-AUC {xgb_auc:.2f} vs {baseline_auc:.2f} baseline")
-print("   ✓ SHAP risk tiers for clinical explainability")
+print(f"   ✓ SHAP risk tiers for clinical explainability")
 print(f"   ✓ SMOTE applied to fix {y.mean():.0%} class imbalance")
-print(f"   ✓ Great Expectations: {total:,}+ rules at ingestion")
-print("   ✓ Medallion Lakehouse on Apache Iceberg (Bronze/Silver/Gold)")
-print("   ✓ Airflow DAG orchestration (6-task pipeline)")
-print("   ✓ MLflow experiment tracking with model registry")
-print("   ✓ Power BI-style ward dashboard built")
-
+print(f"   ✓ Great Expectations: {total}+ rules at ingestion")
+print(f"   ✓ Medallion Lakehouse on Apache Iceberg (Bronze/Silver/Gold)")
+print(f"   ✓ Airflow DAG orchestration (6-task pipeline)")
+print(f"   ✓ MLflow experiment tracking with model registry")
+print(f"   ✓ Power BI-style ward dashboard built")
 print("=" * 65)
 
 # ─── DOWNLOAD ALL OUTPUTS ─────────────────────────────────────────────────────
@@ -929,5 +3743,4 @@ with zipfile.ZipFile('/content/hospital_readmission_outputs.zip', 'w') as z:
             z.write(f, f.replace('/content/', ''))
 
 files.download('/content/hospital_readmission_outputs.zip')
-print("✅ All outputs downloaded: parquet files, SHAP plots, dashboard PNG, MLflow runs")
-
+print("✅ All outputs downloaded: parquet files, SHAP plots, dashboard PNG, MLflow runs")
\ No newline at end of file